@@ -11,6 +11,7 @@ from dataclasses import dataclass, asdict
 from typing import Dict, Iterable, List, Optional
 
 import config
+from metrics import stage_metrics
 
 
 @dataclass
@@ -63,6 +64,7 @@ class AlertDatabase:
             )
 
     def insert(self, record: AlertRecord) -> AlertRecord:
+        start = time.perf_counter()
         with self._lock, self._conn:
             cursor = self._conn.execute(
                 """
@@ -83,6 +85,7 @@ class AlertDatabase:
                 ),
             )
             record.id = cursor.lastrowid
+        stage_metrics.record(None, "alert_db_write", time.perf_counter() - start)
         return record
 
     def list_alerts(self, limit: int = 50) -> List[Dict[str, object]]:
@@ -129,12 +132,14 @@ class AlertChannelDispatcher:
         self.socketio = socketio
 
     def dispatch(self, record: AlertRecord) -> None:
+        start = time.perf_counter()
         for channel in config.ALERT_CHANNELS:
             handler = getattr(self, f"_send_{channel}", None)
             if handler:
                 handler(record)
             else:
                 self._send_log(record, prefix=f"[未实现渠道 {channel}]")
+        stage_metrics.record(None, "alert_dispatch", time.perf_counter() - start)
 
     def _send_log(self, record: AlertRecord, prefix: str = "[告警]") -> None:
         timestamp = time.strftime("%H:%M:%S", time.localtime(record.triggered_at))
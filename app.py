@@ -5,17 +5,42 @@
 日期：2025年10月16日
 """
 
-from flask import Flask, render_template, Response, request, jsonify
+from flask import Flask, render_template, Response, request, jsonify, abort
 from datetime import datetime
 import cv2
+import functools
+import numpy as np
 import threading
 import time
 import webbrowser
+from backends import export_models
+from camera_worker import CameraWorkerHandle
 from detector import DutyDetector
-from utils import draw_status_text
+from metrics import (
+    PrometheusWriter,
+    process_rss_bytes,
+    stage_metrics,
+    torch_threads,
+)
+from pipeline import (
+    AdaptiveRateController,
+    CameraContext,
+    configure_camera,
+    open_camera,
+)
+from streaming import (
+    MJPEG_MIMETYPE,
+    SSE_HEADERS,
+    SSE_MIMETYPE,
+    StatusPublisher,
+    StreamSlots,
+    resolve_profile,
+)
+from utils import bgr_to_hex, draw_status_text
 import config
 import os
 import signal
+import socket
 import requests
 import sqlite3
 
@@ -24,10 +49,11 @@ app = Flask(__name__)
 
 # 全局变量
 detector = None
-camera = None
-latest_frame = None
-latest_status = "系统初始化中..."
-frame_lock = threading.Lock()
+rate_controller = AdaptiveRateController()
+cameras = {}  # 摄像头注册表: cam_id -> CameraContext（保持配置顺序，第一路为主摄像头）
+stream_slots = StreamSlots()  # 视频流与推送长连接名额
+# 进程启动标识：帧序号重启后从头计数，快照 ETag 带上它以免误命中旧缓存
+boot_id = format(int(time.time() * 1000), "x")
 system_paused = False
 pause_lock = threading.Lock()
 stats_lock = threading.Lock()
@@ -94,6 +120,17 @@ def _current_durations() -> dict:
         }
 
 
+@functools.lru_cache(maxsize=4)
+def _parse_work_hours(start_text, end_text):
+    """解析工作时段（按配置字符串缓存），格式错误返回 None"""
+    try:
+        start = datetime.strptime(start_text, "%H:%M").time()
+        end = datetime.strptime(end_text, "%H:%M").time()
+    except ValueError:
+        return None
+    return start, end
+
+
 def _within_work_hours() -> bool:
     """判断当前是否处于工作统计时段"""
     if not config.WORK_HOURS_ENABLED:
@@ -101,11 +138,10 @@ def _within_work_hours() -> bool:
     now = datetime.now()
     if now.weekday() not in WORK_DAY_SET:
         return False
-    try:
-        start = datetime.strptime(config.WORK_HOURS_START, "%H:%M").time()
-        end = datetime.strptime(config.WORK_HOURS_END, "%H:%M").time()
-    except ValueError:
+    window = _parse_work_hours(config.WORK_HOURS_START, config.WORK_HOURS_END)
+    if window is None:
         return True
+    start, end = window
     current = now.time()
     if start <= end:
         return start <= current <= end
@@ -270,6 +306,7 @@ def _persist_stats_snapshot():
             snapshot["total_seconds"],
             snapshot["continuous_seconds"],
         )
+        write_start = time.perf_counter()
         with stats_db_lock:
             conn.execute(
                 """
@@ -285,6 +322,7 @@ def _persist_stats_snapshot():
                 payload,
             )
             conn.commit()
+        stage_metrics.record(None, "stats_db_write", time.perf_counter() - write_start)
         _append_stats_csv(snapshot)
     except Exception as db_error:
         print(f"⚠️ 写入统计数据失败: {db_error}")
@@ -320,67 +358,104 @@ def init_camera_source():
         print("正在自动检测可用摄像头...")
         for i in range(config.MAX_CAMERA_INDEX):
             print(f"尝试摄像头 {i}...")
-            camera = cv2.VideoCapture(i)
-            if camera.isOpened():
-                # 测试是否能读取帧
-                ret, frame = camera.read()
-                if ret:
-                    print(f"✅ 成功连接摄像头 {i}")
-                    return camera
-                else:
-                    camera.release()
+            camera = open_camera(i)
+            if camera is not None:
+                print(f"✅ 成功连接摄像头 {i}")
+                return camera
             print(f"❌ 摄像头 {i} 不可用")
 
     # 使用配置指定的摄像头源
     print(f"使用配置的摄像头源: {config.CAMERA_SOURCE}")
-    camera = cv2.VideoCapture(config.CAMERA_SOURCE)
-
-    if camera.isOpened():
-        ret, frame = camera.read()
-        if ret:
-            print("✅ 摄像头连接成功")
-            return camera
-        else:
-            camera.release()
+    camera = open_camera(config.CAMERA_SOURCE)
+    if camera is not None:
+        print("✅ 摄像头连接成功")
+        return camera
 
     print("⚠️ 无法连接任何摄像头")
     return None
 
 
+def _process_mode():
+    return config.CAMERA_WORKER_MODE == "process"
+
+
+def _on_worker_result(context, status):
+    """进程模式下收到工作进程结果时，按主摄像头累计在岗/离岗时长"""
+    frame_on_duty = status.get("frame_on_duty")
+    if frame_on_duty is not None and context is _primary_camera():
+        _update_time_metrics(bool(frame_on_duty))
+
+
+def init_cameras():
+    """按注册表初始化所有摄像头，返回成功连接（或已分配工作进程）的数量"""
+    registry = config.get_camera_registry()
+    if _process_mode():
+        # 各工作进程各自创建检测器，导出在启动它们之前由主进程完成一次
+        try:
+            export_models(
+                config.INFERENCE_BACKEND, (config.MODEL_PATH, config.POSE_MODEL_PATH)
+            )
+        except Exception as exc:
+            print(f"⚠️ 模型预导出失败，由工作进程自行导出: {exc}")
+    for cam_id, source in registry:
+        context = CameraContext(cam_id, source)
+        if _process_mode():
+            # 摄像头由子进程打开，这里只登记工作进程句柄
+            context.worker = CameraWorkerHandle(context, on_result=_on_worker_result)
+            cameras[cam_id] = context
+            continue
+        if config.CAMERA_SOURCES:
+            print(f"正在连接摄像头 {cam_id}: {source}")
+            camera = open_camera(source)
+            if camera is None:
+                print(f"⚠️ 摄像头 {cam_id} 不可用")
+        else:
+            camera = init_camera_source()
+
+        if camera is not None:
+            # 设置摄像头参数
+            configure_camera(camera)
+            context.attach(camera)
+        cameras[cam_id] = context
+    return sum(
+        1
+        for context in cameras.values()
+        if context.camera is not None or context.worker is not None
+    )
+
+
 def init_system():
     """初始化系统组件"""
-    global detector, camera
+    global detector
 
     try:
         # 验证配置
         if not config.validate_config():
             return False
 
-        # 初始化检测器
-        print("正在加载YOLOv8模型...")
-        detector = DutyDetector(
-            model_path=config.MODEL_PATH,
-            pose_model_path=config.POSE_MODEL_PATH,
-            confidence_threshold=config.CONFIDENCE_THRESHOLD,
-            pose_confidence_threshold=config.POSE_CONFIDENCE_THRESHOLD,
-            device=config.DEVICE,
-        )
-        print("模型加载完成")
+        # 初始化检测器（进程模式下由各工作进程自行加载）
+        if _process_mode():
+            print("进程模式：模型将在各摄像头工作进程中加载")
+        else:
+            print("正在加载YOLOv8模型...")
+            detector = DutyDetector(
+                model_path=config.MODEL_PATH,
+                pose_model_path=config.POSE_MODEL_PATH,
+                confidence_threshold=config.CONFIDENCE_THRESHOLD,
+                pose_confidence_threshold=config.POSE_CONFIDENCE_THRESHOLD,
+                device=config.DEVICE,
+            )
+            print("模型加载完成")
 
         # 初始化摄像头
         print("正在连接摄像头...")
-        camera = init_camera_source()
+        connected = init_cameras()
 
-        if camera is None:
+        if connected == 0:
             print("错误：无法连接摄像头")
             return False
 
-        # 设置摄像头参数
-        camera.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
-        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
-        camera.set(cv2.CAP_PROP_FPS, config.CAMERA_FPS)
-
-        print("系统初始化完成")
+        print(f"系统初始化完成（{connected}/{len(cameras)} 路摄像头在线）")
         return True
 
     except Exception as e:
@@ -388,106 +463,284 @@ def init_system():
         return False
 
 
+def _primary_camera():
+    """主摄像头（注册表第一路），用于单路接口与时长统计"""
+    return next(iter(cameras.values()), None)
+
+
+def _collect_frame_batch():
+    """从各路抓帧线程收集最新帧，返回 [(context, frame, frame_time), ...]"""
+    batch = []
+    for context in cameras.values():
+        if context.grabber is None:
+            continue
+        item = context.grabber.read_latest(timeout=0)
+        if item is not None:
+            _, frame, frame_time = item
+            batch.append((context, frame, frame_time))
+    return batch
+
+
+def _process_camera_result(context, frame, result):
+    """绘制并发布单路摄像头的检测结果"""
+    detection_result, status, status_detail = result
+
+    # 在岗/离岗时长按主摄像头累计
+    if status_detail is not None and context is _primary_camera():
+        _update_time_metrics(bool(status_detail.get("frame_on_duty", False)))
+
+    draw_start = time.perf_counter()
+    if config.STREAM_OVERLAY_MODE == "client":
+        # 浏览器端叠加：发布原始画面，检测数据单独推送，服务端不再绘制
+        overlay = detector.export_overlay(detection_result, status, frame.shape)
+        stage_metrics.record(context.cam_id, "draw", time.perf_counter() - draw_start)
+        context.publish(frame, status, status_detail, overlay=overlay)
+        return
+
+    # 在该路的后台输出缓冲区上原地绘制检测结果和状态
+    annotated_frame = context.output_buffer.acquire(frame.shape, frame.dtype)
+    if detection_result is not None:
+        detector.draw_detections(
+            frame, detection_result, status_text=status, out=annotated_frame
+        )
+    else:
+        np.copyto(annotated_frame, frame)
+        draw_status_text(annotated_frame, status, position="top-left", inplace=True)
+    stage_metrics.record(context.cam_id, "draw", time.perf_counter() - draw_start)
+
+    context.publish(annotated_frame, status, status_detail)
+
+
 def capture_frames():
-    """视频帧捕获线程"""
-    global latest_frame, latest_status, detector, camera, system_paused
+    """推理线程：收集各路摄像头最新帧，合并为一个批次送入检测器，处理期间到达的旧帧被丢弃"""
+    global detector, system_paused
 
     while True:
-        if camera is not None and camera.isOpened():
-            with pause_lock:
-                paused = system_paused
-
-            if paused:
-                time.sleep(0.2)
-                continue
-
-            ret, frame = camera.read()
-
-            if ret:
-                try:
-                    # 使用检测器分析帧
-                    if detector is not None:
-                        detection_result, status, status_detail = detector.detect(frame)
-
-                        # 在帧上绘制检测结果和状态
-                        if detection_result is not None:
-                            annotated_frame = detector.draw_detections(
-                                frame, detection_result, status_text=status
-                            )
-                        else:
-                            annotated_frame = draw_status_text(
-                                frame, status, position="top-left"
-                            )
-
-                        if status_detail is not None:
-                            _update_time_metrics(
-                                bool(status_detail.get("frame_on_duty", False))
-                            )
-
-                        with frame_lock:
-                            latest_frame = annotated_frame.copy()
-                            latest_status = status
-                    else:
-                        with frame_lock:
-                            latest_frame = frame.copy()
-                            latest_status = "检测器未初始化"
-
-                except Exception as e:
-                    print(f"帧处理错误: {str(e)}")
-                    with frame_lock:
-                        latest_frame = frame.copy()
-                        latest_status = f"处理错误: {str(e)}"
-            else:
-                print("无法读取摄像头帧")
-                time.sleep(0.1)
-        else:
-            print("摄像头未连接")
+        if not cameras:
             time.sleep(1)
+            continue
+
+        with pause_lock:
+            paused = system_paused
+
+        if paused:
+            time.sleep(0.2)
+            continue
+
+        # 自适应速率：未到下一次推理时间时不取帧，旧帧由抓帧线程持续丢弃
+        wait = rate_controller.wait_time()
+        if wait > 0:
+            time.sleep(min(wait, 0.05))
+            continue
+
+        batch = _collect_frame_batch()
+        if not batch:
+            time.sleep(0.005)
+            continue
+
+        if detector is None:
+            for context, frame, frame_time in batch:
+                context.publish(frame, "检测器未初始化")
+                context.grabber.mark_processed(frame_time)
+            continue
+
+        # 运动门控：画面几乎没有变化时复用该路上次的检测结果
+        pending = []
+        for context, frame, frame_time in batch:
+            if context.motion_gate.should_skip(frame, context.last_result is not None):
+                _finish_camera_frame(context, frame, frame_time, context.last_result)
+            else:
+                pending.append((context, frame, frame_time))
+        if not pending:
+            continue
+
+        frames = [frame for _, frame, _ in pending]
+        stream_ids = [context.cam_id for context, _, _ in pending]
+        detector.set_input_size(rate_controller.imgsz)
+        detect_start = time.perf_counter()
+        try:
+            results = detector.detect_batch(frames, stream_ids)
+        except Exception as e:
+            print(f"帧处理错误: {str(e)}")
+            results = [(None, f"处理错误: {str(e)}", None)] * len(pending)
+        rate_controller.record(time.perf_counter() - detect_start)
 
+        for (context, frame, frame_time), result in zip(pending, results):
+            if result[2] is not None:
+                context.last_result = result
+            _finish_camera_frame(context, frame, frame_time, result)
 
-def generate_frames():
-    """生成视频流的生成器函数"""
-    global latest_frame
 
-    while True:
-        with frame_lock:
-            if latest_frame is not None:
-                # 将帧编码为JPEG格式
-                ret, buffer = cv2.imencode(
-                    ".jpg", latest_frame, [cv2.IMWRITE_JPEG_QUALITY, 80]
-                )
+def _finish_camera_frame(context, frame, frame_time, result):
+    try:
+        _process_camera_result(context, frame, result)
+    except Exception as e:
+        print(f"帧处理错误: {str(e)}")
+        context.publish(frame, f"处理错误: {str(e)}")
+    finally:
+        context.grabber.mark_processed(frame_time)
+
+
+def _stream_response(iterable, mimetype, headers=None):
+    """长连接响应：占用一个名额，客户端断开时由服务器关闭响应并归还；名额已满返回503"""
+    body = stream_slots.acquire(iterable)
+    if body is None:
+        if hasattr(iterable, "close"):
+            iterable.close()
+        return Response(
+            "在线观看人数已达上限，请稍后重试",
+            status=503,
+            headers={"Retry-After": "10"},
+        )
+    return Response(body, mimetype=mimetype, headers=headers)
+
 
-                if ret:
-                    frame_bytes = buffer.tobytes()
+def _connection_closer(environ):
+    """
+    返回关闭当前连接的回调，供视频流判定客户端卡死时使用
 
-                    # 返回MJPEG流格式
-                    yield (
-                        b"--frame\r\n"
-                        b"Content-Type: image/jpeg\r\n\r\n" + frame_bytes + b"\r\n"
-                    )
+    开发服务器通过 werkzeug.socket 暴露套接字，关闭后阻塞的写入立即返回；
+    waitress 未暴露套接字，卡死的连接由其 channel_timeout 回收
+    """
+    sock = environ.get("werkzeug.socket")
+    if sock is None:
+        return None
+    return functools.partial(sock.shutdown, socket.SHUT_RDWR)
 
-        time.sleep(1.0 / config.STREAM_FPS)  # 使用配置的流输出帧率
+
+def _get_camera_or_404(cam_id):
+    context = cameras.get(cam_id) if cam_id is not None else _primary_camera()
+    if context is None:
+        abort(404, description=f"未知摄像头: {cam_id}")
+    return context
 
 
 @app.route("/")
 def index():
     """主页面"""
     status_interval_ms = int(max(0.2, config.STATUS_REFRESH_INTERVAL) * 1000)
-    return render_template("index.html", status_interval_ms=status_interval_ms)
+    return render_template(
+        "index.html",
+        status_interval_ms=status_interval_ms,
+        status_push=config.ENABLE_STATUS_PUSH,
+        overlay_mode=config.STREAM_OVERLAY_MODE,
+        overlay_style={
+            "statusFontSize": config.STATUS_FONT_SIZE,
+            "statusBackground": bgr_to_hex(config.COLORS["status_bg"]),
+            "statusColor": bgr_to_hex(config.COLORS["status_text"]),
+        },
+    )
 
 
 @app.route("/video_feed")
-def video_feed():
-    """视频流推送接口"""
-    return Response(
-        generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame"
+@app.route("/video_feed/<cam_id>")
+def video_feed(cam_id=None):
+    """
+    视频流推送接口（不指定摄像头时为主摄像头）
+
+    查询参数 profile 选择质量档位（thumb/standard/full，见 STREAM_PROFILES），
+    profile=auto 时按 width（客户端显示宽度）自动选择
+    """
+    context = _get_camera_or_404(cam_id)
+    try:
+        profile = resolve_profile(
+            request.args.get("profile"), request.args.get("width", type=int)
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    # 编码由该路该档位的广播器统一完成，每个客户端只取共享的编码结果
+    broadcaster = context.get_broadcaster(profile)
+    return _stream_response(
+        broadcaster.stream(
+            client=request.remote_addr,
+            on_stall=_connection_closer(request.environ),
+        ),
+        MJPEG_MIMETYPE,
     )
 
 
-@app.route("/status")
-def get_status():
-    """获取当前状态的API接口"""
-    global latest_status, system_paused
+@app.route("/snapshot")
+@app.route("/snapshot/<cam_id>")
+def snapshot(cam_id=None):
+    """
+    单帧快照：返回最新一帧的JPEG（查询参数 profile/width 同 /video_feed）
+
+    ETag 由摄像头、档位与帧序号组成，If-None-Match 命中时返回304；
+    有推流客户端时直接复用已编码的数据，画面未变化时不重复编码
+    """
+    context = _get_camera_or_404(cam_id)
+    try:
+        profile = resolve_profile(
+            request.args.get("profile"), request.args.get("width", type=int)
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    result = context.get_broadcaster(profile).snapshot()
+    if result is None:
+        return Response(
+            "暂无画面，请稍后重试", status=503, headers={"Retry-After": "1"}
+        )
+    seq, jpeg = result
+    response = Response(jpeg, mimetype="image/jpeg")
+    response.set_etag(f"{context.cam_id}-{profile}-{boot_id}-{seq}")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Frame-Seq"] = str(seq)
+    return response.make_conditional(request)
+
+
+@app.route("/overlay_stream")
+@app.route("/overlay_stream/<cam_id>")
+def overlay_stream(cam_id=None):
+    """
+    浏览器端叠加模式下的检测数据推送（SSE），每帧一条事件
+
+    浏览器总是叠加最新一条数据，不按帧序号与画面逐帧对齐
+    """
+    context = _get_camera_or_404(cam_id)
+    return _stream_response(
+        context.overlay_channel.stream(), SSE_MIMETYPE, SSE_HEADERS
+    )
+
+
+@app.route("/api/performance")
+def get_performance_state():
+    """自适应速率控制器的当前决策（进程模式下为各工作进程上报的状态）"""
+    if _process_mode():
+        workers = {}
+        for context in cameras.values():
+            with context.frame_lock:
+                detail = context.latest_detail or {}
+            workers[context.cam_id] = detail.get("rate_controller")
+        return jsonify({"mode": "process", "workers": workers})
+    return jsonify(
+        {
+            "mode": "thread",
+            "controller": rate_controller.get_state(),
+            "detector": detector.get_detection_statistics() if detector else None,
+        }
+    )
+
+
+@app.route("/cameras")
+def list_cameras():
+    """摄像头注册表"""
+    return jsonify(
+        {
+            "cameras": [
+                {
+                    "cam_id": context.cam_id,
+                    "source": str(context.source),
+                    "online": context.is_online(),
+                    "status": context.get_status(),
+                }
+                for context in cameras.values()
+            ]
+        }
+    )
+
+
+def _build_status_payload(context):
+    """生成单路摄像头的状态数据（轮询接口与推送共用，在岗时长统计来自主摄像头）"""
     with pause_lock:
         paused = system_paused
     durations = _current_durations()
@@ -495,7 +748,8 @@ def get_status():
     server_time = _current_server_time()
     work_hours_active = _within_work_hours()
     return {
-        "status": latest_status,
+        "cam_id": context.cam_id,
+        "status": context.get_status(),
         "paused": paused,
         "timestamp": time.time(),
         "on_duty_seconds": durations["on"],
@@ -504,9 +758,203 @@ def get_status():
         "continuous_warning": warning,
         "server_time": server_time,
         "work_hours_active": work_hours_active,
+        "pipeline": context.get_stats(),
     }
 
 
+def _status_change_key(payload):
+    """这些字段变化时立即推送，其余字段（时长、计数）随心跳更新"""
+    return (
+        payload["status"],
+        payload["paused"],
+        payload["work_hours_active"],
+        payload["continuous_warning"]["active"],
+    )
+
+
+status_publisher = StatusPublisher(
+    lambda: list(cameras.values()), _build_status_payload, _status_change_key
+)
+
+
+@app.route("/status")
+@app.route("/status/<cam_id>")
+def get_status(cam_id=None):
+    """获取当前状态的API接口（在岗时长统计来自主摄像头）"""
+    return _build_status_payload(_get_camera_or_404(cam_id))
+
+
+@app.route("/status_stream")
+@app.route("/status_stream/<cam_id>")
+def status_stream(cam_id=None):
+    """
+    状态推送（SSE）：状态变化时立即推送，否则按 STATUS_REFRESH_INTERVAL 心跳推送
+
+    ENABLE_STATUS_PUSH=False 时推送器不启动，本接口返回404，页面改为轮询 /status
+    """
+    if not config.ENABLE_STATUS_PUSH:
+        abort(404, description="状态推送未启用（ENABLE_STATUS_PUSH=False）")
+    context = _get_camera_or_404(cam_id)
+    return _stream_response(context.status_channel.stream(), SSE_MIMETYPE, SSE_HEADERS)
+
+
+@app.route("/api/pipeline")
+def get_pipeline_stats():
+    """各路摄像头的抓帧/推理流水线计数"""
+    return jsonify(
+        {
+            "running": bool(cameras),
+            "cameras": [context.get_stats() for context in cameras.values()],
+            "detector": detector.get_detection_statistics() if detector else None,
+            "stream_clients": stream_slots.get_stats(),
+        }
+    )
+
+
+@app.route("/api/latency")
+@app.route("/api/latency/<cam_id>")
+def get_latency_stats(cam_id=None):
+    """各路摄像头分阶段耗时的滚动分位数（毫秒）"""
+    if cam_id is not None:
+        selected = [_get_camera_or_404(cam_id)]
+    else:
+        selected = list(cameras.values())
+    return jsonify(
+        {
+            "enabled": stage_metrics.enabled,
+            "window_seconds": stage_metrics.window,
+            "cameras": {context.cam_id: context.get_latency() for context in selected},
+        }
+    )
+
+
+def _write_camera_metrics(writer, context):
+    """单路摄像头的吞吐计数、推流状态与阶段耗时直方图"""
+    stats = context.get_stats()
+    labels = {"camera": context.cam_id}
+    writer.gauge("camera_online", context.is_online(), labels, "摄像头是否在线")
+    for key, name, help_text in (
+        ("grabbed", "frames_captured_total", "抓取的摄像头帧数"),
+        ("processed", "frames_processed_total", "完成检测处理的帧数"),
+        ("dropped", "frames_dropped_total", "推理来不及处理而丢弃的帧数"),
+        ("read_failures", "frame_read_failures_total", "摄像头读帧失败次数"),
+        ("motion_skipped", "frames_motion_skipped_total", "运动门控跳过检测的帧数"),
+    ):
+        writer.counter(name, stats.get(key), labels, help_text)
+    writer.gauge(
+        "frame_pending",
+        stats.get("pending"),
+        labels,
+        "是否有尚未被推理取走的新帧（抓帧队列深度，最多为1）",
+    )
+    if "latency_ms" in stats:
+        writer.gauge(
+            "frame_latency_seconds",
+            stats["latency_ms"] / 1000,
+            labels,
+            "最近一帧从采集到处理完成的延迟",
+        )
+    if context.worker is not None:
+        writer.gauge(
+            "worker_resident_memory_bytes",
+            process_rss_bytes(context.worker.get_pid()),
+            labels,
+            "摄像头工作进程常驻内存",
+        )
+
+    for profile, stream in stats["streams"].items():
+        stream_labels = dict(labels, profile=profile)
+        writer.gauge(
+            "stream_subscribers", stream["subscribers"], stream_labels, "视频流订阅客户端数"
+        )
+        writer.gauge(
+            "stream_client_queue_depth",
+            sum(client["queue_depth"] for client in stream["clients"]),
+            stream_labels,
+            "各客户端待发送帧数之和",
+        )
+        writer.counter(
+            "stream_encoded_frames_total",
+            stream["encoded_frames"],
+            stream_labels,
+            "视频流编码帧数",
+        )
+        writer.counter(
+            "stream_snapshot_encodes_total",
+            stream["snapshot_encodes"],
+            stream_labels,
+            "单帧快照按需编码次数",
+        )
+    for channel in ("overlay", "status_push"):
+        writer.gauge(
+            "event_subscribers",
+            stats[channel]["subscribers"],
+            dict(labels, channel=channel),
+            "SSE 推送订阅客户端数",
+        )
+
+    for stage, exported in context.get_stage_histograms().items():
+        writer.histogram(
+            "stage_duration_seconds",
+            exported,
+            dict(labels, stage=stage),
+            "各处理阶段耗时（采集/推理/解析/关联/判定/绘制/编码）",
+        )
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus 文本格式指标：只读取现有计数器与累计直方图，开销与摄像头数成正比"""
+    writer = PrometheusWriter()
+    for context in list(cameras.values()):
+        _write_camera_metrics(writer, context)
+
+    for operation, exported in stage_metrics.export().get(None, {}).items():
+        writer.histogram(
+            "operation_duration_seconds",
+            exported,
+            {"operation": operation},
+            "统计库写入、告警入库与告警分发耗时",
+        )
+
+    slots = stream_slots.get_stats()
+    writer.gauge("stream_connections", slots["active"], help_text="在线长连接数")
+    writer.gauge(
+        "stream_connection_limit", slots["limit"], help_text="长连接上限（0为不限制）"
+    )
+    writer.counter(
+        "stream_connections_rejected_total",
+        slots["rejected"],
+        help_text="因名额已满被拒绝的长连接数",
+    )
+    if detector is not None:
+        writer.counter(
+            "detections_total", detector.detection_count, help_text="检测器处理的帧数"
+        )
+        writer.counter(
+            "object_model_runs_total",
+            detector.object_model_runs,
+            help_text="目标检测模型运行次数",
+        )
+        writer.counter(
+            "object_model_skips_total",
+            detector.object_model_skips,
+            help_text="沿用家具地图而跳过目标检测的次数",
+        )
+
+    writer.gauge(
+        "process_resident_memory_bytes", process_rss_bytes(), help_text="Web进程常驻内存"
+    )
+    writer.gauge(
+        "python_threads", threading.active_count(), help_text="Web进程 Python 线程数"
+    )
+    threads = torch_threads()
+    if threads is not None:
+        for pool, count in zip(("intra_op", "inter_op"), threads):
+            writer.gauge("torch_threads", count, {"pool": pool}, "torch 线程池大小")
+    return Response(writer.render(), content_type=PrometheusWriter.CONTENT_TYPE)
+
+
 @app.route("/api/analytics")
 def get_analytics():
     """预留的数据分析接口，后续可扩展"""
@@ -608,6 +1056,9 @@ def set_pause_state():
     paused = bool(data.get("paused", False))
     with pause_lock:
         system_paused = paused
+    for context in cameras.values():
+        if context.worker is not None:
+            context.worker.set_paused(paused)
     return jsonify({"paused": system_paused})
 
 
@@ -623,7 +1074,76 @@ def shutdown_system():
     return jsonify({"stopping": True})
 
 
-if __name__ == "__main__":
+def start_background_services():
+    """启动各路抓帧线程（或工作进程）、批量推理线程与统计/对时/推送后台任务"""
+    for context in cameras.values():
+        context.start()
+    if not _process_mode():
+        capture_thread = threading.Thread(target=capture_frames, daemon=True)
+        capture_thread.start()
+
+    if config.ENABLE_STATUS_PUSH:
+        status_publisher.start()
+
+    if config.ENABLE_TIME_SYNC:
+        _sync_time_once()
+        time_sync_thread = threading.Thread(target=_time_sync_worker, daemon=True)
+        time_sync_thread.start()
+
+    if config.ENABLE_STATISTICS:
+        _ensure_stats_db()
+        stats_thread = threading.Thread(target=_stats_persist_worker, daemon=True)
+        stats_thread.start()
+
+
+def stop_background_services():
+    status_publisher.stop()
+    for context in cameras.values():
+        context.stop()
+    if detector is not None:
+        detector.close()
+    cv2.destroyAllWindows()
+
+
+def run_server():
+    """按 SERVER_MODE 启动Web服务（阻塞直到退出）"""
+    if config.SERVER_MODE == "production":
+        try:
+            from waitress import serve
+        except ImportError:
+            print("⚠️ 未安装 waitress，回退到开发服务器（pip install waitress）")
+        else:
+            # 每个视频流/推送长连接独占一个线程，按名额上限额外预留
+            stream_threads = config.MAX_STREAM_CLIENTS or 64
+            print(
+                f"生产模式: waitress {config.SERVER_THREADS}+{stream_threads} 线程，"
+                f"长连接上限 {config.MAX_STREAM_CLIENTS or '不限'}"
+            )
+            serve(
+                app,
+                host=config.HOST,
+                port=config.PORT,
+                threads=config.SERVER_THREADS + stream_threads,
+                connection_limit=config.SERVER_THREADS + stream_threads + 16,
+                # 慢客户端的发送缓冲达到上限后阻塞其推流，推流恢复时直接取最新帧
+                outbuf_high_watermark=config.STREAM_SEND_BUFFER,
+                channel_timeout=max(30, int(config.STREAM_KEEPALIVE * 6)),
+                asyncore_use_poll=True,
+                ident="on-duty-monitor",
+            )
+            return
+
+    # 启动Flask应用
+    app.run(
+        debug=config.DEBUG,
+        host=config.HOST,
+        port=config.PORT,
+        use_reloader=False,
+        threaded=True,
+    )
+
+
+def main():
     print("=" * 50)
     print("人员在岗行为识别与实时告警系统")
     print("=" * 50)
@@ -632,59 +1152,39 @@ if __name__ == "__main__":
     print(f"  分辨率: {config.CAMERA_WIDTH}x{config.CAMERA_HEIGHT}")
     print(f"  帧率: {config.CAMERA_FPS} FPS")
     print(f"  服务地址: http://{config.HOST}:{config.PORT}")
-    print(f"  检测阈值: {config.CONFIDENCE_THRESHOLD}")
-    print("-" * 50)
-    print(f"配置信息:")
-    print(f"  摄像头源: {config.CAMERA_SOURCE}")
-    print(f"  分辨率: {config.CAMERA_WIDTH}x{config.CAMERA_HEIGHT}")
-    print(f"  帧率: {config.CAMERA_FPS} FPS")
-    print(f"  服务地址: http://{config.HOST}:{config.PORT}")
+    print(f"  服务模式: {config.SERVER_MODE}")
     print(f"  检测阈值: {config.CONFIDENCE_THRESHOLD}")
     print("-" * 50)
 
     # 初始化系统
-    if init_system():
-        # 启动视频捕获线程
-        capture_thread = threading.Thread(target=capture_frames, daemon=True)
-        capture_thread.start()
+    if not init_system():
+        print("系统启动失败，请检查环境配置")
+        return False
 
-        if config.ENABLE_TIME_SYNC:
-            _sync_time_once()
-            time_sync_thread = threading.Thread(target=_time_sync_worker, daemon=True)
-            time_sync_thread.start()
+    start_background_services()
 
-        if config.ENABLE_STATISTICS:
-            _ensure_stats_db()
-            stats_thread = threading.Thread(target=_stats_persist_worker, daemon=True)
-            stats_thread.start()
+    print("系统启动成功！")
+    print(f"访问地址: http://{config.HOST}:{config.PORT}")
+    print("按 Ctrl+C 退出系统")
 
-        print("系统启动成功！")
-        print(f"访问地址: http://{config.HOST}:{config.PORT}")
-        print("按 Ctrl+C 退出系统")
+    display_host = (
+        "localhost" if str(config.HOST) in ("0.0.0.0", "127.0.0.1") else config.HOST
+    )
+    target_url = f"http://{display_host}:{config.PORT}"
+    try:
+        webbrowser.open_new_tab(target_url)
+        print(f"已自动在浏览器中打开: {target_url}")
+    except Exception as browser_exc:
+        print(f"⚠️ 浏览器自动打开失败: {browser_exc}")
 
-        display_host = (
-            "localhost" if str(config.HOST) in ("0.0.0.0", "127.0.0.1") else config.HOST
-        )
-        target_url = f"http://{display_host}:{config.PORT}"
-        try:
-            webbrowser.open_new_tab(target_url)
-            print(f"已自动在浏览器中打开: {target_url}")
-        except Exception as browser_exc:
-            print(f"⚠️ 浏览器自动打开失败: {browser_exc}")
+    try:
+        run_server()
+    except KeyboardInterrupt:
+        print("\n正在关闭系统...")
+    finally:
+        stop_background_services()
+    return True
 
-        try:
-            # 启动Flask应用
-            app.run(
-                debug=config.DEBUG,
-                host=config.HOST,
-                port=config.PORT,
-                use_reloader=False,
-            )
-        except KeyboardInterrupt:
-            print("\n正在关闭系统...")
-        finally:
-            if camera is not None:
-                camera.release()
-            cv2.destroyAllWindows()
-    else:
-        print("系统启动失败，请检查环境配置")
+
+if __name__ == "__main__":
+    main()
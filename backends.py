@@ -0,0 +1,656 @@
+# -*- coding: utf-8 -*-
+"""
+推理后端 - DutyDetector 通过统一接口调用目标检测/姿态模型，
+可在 ultralytics YOLO、导出的 ONNX / OpenVINO 模型与可复现的脚本化假后端之间切换
+作者：创新创业项目组
+日期：2025年10月24日
+"""
+
+import ast
+import contextlib
+import glob
+import json
+import math
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+BACKEND_NAMES = ("ultralytics", "onnx", "openvino", "scripted")
+TASKS = ("detect", "pose")
+KEYPOINT_COUNT = 17  # COCO 关键点数量
+MODEL_STRIDE = 32  # YOLOv8 输入尺寸需为步长的整数倍
+NMS_IOU = 0.7  # 与 ultralytics 默认一致
+MAX_DETECTIONS = 300
+KEYPOINT_VISIBLE = 0.5  # 关键点可见度低于此值视为缺失
+EXPORT_LOCK_TIMEOUT = 600.0  # 等待其他进程导出的最长时间（秒），也是遗留锁文件的失效时长
+
+
+def object_result_arrays(result):
+    """将 ultralytics 目标检测结果转换为 (boxes, scores, classes) 数组，无结果时返回 None"""
+    if result.boxes is None:
+        return None
+    return (
+        result.boxes.xyxy.cpu().numpy(),
+        result.boxes.conf.cpu().numpy(),
+        result.boxes.cls.cpu().numpy().astype(int),
+    )
+
+
+def pose_result_arrays(result):
+    """将 ultralytics 姿态估计结果转换为 (boxes, scores, keypoints) 数组，无结果时返回 None"""
+    if result.boxes is None or result.keypoints is None:
+        return None
+    return (
+        result.boxes.xyxy.cpu().numpy(),
+        result.boxes.conf.cpu().numpy(),
+        result.keypoints.xy.cpu().numpy(),
+    )
+
+
+class InferenceBackend:
+    """
+    推理后端接口
+
+    predict 对一批帧推理，返回与批次对齐的数组元组列表：
+    detect 任务为 (boxes, scores, classes)，pose 任务为 (boxes, scores, keypoints)，
+    某帧无结果时为 None。frame_ids 为与批次对齐的 (视频流ID, 帧序号)，
+    真实模型忽略该参数，脚本化后端据此定位回放位置
+    """
+
+    name = "base"
+
+    def __init__(self, task):
+        if task not in TASKS:
+            raise ValueError(f"未知的推理任务: {task}")
+        self.task = task
+        self.names = {}
+
+    def predict(self, batch, conf, imgsz=None, frame_ids=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class UltralyticsBackend(InferenceBackend):
+    """ultralytics YOLO 模型；ultralytics 只在创建该后端时才导入"""
+
+    name = "ultralytics"
+
+    def __init__(self, model_path, task, device=None):
+        super().__init__(task)
+        from ultralytics import YOLO
+
+        self.model_path = model_path
+        self.model = YOLO(model_path)
+        if device:
+            self.model.to(device)
+        self.names = self.model.names
+        self._convert = object_result_arrays if task == "detect" else pose_result_arrays
+        self.last_raw_result = None
+
+    def predict(self, batch, conf, imgsz=None, frame_ids=None):
+        extra_args = {"imgsz": imgsz} if imgsz else {}
+        results = self.model(batch, conf=conf, verbose=False, **extra_args)
+        if results:
+            self.last_raw_result = results[0]
+        return [self._convert(result) for result in results]
+
+
+def letterbox(frame, size, pad_value=114):
+    """
+    等比缩放并居中填充到 size×size（与 ultralytics 预处理一致）
+
+    Returns:
+        tuple: (填充后的图像, 缩放比例, (左侧填充, 上侧填充))
+    """
+    height, width = frame.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = cv2.copyMakeBorder(
+        frame,
+        top,
+        size - new_h - top,
+        left,
+        size - new_w - left,
+        cv2.BORDER_CONSTANT,
+        value=(pad_value, pad_value, pad_value),
+    )
+    return canvas, ratio, (left, top)
+
+
+def _nms(boxes, scores, classes, iou=NMS_IOU, max_det=MAX_DETECTIONS):
+    """按类别做非极大值抑制（框平移到各类别独立的坐标区间），返回按分数降序的索引"""
+    offset = classes.astype(np.float32)[:, None] * 7680.0
+    shifted = boxes + offset
+    xywh = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+    keep = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), 0.0, iou)
+    return np.asarray(keep, dtype=int).reshape(-1)[:max_det]
+
+
+def _xywh_to_xyxy(xywh):
+    half = xywh[:, 2:] / 2
+    return np.concatenate([xywh[:, :2] - half, xywh[:, :2] + half], axis=1)
+
+
+def decode_detect_output(prediction, conf):
+    """
+    解码 YOLOv8 目标检测的原始输出（单张图）
+
+    Args:
+        prediction: 形状 (4 + 类别数, 候选数)，前4行为 cx, cy, w, h
+        conf (float): 置信度阈值
+
+    Returns:
+        tuple | None: 输入坐标系下的 (boxes, scores, classes)
+    """
+    prediction = prediction.T
+    class_scores = prediction[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(classes)), classes]
+    mask = scores >= conf
+    if not mask.any():
+        return None
+    boxes = _xywh_to_xyxy(prediction[mask, :4])
+    scores, classes = scores[mask], classes[mask]
+    keep = _nms(boxes, scores, classes)
+    return boxes[keep], scores[keep], classes[keep].astype(int)
+
+
+def decode_pose_output(prediction, conf):
+    """
+    解码 YOLOv8-Pose 的原始输出（单张图）
+
+    Args:
+        prediction: 形状 (5 + 17*3, 候选数)，依次为 cx, cy, w, h, 置信度与关键点 (x, y, 可见度)
+        conf (float): 置信度阈值
+
+    Returns:
+        tuple | None: 输入坐标系下的 (boxes, scores, keypoints)，不可见关键点为 NaN
+    """
+    prediction = prediction.T
+    scores = prediction[:, 4]
+    mask = scores >= conf
+    if not mask.any():
+        return None
+    boxes = _xywh_to_xyxy(prediction[mask, :4])
+    scores = scores[mask]
+    keypoints = prediction[mask, 5:].reshape(len(scores), -1, 3)
+    keep = _nms(boxes, scores, np.zeros(len(scores), dtype=int))
+    keypoints = keypoints[keep]
+    points = keypoints[..., :2].copy()
+    points[keypoints[..., 2] < KEYPOINT_VISIBLE] = np.nan
+    return boxes[keep], scores[keep], points
+
+
+def _restore_coordinates(arrays, ratio, pad, frame_shape, task):
+    """把输入坐标系下的结果还原到原始帧坐标"""
+    if arrays is None:
+        return None
+    boxes, scores, extra = arrays
+    height, width = frame_shape[:2]
+    offset = np.array(pad, dtype=np.float32)
+    boxes = ((boxes.reshape(-1, 2, 2) - offset) / ratio).reshape(-1, 4)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    if task == "pose":
+        extra = (extra - offset) / ratio
+        extra[..., 0] = extra[..., 0].clip(0, width)
+        extra[..., 1] = extra[..., 1].clip(0, height)
+    return boxes.astype(np.float32), scores.astype(np.float32), extra
+
+
+def exported_model_path(model_path, export_format, cache_dir=None):
+    """导出模型在缓存目录中的路径：ONNX 为 .onnx 文件，OpenVINO 为 IR 目录"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    cache_dir = cache_dir or config.EXPORT_CACHE_DIR
+    if export_format == "onnx":
+        return os.path.join(cache_dir, f"{stem}.onnx")
+    return os.path.join(cache_dir, f"{stem}_openvino_model")
+
+
+def _source_mtime(model_path):
+    return os.path.getmtime(model_path) if os.path.exists(model_path) else None
+
+
+def _is_exported(model_path, export_format):
+    if export_format == "onnx":
+        return model_path.lower().endswith(".onnx")
+    # OpenVINO 也可直接读取 ONNX 模型
+    return os.path.isdir(model_path) or model_path.lower().endswith((".xml", ".onnx"))
+
+
+def _cached_export(target, model_path):
+    """缓存中的导出模型仍与源权重一致时返回 True；元数据最后写入，作为完成标记"""
+    metadata_path = f"{target}.json"
+    if not (os.path.exists(target) and os.path.exists(metadata_path)):
+        return False
+    with open(metadata_path, "r", encoding="utf-8") as metadata_file:
+        metadata = json.load(metadata_file)
+    source_mtime = _source_mtime(model_path)
+    # 源权重不在本地（如按名称自动下载）时沿用缓存
+    return source_mtime is None or metadata.get("source_mtime") == source_mtime
+
+
+@contextlib.contextmanager
+def _export_lock(lock_path, timeout=EXPORT_LOCK_TIMEOUT, poll_interval=0.5):
+    """
+    跨进程互斥的导出锁：以 O_EXCL 创建锁文件，已存在时轮询等待
+
+    持有者异常退出遗留的锁文件超过 timeout 秒后视为失效并删除
+
+    Raises:
+        TimeoutError: 等待超过 timeout 秒仍未取得锁
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > timeout:
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue  # 持有者刚好释放
+            if time.time() > deadline:
+                raise TimeoutError(f"等待导出锁超时: {lock_path}")
+            time.sleep(poll_interval)
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def _replace_path(source, target):
+    """用 source 原子替换 target；目录无法直接覆盖，先把旧目录改名再删除"""
+    if os.path.isdir(target):
+        stale = f"{target}.old.{os.getpid()}"
+        os.replace(target, stale)
+        os.replace(source, target)
+        shutil.rmtree(stale, ignore_errors=True)
+    else:
+        os.replace(source, target)
+
+
+def ensure_exported(model_path, export_format, imgsz=None, cache_dir=None):
+    """
+    返回可直接加载的导出模型路径；model_path 为 .pt 权重时首次调用导出并缓存
+
+    缓存旁写一个 .json 元数据（类别名称、导出分辨率、源权重修改时间），
+    源权重更新后自动重新导出。导出需要 ultralytics，推理不需要。
+    多个进程同时调用时由锁文件保证只导出一次，其余进程等待后直接使用缓存；
+    导出结果先写到临时路径再改名，其他进程不会读到写了一半的文件
+
+    Args:
+        model_path (str): .pt 权重，或已导出的 .onnx 文件 / OpenVINO 目录
+        export_format (str): "onnx" 或 "openvino"
+        imgsz (int): 导出分辨率，默认 config.EXPORT_IMGSZ
+        cache_dir (str): 缓存目录，默认 config.EXPORT_CACHE_DIR
+    """
+    if _is_exported(model_path, export_format):
+        return model_path
+    target = exported_model_path(model_path, export_format, cache_dir)
+    if _cached_export(target, model_path):
+        return target
+
+    with _export_lock(f"{target}.lock"):
+        # 等锁期间其他进程可能已完成导出
+        if _cached_export(target, model_path):
+            return target
+
+        from ultralytics import YOLO
+
+        imgsz = imgsz or config.EXPORT_IMGSZ
+        print(f"⏳ 正在导出 {model_path} → {export_format}（首次运行，结果将缓存）")
+        model = YOLO(model_path)
+        exported = model.export(format=export_format, imgsz=imgsz, dynamic=True)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        suffix = f".tmp.{os.getpid()}"
+        staging = f"{target}{suffix}"
+        shutil.move(str(exported), staging)
+        metadata_path = f"{target}.json"
+        metadata = {
+            "source": os.path.abspath(model_path),
+            "source_mtime": _source_mtime(model_path),
+            "format": export_format,
+            "imgsz": imgsz,
+            "task": model.task,
+            "names": {int(key): value for key, value in model.names.items()},
+        }
+        with open(metadata_path + suffix, "w", encoding="utf-8") as metadata_file:
+            json.dump(metadata, metadata_file, ensure_ascii=False, indent=2)
+        _replace_path(staging, target)
+        os.replace(metadata_path + suffix, metadata_path)
+    print(f"✓ 导出完成: {target}")
+    return target
+
+
+def export_models(backend_name, model_paths):
+    """
+    需要导出模型的后端（onnx/openvino）在启动多个工作进程之前由主进程
+    预先导出，工作进程直接使用缓存；其他后端不做任何事
+    """
+    if backend_name not in ("onnx", "openvino"):
+        return
+    for model_path in model_paths:
+        ensure_exported(model_path, backend_name)
+
+
+def _read_metadata(path):
+    metadata_path = f"{path.rstrip(os.sep)}.json"
+    if not os.path.exists(metadata_path):
+        return {}
+    with open(metadata_path, "r", encoding="utf-8") as metadata_file:
+        metadata = json.load(metadata_file)
+    metadata["names"] = {
+        int(key): value for key, value in metadata.get("names", {}).items()
+    }
+    return metadata
+
+
+class ExportedModelBackend(InferenceBackend):
+    """
+    导出模型（ONNX / OpenVINO IR）推理的公共部分
+
+    预处理（letterbox、归一化、组批）与解码（阈值、NMS、坐标还原）用 numpy/OpenCV
+    实现，推理时不依赖 torch 与 ultralytics；子类只需实现 _load 与 _infer
+    """
+
+    export_format = None
+
+    def __init__(self, model_path, task, device=None, threads=None):
+        super().__init__(task)
+        self.model_path = ensure_exported(model_path, self.export_format)
+        self.device = device
+        self.threads = (
+            config.INFERENCE_INTRA_OP_THREADS if threads is None else threads
+        )
+        metadata = _read_metadata(self.model_path)
+        self.default_imgsz = metadata.get("imgsz") or config.EXPORT_IMGSZ
+        # 静态输入尺寸 / 批大小（导出时未开启 dynamic）由子类从模型读出
+        self.fixed_imgsz = None
+        self.fixed_batch = None
+        self._load(self.model_path)
+        self.names = metadata.get("names") or self._embedded_names() or {}
+        self._decode = decode_detect_output if task == "detect" else decode_pose_output
+
+    def _load(self, path):
+        raise NotImplementedError
+
+    def _infer(self, tensor):
+        """对 (N, 3, H, W) float32 输入推理，返回 (N, 通道, 候选数) 原始输出"""
+        raise NotImplementedError
+
+    def _embedded_names(self):
+        return None
+
+    def _input_size(self, imgsz):
+        if self.fixed_imgsz:
+            return self.fixed_imgsz
+        size = int(imgsz or self.default_imgsz)
+        return int(math.ceil(size / MODEL_STRIDE) * MODEL_STRIDE)
+
+    def predict(self, batch, conf, imgsz=None, frame_ids=None):
+        size = self._input_size(imgsz)
+        inputs, transforms = [], []
+        for frame in batch:
+            image, ratio, pad = letterbox(frame, size)
+            inputs.append(image[:, :, ::-1].transpose(2, 0, 1))  # BGR→RGB, HWC→CHW
+            transforms.append((ratio, pad, frame.shape))
+        tensor = np.ascontiguousarray(np.stack(inputs), dtype=np.float32)
+        tensor /= 255.0
+        if self.fixed_batch and self.fixed_batch != len(batch):
+            output = np.concatenate(
+                [self._infer(tensor[idx : idx + 1]) for idx in range(len(batch))]
+            )
+        else:
+            output = self._infer(tensor)
+        return [
+            _restore_coordinates(
+                self._decode(prediction, conf), ratio, pad, shape, self.task
+            )
+            for prediction, (ratio, pad, shape) in zip(output, transforms)
+        ]
+
+
+class OnnxBackend(ExportedModelBackend):
+    """ONNX Runtime 推理；device 为 cuda 且安装了 GPU 版时使用 CUDA，否则 CPU"""
+
+    name = "onnx"
+    export_format = "onnx"
+
+    def _load(self, path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        providers = ["CPUExecutionProvider"]
+        if (self.device or "").startswith("cuda") and (
+            "CUDAExecutionProvider" in ort.get_available_providers()
+        ):
+            providers.insert(0, "CUDAExecutionProvider")
+        self.session = ort.InferenceSession(
+            path, sess_options=options, providers=providers
+        )
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        self.fixed_batch = batch if isinstance(batch, int) else None
+        self.fixed_imgsz = height if isinstance(height, int) else None
+
+    def _embedded_names(self):
+        # ultralytics 导出的 ONNX 在元数据中以字典字面量记录类别名称
+        names = self.session.get_modelmeta().custom_metadata_map.get("names")
+        return ast.literal_eval(names) if names else None
+
+    def _infer(self, tensor):
+        return self.session.run(None, {self._input_name: tensor})[0]
+
+
+class OpenVinoBackend(ExportedModelBackend):
+    """OpenVINO CPU 推理"""
+
+    name = "openvino"
+    export_format = "openvino"
+
+    def _load(self, path):
+        try:
+            import openvino as ov
+        except ImportError:  # 2023.1 之前的版本
+            from openvino import runtime as ov
+
+        xml_path = path
+        if os.path.isdir(path):
+            candidates = sorted(glob.glob(os.path.join(path, "*.xml")))
+            if not candidates:
+                raise FileNotFoundError(f"目录中没有 OpenVINO IR 模型: {path}")
+            xml_path = candidates[0]
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        properties = {"PERFORMANCE_HINT": "LATENCY"}
+        if self.threads:
+            properties["INFERENCE_NUM_THREADS"] = self.threads
+        self.compiled = core.compile_model(model, "CPU", properties)
+        self._output = self.compiled.output(0)
+        shape = self.compiled.input(0).get_partial_shape()
+        self.fixed_batch = shape[0].get_length() if shape[0].is_static else None
+        self.fixed_imgsz = shape[2].get_length() if shape[2].is_static else None
+        self._metadata_dir = os.path.dirname(xml_path)
+
+    def _embedded_names(self):
+        # ultralytics 导出的 OpenVINO 目录带 metadata.yaml
+        metadata_path = os.path.join(self._metadata_dir, "metadata.yaml")
+        if not os.path.exists(metadata_path):
+            return None
+        try:
+            import yaml
+        except ImportError:
+            return None
+        with open(metadata_path, "r", encoding="utf-8") as metadata_file:
+            return (yaml.safe_load(metadata_file) or {}).get("names")
+
+    def _infer(self, tensor):
+        return self.compiled(tensor)[self._output]
+
+
+def _keypoints_for_box(box):
+    """由人员框生成一组正面端坐的 COCO 关键点（归一化坐标）"""
+    x1, y1, x2, y2 = box
+    cx = (x1 + x2) / 2
+    width = x2 - x1
+    height = y2 - y1
+    head_y = y1 + height * 0.12
+    points = np.full((KEYPOINT_COUNT, 2), np.nan, dtype=np.float32)
+    points[0] = (cx, head_y)  # nose
+    points[1] = (cx - width * 0.08, head_y - height * 0.03)  # left_eye
+    points[2] = (cx + width * 0.08, head_y - height * 0.03)  # right_eye
+    points[3] = (cx - width * 0.18, head_y)  # left_ear
+    points[4] = (cx + width * 0.18, head_y)  # right_ear
+    points[5] = (cx - width * 0.3, y1 + height * 0.3)  # left_shoulder
+    points[6] = (cx + width * 0.3, y1 + height * 0.3)  # right_shoulder
+    return points.tolist()
+
+
+def _default_script():
+    """内置脚本：人员在工位端坐若干帧，随后离开若干帧，循环往复"""
+    person = [0.35, 0.2, 0.6, 0.9]
+    furniture = [
+        {"class": "chair", "bbox": [0.33, 0.45, 0.62, 0.95], "score": 0.85},
+        {"class": "desk", "bbox": [0.1, 0.55, 0.9, 0.8], "score": 0.8},
+        {"class": "tv", "bbox": [0.4, 0.3, 0.58, 0.5], "score": 0.9},
+    ]
+    present = {
+        "repeat": 90,
+        "objects": [{"class": "person", "bbox": person, "score": 0.92}] + furniture,
+        "poses": [
+            {"bbox": person, "score": 0.9, "keypoints": _keypoints_for_box(person)}
+        ],
+    }
+    absent = {"repeat": 60, "objects": furniture, "poses": []}
+    return {"normalized": True, "frames": [present, absent]}
+
+
+class ScriptedBackend(InferenceBackend):
+    """
+    可复现的脚本化假后端
+
+    按脚本逐帧回放预设的检测框与关键点，每次 predict 按配置的延迟休眠，
+    无需 ultralytics 与模型权重即可驱动完整的分析/统计/告警链路。
+    回放位置由 frame_ids 中的帧序号决定，目标检测与姿态两个后端对同一路
+    同一帧取同一条脚本，与各自实际处理过多少帧无关；未提供 frame_ids 时
+    按本实例处理过的帧数推进
+    """
+
+    name = "scripted"
+    DEFAULT_NAMES = {0: "person", 56: "chair", 60: "desk", 62: "tv", 63: "laptop"}
+
+    def __init__(self, task, script=None, latency_ms=None, names=None):
+        """
+        Args:
+            task (str): "detect" 或 "pose"
+            script (dict | str): 脚本字典或 JSON 文件路径，默认使用内置脚本；
+                格式为 {"normalized": bool, "frames": [{"repeat": n, "objects": [...],
+                "poses": [...]}]}，objects 项为 {"class", "bbox", "score"}，
+                poses 项为 {"bbox", "score", "keypoints": [[x, y], ...]}
+            latency_ms (float): 每次 predict 的模拟耗时（毫秒）
+            names (dict): 类别ID到名称的映射
+        """
+        super().__init__(task)
+        if isinstance(script, str):
+            with open(script, "r", encoding="utf-8") as script_file:
+                script = json.load(script_file)
+        self.script = script or _default_script()
+        self.normalized = bool(self.script.get("normalized", False))
+        self.latency = (
+            config.SCRIPTED_BACKEND_LATENCY_MS if latency_ms is None else latency_ms
+        ) / 1000.0
+        self.names = dict(names or self.DEFAULT_NAMES)
+        self._class_ids = {name: cls_id for cls_id, name in self.names.items()}
+        self._timeline = [
+            entry
+            for entry in self.script.get("frames", [])
+            for _ in range(max(1, int(entry.get("repeat", 1))))
+        ]
+        if not self._timeline:
+            raise ValueError("脚本中没有任何帧")
+        self.frame_index = 0
+
+    def predict(self, batch, conf, imgsz=None, frame_ids=None):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        outputs = []
+        for pos, frame in enumerate(batch):
+            if frame_ids is None:
+                position = self.frame_index
+            else:
+                _, position = frame_ids[pos]
+            entry = self._timeline[position % len(self._timeline)]
+            self.frame_index += 1
+            outputs.append(self._arrays(entry, frame.shape, conf))
+        return outputs
+
+    def _arrays(self, entry, frame_shape, conf):
+        height, width = frame_shape[:2]
+        scale = np.array([width, height], dtype=np.float32) if self.normalized else 1
+        items = entry.get("objects" if self.task == "detect" else "poses", [])
+        items = [item for item in items if item.get("score", 1.0) >= conf]
+        if not items:
+            return None
+        boxes = np.array([item["bbox"] for item in items], dtype=np.float32)
+        boxes = (boxes.reshape(-1, 2, 2) * scale).reshape(-1, 4)
+        scores = np.array([item.get("score", 1.0) for item in items], dtype=np.float32)
+        if self.task == "detect":
+            classes = np.array(
+                [self._class_ids.get(item["class"], -1) for item in items], dtype=int
+            )
+            return boxes, scores, classes
+        keypoints = np.array(
+            [item["keypoints"] for item in items], dtype=np.float32
+        ).reshape(len(items), -1, 2)
+        return boxes, scores, keypoints * scale
+
+
+def create_backend(name, model_path, task, device=None):
+    """
+    按名称创建推理后端
+
+    Args:
+        name (str): 见 BACKEND_NAMES，为空时取 config.INFERENCE_BACKEND
+        model_path (str): 模型路径（脚本化后端忽略）
+        task (str): "detect" 或 "pose"
+        device (str): 推理设备
+
+    Raises:
+        ValueError: 后端名称未知
+    """
+    name = name or config.INFERENCE_BACKEND
+    if name == "ultralytics":
+        return UltralyticsBackend(model_path, task, device)
+    if name == "onnx":
+        return OnnxBackend(model_path, task, device)
+    if name == "openvino":
+        return OpenVinoBackend(model_path, task, device)
+    if name == "scripted":
+        return ScriptedBackend(task, script=config.SCRIPTED_BACKEND_SCRIPT or None)
+    raise ValueError(f"未知的推理后端: {name}")
@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+离线批量分析 - 对历史录像按文件分发到进程池，每个工作进程各持有一个
+DutyDetector，不按实时帧率节流、不绘制标注，以硬件允许的最快速度分析，
+并将每个文件的在岗时间线与汇总写入统计数据库
+作者：创新创业项目组
+日期：2025年10月25日
+
+用法：
+    python batch_analysis.py recordings/ extra.mp4 [--workers 4] [--stride 2]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import config
+from backends import BACKEND_NAMES, export_models
+from detector import DETECTION_STRATEGIES, DutyDetector
+
+VIDEO_EXTENSIONS = (
+    ".mp4",
+    ".avi",
+    ".mov",
+    ".mkv",
+    ".flv",
+    ".wmv",
+    ".m4v",
+    ".mpg",
+    ".mpeg",
+    ".ts",
+)
+DEFAULT_FPS = 25.0  # 录像未记录帧率时的假定值
+
+# 工作进程内的检测器，由 _init_worker 创建，进程内所有文件共用
+_worker_detector = None
+
+
+def collect_videos(paths, extensions=VIDEO_EXTENSIONS):
+    """
+    展开文件与目录参数为视频文件列表（目录递归查找），去重并保持顺序
+
+    Raises:
+        FileNotFoundError: 路径不存在
+    """
+    videos = []
+    seen = set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, _, files in os.walk(path):
+                found.extend(
+                    os.path.join(root, name)
+                    for name in files
+                    if name.lower().endswith(extensions)
+                )
+            candidates = sorted(found)
+        elif os.path.isfile(path):
+            candidates = [path]
+        else:
+            raise FileNotFoundError(f"路径不存在: {path}")
+        for candidate in candidates:
+            key = os.path.abspath(candidate)
+            if key not in seen:
+                seen.add(key)
+                videos.append(candidate)
+    return videos
+
+
+def build_timeline(samples, end_seconds):
+    """
+    将逐帧在岗判定合并为时间段
+
+    Args:
+        samples (list): 按时间排序的 (时间戳秒, 是否在岗)，是否在岗为 None
+            表示该帧检测失败，在此结束当前段，直到下一个有效判定才开始新段
+        end_seconds (float): 录像结束时间，最后一段延续到此
+
+    Returns:
+        list: [(start_seconds, end_seconds, on_duty), ...]，检测失败的区间不计入
+    """
+    timeline = []
+    current = None  # (段开始时间, 是否在岗)
+    for timestamp, on_duty in samples:
+        if current is not None and current[1] == on_duty:
+            continue
+        if current is not None:
+            timeline.append((current[0], timestamp, current[1]))
+        current = (timestamp, on_duty) if on_duty is not None else None
+    if current is not None:
+        start, state = current
+        timeline.append((start, max(start, end_seconds), state))
+    return timeline
+
+
+def summarize_timeline(timeline):
+    """由时间线计算在岗/离岗总时长、在岗率与最长离岗时长"""
+    on_duty = sum(end - start for start, end, state in timeline if state)
+    off_duty = sum(end - start for start, end, state in timeline if not state)
+    off_segments = [end - start for start, end, state in timeline if not state]
+    total = on_duty + off_duty
+    return {
+        "on_duty_seconds": on_duty,
+        "off_duty_seconds": off_duty,
+        "on_duty_ratio": on_duty / total if total > 0 else 0.0,
+        "longest_off_duty_seconds": max(off_segments, default=0.0),
+        "off_duty_segments": len(off_segments),
+    }
+
+
+def _init_worker(strategy, imgsz, backend, threads):
+    """进程池初始化：每个工作进程加载一次模型，之后处理多个文件"""
+    global _worker_detector
+    # 多个工作进程各自推理，限制每进程线程数避免CPU超额订阅
+    if threads and not config.INFERENCE_INTRA_OP_THREADS:
+        config.INFERENCE_INTRA_OP_THREADS = threads  # onnx/openvino 后端
+    # 并行度由进程池提供，检测器内部固定串行
+    _worker_detector = DutyDetector(
+        parallel_mode="serial", strategy=strategy, backend=backend
+    )
+    _worker_detector.set_input_size(imgsz)
+    torch = sys.modules.get("torch")  # 仅在后端已加载 torch 时调整
+    if torch is not None and threads:
+        torch.set_num_threads(threads)
+
+
+def analyze_video(path, stride=1, detector=None):
+    """
+    逐帧分析一个录像文件
+
+    Args:
+        path (str): 视频路径
+        stride (int): 每隔多少帧分析一次，跳过的帧只 grab 不解码
+        detector (DutyDetector): 使用的检测器，默认取工作进程内的检测器
+
+    Returns:
+        dict: 文件信息、汇总指标与时间线；失败时 status 为 "error"。
+            检测失败的帧计入 error_frames，不按离岗计入时间线
+    """
+    detector = detector or _worker_detector
+    stride = max(1, int(stride))
+    start = time.perf_counter()
+    result = {"video_path": path, "status": "ok", "error": None}
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        result.update(status="error", error="无法打开视频")
+        return result
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    if fps <= 0 or fps > 1000:
+        fps = DEFAULT_FPS
+    stream_id = f"batch:{os.path.abspath(path)}"
+    detector.reset_stream(stream_id)
+    samples = []
+    frame_index = 0
+    analyzed = 0
+    error_frames = 0
+    try:
+        while True:
+            if frame_index % stride:
+                if not capture.grab():
+                    break
+                frame_index += 1
+                continue
+            ok, frame = capture.read()
+            if not ok:
+                break
+            _, _, status_detail = detector.detect(frame, stream_id=stream_id)
+            if status_detail is None:
+                error_frames += 1
+                on_duty = None
+            else:
+                on_duty = bool(status_detail.get("on_duty"))
+            samples.append((frame_index / fps, on_duty))
+            analyzed += 1
+            frame_index += 1
+    except Exception as exc:
+        result.update(status="error", error=str(exc))
+    finally:
+        capture.release()
+        detector.reset_stream(stream_id)
+
+    duration = frame_index / fps
+    timeline = build_timeline(samples, duration)
+    elapsed = time.perf_counter() - start
+    result.update(summarize_timeline(timeline))
+    result.update(
+        {
+            "video_fps": fps,
+            "duration_seconds": duration,
+            "total_frames": frame_index,
+            "analyzed_frames": analyzed,
+            "error_frames": error_frames,
+            "processing_seconds": elapsed,
+            "processing_fps": analyzed / elapsed if elapsed > 0 else 0.0,
+            "timeline": timeline,
+        }
+    )
+    if analyzed == 0 and result["status"] == "ok":
+        result.update(status="error", error="视频中没有可读取的帧")
+    elif analyzed == error_frames and result["status"] == "ok":
+        result.update(status="error", error="所有帧检测失败")
+    return result
+
+
+class BatchResultStore:
+    """把批量分析结果写入统计数据库（与 session_stats 同库，仅主进程写入）"""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS video_analysis (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    video_path TEXT NOT NULL,
+                    analyzed_at REAL NOT NULL,
+                    status TEXT NOT NULL,
+                    error TEXT,
+                    video_fps REAL,
+                    duration_seconds REAL,
+                    total_frames INTEGER,
+                    analyzed_frames INTEGER,
+                    error_frames INTEGER,
+                    on_duty_seconds REAL,
+                    off_duty_seconds REAL,
+                    on_duty_ratio REAL,
+                    longest_off_duty_seconds REAL,
+                    off_duty_segments INTEGER,
+                    processing_seconds REAL,
+                    processing_fps REAL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS video_timeline (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    analysis_id INTEGER NOT NULL,
+                    start_seconds REAL NOT NULL,
+                    end_seconds REAL NOT NULL,
+                    on_duty INTEGER NOT NULL,
+                    FOREIGN KEY(analysis_id) REFERENCES video_analysis(id)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_video_timeline_analysis "
+                "ON video_timeline(analysis_id)"
+            )
+            columns = {
+                row[1]
+                for row in self._conn.execute("PRAGMA table_info(video_analysis)")
+            }
+            if "error_frames" not in columns:  # 旧版本建立的表
+                self._conn.execute(
+                    "ALTER TABLE video_analysis ADD COLUMN error_frames INTEGER"
+                )
+
+    def save(self, result):
+        """写入一个文件的汇总与时间线，返回 video_analysis 记录ID"""
+        with self._conn:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO video_analysis (
+                    video_path, analyzed_at, status, error, video_fps,
+                    duration_seconds, total_frames, analyzed_frames,
+                    error_frames, on_duty_seconds, off_duty_seconds,
+                    on_duty_ratio, longest_off_duty_seconds, off_duty_segments,
+                    processing_seconds, processing_fps
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    os.path.abspath(result["video_path"]),
+                    time.time(),
+                    result["status"],
+                    result.get("error"),
+                    result.get("video_fps"),
+                    result.get("duration_seconds"),
+                    result.get("total_frames"),
+                    result.get("analyzed_frames"),
+                    result.get("error_frames"),
+                    result.get("on_duty_seconds"),
+                    result.get("off_duty_seconds"),
+                    result.get("on_duty_ratio"),
+                    result.get("longest_off_duty_seconds"),
+                    result.get("off_duty_segments"),
+                    result.get("processing_seconds"),
+                    result.get("processing_fps"),
+                ),
+            )
+            analysis_id = cursor.lastrowid
+            self._conn.executemany(
+                "INSERT INTO video_timeline "
+                "(analysis_id, start_seconds, end_seconds, on_duty) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (analysis_id, start, end, 1 if on_duty else 0)
+                    for start, end, on_duty in result.get("timeline", [])
+                ],
+            )
+        return analysis_id
+
+    def close(self):
+        self._conn.close()
+
+
+def _default_workers(file_count):
+    return max(1, min(file_count, (os.cpu_count() or 2) // 2))
+
+
+def run_batch(
+    videos,
+    db_path=None,
+    workers=None,
+    stride=1,
+    strategy=None,
+    imgsz=None,
+    backend=None,
+    on_result=None,
+):
+    """
+    用进程池分析一批录像并写入数据库
+
+    Args:
+        videos (list): 视频文件路径
+        db_path (str): 数据库路径，默认 config.STATS_DB_PATH
+        workers (int): 工作进程数，默认 min(文件数, CPU核数/2)
+        stride (int): 帧间隔
+        strategy (str): 检测策略，默认取配置
+        imgsz (int): 推理输入分辨率，默认取配置
+        backend (str): 推理后端，默认取配置
+        on_result: 每个文件完成时的回调 on_result(result)
+
+    Returns:
+        list: 各文件的分析结果（含 analysis_id），顺序与完成顺序一致
+    """
+    if not videos:
+        return []
+    workers = workers or _default_workers(len(videos))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    backend_name = backend or config.INFERENCE_BACKEND
+    # 在主进程先完成导出，避免多个工作进程同时导出同一模型
+    export_models(backend_name, (config.MODEL_PATH, config.POSE_MODEL_PATH))
+    # 大文件先处理，减少进程池尾部只剩一个长任务的情况
+    ordered = sorted(videos, key=lambda path: -os.path.getsize(path))
+    store = BatchResultStore(db_path or config.STATS_DB_PATH)
+    results = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context(config.WORKER_START_METHOD or None),
+            initializer=_init_worker,
+            initargs=(strategy, imgsz, backend, threads),
+        ) as pool:
+            futures = {
+                pool.submit(analyze_video, path, stride): path for path in ordered
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    result = {
+                        "video_path": futures[future],
+                        "status": "error",
+                        "error": str(exc),
+                    }
+                result["analysis_id"] = store.save(result)
+                results.append(result)
+                if on_result:
+                    on_result(result)
+    finally:
+        store.close()
+    return results
+
+
+def _print_result(result):
+    if result["status"] != "ok":
+        print(f"✗ {result['video_path']}: {result['error']}")
+        return
+    print(
+        f"✓ {result['video_path']}: 时长 {result['duration_seconds']:.0f}s，"
+        f"在岗率 {result['on_duty_ratio']:.1%}，"
+        f"最长离岗 {result['longest_off_duty_seconds']:.0f}s，"
+        f"分析 {result['processing_fps']:.1f} 帧/秒"
+        + (f"，检测失败 {result['error_frames']} 帧" if result["error_frames"] else "")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线批量分析历史录像")
+    parser.add_argument("paths", nargs="+", help="视频文件或目录（目录递归查找）")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="工作进程数（默认 CPU核数/2）"
+    )
+    parser.add_argument(
+        "--stride", type=int, default=1, help="每隔多少帧分析一次（默认逐帧）"
+    )
+    parser.add_argument(
+        "--strategy", default=None, choices=DETECTION_STRATEGIES, help="检测策略"
+    )
+    parser.add_argument("--imgsz", type=int, default=None, help="推理输入分辨率")
+    parser.add_argument(
+        "--backend", default=None, choices=BACKEND_NAMES, help="推理后端"
+    )
+    parser.add_argument(
+        "--db",
+        default=config.STATS_DB_PATH,
+        help=f"结果数据库（默认 {config.STATS_DB_PATH}）",
+    )
+    args = parser.parse_args()
+
+    try:
+        videos = collect_videos(args.paths)
+    except FileNotFoundError as exc:
+        parser.error(str(exc))
+    if not videos:
+        parser.error("未找到视频文件")
+
+    workers = args.workers or _default_workers(len(videos))
+    print(f"共 {len(videos)} 个文件，{workers} 个工作进程，结果写入 {args.db}")
+    start = time.perf_counter()
+    results = run_batch(
+        videos,
+        db_path=args.db,
+        workers=workers,
+        stride=args.stride,
+        strategy=args.strategy,
+        imgsz=args.imgsz,
+        backend=args.backend,
+        on_result=_print_result,
+    )
+    failed = sum(1 for result in results if result["status"] != "ok")
+    print(
+        f"完成 {len(results) - failed}/{len(results)} 个文件，"
+        f"用时 {time.perf_counter() - start:.1f}s"
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+推理后端基准 - 用同一组帧对比 ultralytics / ONNX Runtime / OpenVINO 的
+目标检测与姿态模型单次推理耗时，给出相对第一个后端的加速比并写出 JSON
+
+用法：
+    python -m bench.backend_bench [--backends ultralytics onnx openvino]
+    python -m bench.backend_bench --synthetic --imgsz 640 320 --threads 4
+    python -m bench.backend_bench --synthetic --update-baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import config
+from backends import BACKEND_NAMES, create_backend
+from bench.pipeline_bench import (
+    write_report,
+    environment_info,
+    load_video_frames,
+    synthetic_frames,
+)
+
+DEFAULT_OUTPUT = os.path.join("bench", "backend_results.json")
+DEFAULT_BASELINE = os.path.join("bench", "backend_baseline.json")
+MODEL_TASKS = (("object", "detect"), ("pose", "pose"))
+
+
+def time_backend(backend, frames, imgsz, batch_size, warmup):
+    """
+    逐批推理并统计耗时
+
+    Returns:
+        dict: 每帧耗时的 mean/p50/p95（毫秒）与等效 FPS
+    """
+    batches = [
+        frames[idx : idx + batch_size] for idx in range(0, len(frames), batch_size)
+    ]
+    for idx in range(warmup):
+        backend.predict(batches[idx % len(batches)], conf=0.25, imgsz=imgsz)
+    per_frame = []
+    start = time.perf_counter()
+    for batch in batches:
+        batch_start = time.perf_counter()
+        backend.predict(batch, conf=0.25, imgsz=imgsz)
+        per_frame.append((time.perf_counter() - batch_start) / len(batch) * 1000.0)
+    elapsed = time.perf_counter() - start
+    return {
+        "mean_ms": float(np.mean(per_frame)),
+        "p50_ms": float(np.percentile(per_frame, 50)),
+        "p95_ms": float(np.percentile(per_frame, 95)),
+        "fps": len(frames) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run(
+    frames,
+    backends,
+    resolutions,
+    batch_size=1,
+    warmup=3,
+    threads=None,
+    model_paths=None,
+):
+    """
+    依次加载每个后端的两个模型并计时；加载失败的后端记录错误后跳过
+
+    Args:
+        model_paths (dict): {"object": 路径, "pose": 路径}，默认取配置
+    """
+    if threads:
+        config.INFERENCE_INTRA_OP_THREADS = threads
+    model_paths = model_paths or {
+        "object": config.MODEL_PATH,
+        "pose": config.POSE_MODEL_PATH,
+    }
+    results = []
+    for name in backends:
+        for label, task in MODEL_TASKS:
+            try:
+                load_start = time.perf_counter()
+                backend = create_backend(name, model_paths[label], task, config.DEVICE)
+                load_seconds = time.perf_counter() - load_start
+            except Exception as exc:  # 可选依赖缺失、导出失败等
+                print(f"⚠️ 跳过 {name}/{label}: {exc}")
+                results.append({"backend": name, "model": label, "error": str(exc)})
+                continue
+            torch = sys.modules.get("torch")
+            if threads and torch is not None:
+                torch.set_num_threads(threads)  # ultralytics 后端同样限定线程数
+            try:
+                for imgsz in resolutions:
+                    result = time_backend(backend, frames, imgsz, batch_size, warmup)
+                    result.update(
+                        backend=name,
+                        model=label,
+                        imgsz=imgsz,
+                        batch_size=batch_size,
+                        load_seconds=load_seconds,
+                    )
+                    results.append(result)
+            finally:
+                backend.close()
+    _add_speedups(results, backends[0] if backends else None)
+    return results
+
+
+def _add_speedups(results, reference):
+    """以第一个后端为基准计算各用例的加速比"""
+    baseline = {
+        (r["model"], r["imgsz"]): r["mean_ms"]
+        for r in results
+        if r["backend"] == reference and "error" not in r
+    }
+    for result in results:
+        reference_ms = baseline.get((result["model"], result.get("imgsz")))
+        if reference_ms and "error" not in result:
+            result["speedup"] = reference_ms / result["mean_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理后端基准")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["ultralytics", "onnx", "openvino"],
+        choices=[name for name in BACKEND_NAMES if name != "scripted"],
+        help="参与对比的后端，第一个作为加速比基准",
+    )
+    parser.add_argument(
+        "--video",
+        default=None,
+        help=f"回放的视频文件（默认 config.TEST_VIDEO_PATH={config.TEST_VIDEO_PATH}）",
+    )
+    parser.add_argument(
+        "--synthetic", action="store_true", help="使用合成帧，不读取视频"
+    )
+    parser.add_argument("--frames", type=int, default=50, help="每个用例推理的帧数")
+    parser.add_argument("--warmup", type=int, default=3, help="每个用例的预热批数")
+    parser.add_argument("--batch", type=int, default=1, help="每次推理的帧数")
+    parser.add_argument("--width", type=int, default=config.CAMERA_WIDTH)
+    parser.add_argument("--height", type=int, default=config.CAMERA_HEIGHT)
+    parser.add_argument(
+        "--imgsz", nargs="+", type=int, default=[config.EXPORT_IMGSZ], help="推理分辨率"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="算子内线程数（默认取 INFERENCE_INTRA_OP_THREADS / 运行时默认）",
+    )
+    parser.add_argument("--model", default=config.MODEL_PATH, help="目标检测模型")
+    parser.add_argument("--pose-model", default=config.POSE_MODEL_PATH, help="姿态模型")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON 结果输出路径")
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help=f"结果同时写为基线 {DEFAULT_BASELINE}",
+    )
+    args = parser.parse_args()
+    if os.path.abspath(args.output) == os.path.abspath(DEFAULT_BASELINE):
+        parser.error("--output 不能指向基线文件，更新基线请使用 --update-baseline")
+
+    video = None if args.synthetic else (args.video or config.TEST_VIDEO_PATH)
+    if video and not os.path.exists(video):
+        if args.video:
+            parser.error(f"视频文件不存在: {video}")
+        print(f"⚠️ 未找到 {video}，改用合成帧")
+        video = None
+    if video:
+        frames = load_video_frames(video, args.frames, args.width, args.height)
+    else:
+        frames = synthetic_frames(args.frames, args.width, args.height)
+
+    results = run(
+        frames,
+        args.backends,
+        args.imgsz,
+        batch_size=max(1, args.batch),
+        warmup=args.warmup,
+        threads=args.threads,
+        model_paths={"object": args.model, "pose": args.pose_model},
+    )
+    print("后端          模型      分辨率   均值(ms)   p95(ms)      FPS   加速比")
+    for result in results:
+        if "error" in result:
+            continue
+        print(
+            f"{result['backend']:<14}{result['model']:<8}{result['imgsz']:>8}"
+            f"{result['mean_ms']:>11.1f}{result['p95_ms']:>10.1f}"
+            f"{result['fps']:>9.1f}{result.get('speedup', 0.0):>8.2f}x"
+        )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": video or "synthetic",
+        "frame_size": [args.width, args.height],
+        "model_path": args.model,
+        "pose_model_path": args.pose_model,
+        "device": config.DEVICE,
+        "threads": args.threads or config.INFERENCE_INTRA_OP_THREADS,
+        "environment": environment_info(),
+        "results": results,
+    }
+    write_report(report, args.output)
+    print(f"✓ 结果已写入 {args.output}")
+    if args.update_baseline:
+        write_report(report, DEFAULT_BASELINE)
+        print(f"✓ 基线已更新 {DEFAULT_BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
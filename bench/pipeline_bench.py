@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+检测流水线基准 - 不依赖摄像头与Web服务，用录像或合成帧回放
+DutyDetector（检测 → 绘制 → 编码），按检测策略与推理分辨率给出
+FPS、各阶段耗时分位数与内存占用，并写出 JSON 基线用于回归对比
+
+用法：
+    python -m bench.pipeline_bench [--video test_video.mp4] [--frames 200]
+    python -m bench.pipeline_bench --synthetic --compare bench/pipeline_baseline.json
+    python -m bench.pipeline_bench --synthetic --update-baseline
+    python -m bench.pipeline_bench --synthetic --backend scripted
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import config
+from backends import BACKEND_NAMES
+from detector import DETECTION_STRATEGIES, DutyDetector
+from metrics import process_rss_bytes, stage_metrics
+from pipeline import AnnotationBuffer
+from utils import create_test_frame, resize_frame
+
+BENCH_STREAM = "bench"
+DEFAULT_OUTPUT = os.path.join("bench", "pipeline_results.json")
+DEFAULT_BASELINE = os.path.join("bench", "pipeline_baseline.json")
+# 回归判定所比较的指标：(指标路径, 越大越好)。峰值RSS是整个进程的最高水位，
+# 同一进程内前面用例的峰值会带入后面的用例，结果依赖用例顺序，只作参考不参与判定
+REGRESSION_METRICS = (
+    (("fps",), True),
+    (("stages", "detect", "p95_ms"), False),
+)
+
+
+def load_video_frames(path, limit, width, height):
+    """读取录像前 limit 帧到内存，避免解码耗时混入检测耗时"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"无法打开视频: {path}")
+    frames = []
+    try:
+        while len(frames) < limit:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            frames.append(resize_frame(frame, width, height))
+    finally:
+        capture.release()
+    if not frames:
+        raise ValueError(f"视频中没有可读取的帧: {path}")
+    return frames
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """由 create_test_frame 生成可复现的合成帧，叠加移动色块模拟画面变化"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for idx in range(count):
+        frame = create_test_frame(width, height, text=f"frame {idx}")
+        x = int((idx * 17) % max(1, width - 80))
+        y = int(height // 3 + 40 * np.sin(idx / 5))
+        color = tuple(int(c) for c in rng.integers(80, 255, size=3))
+        cv2.rectangle(frame, (x, y), (x + 80, y + 160), color, -1)
+        frames.append(frame)
+    return frames
+
+
+def _git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                stderr=subprocess.DEVNULL,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            .decode("ascii")
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info():
+    torch = sys.modules.get("torch")
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "torch": getattr(torch, "__version__", None),
+        "torch_threads": torch.get_num_threads() if torch is not None else None,
+        "git_revision": _git_revision(),
+    }
+
+
+def run_case(detector, frames, imgsz, warmup):
+    """
+    回放一组帧并统计
+
+    Returns:
+        dict: fps、各阶段耗时摘要；peak_rss_mb 为截至本用例结束时进程的
+            常驻内存最高水位，rss_growth_mb 为本用例期间常驻内存的增长
+    """
+    detector.set_input_size(imgsz)
+    detector.reset_stream(BENCH_STREAM)  # 每个用例从空的时序状态开始
+    buffer = AnnotationBuffer()
+    quality = [cv2.IMWRITE_JPEG_QUALITY, config.JPEG_QUALITY]
+
+    def process(frame):
+        detections, status, _ = detector.detect(frame, stream_id=BENCH_STREAM)
+        draw_start = time.perf_counter()
+        out = buffer.acquire(frame.shape, frame.dtype)
+        if detections is not None:
+            detector.draw_detections(frame, detections, status_text=status, out=out)
+        else:
+            np.copyto(out, frame)
+        buffer.swap()
+        encode_start = time.perf_counter()
+        stage_metrics.record(BENCH_STREAM, "draw", encode_start - draw_start)
+        cv2.imencode(".jpg", out, quality)
+        stage_metrics.record(
+            BENCH_STREAM, "encode", time.perf_counter() - encode_start
+        )
+
+    start_rss = process_rss_bytes() or 0
+    for idx in range(warmup):
+        process(frames[idx % len(frames)])
+    stage_metrics.reset()
+    detector.object_model_runs = detector.object_model_skips = 0
+
+    peak_rss = max(start_rss, process_rss_bytes() or 0)
+    start = time.perf_counter()
+    for frame in frames:
+        frame_start = time.perf_counter()
+        process(frame)
+        stage_metrics.record(
+            BENCH_STREAM, "end_to_end", time.perf_counter() - frame_start
+        )
+        peak_rss = max(peak_rss, process_rss_bytes() or 0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "fps": len(frames) / elapsed if elapsed > 0 else 0.0,
+        "frames": len(frames),
+        "elapsed_s": elapsed,
+        "peak_rss_mb": peak_rss / (1024 * 1024),
+        "rss_growth_mb": max(0, peak_rss - start_rss) / (1024 * 1024),
+        "object_model_runs": detector.object_model_runs,
+        "object_model_skips": detector.object_model_skips,
+        "stages": stage_metrics.summary(BENCH_STREAM).get(BENCH_STREAM, {}),
+    }
+
+
+def run(frames, strategies, resolutions, warmup=5, parallel_mode=None, backend=None):
+    """依次运行每种检测策略与推理分辨率组合"""
+    # 基准期间窗口需覆盖整段回放
+    stage_metrics.enabled = True
+    stage_metrics.window = max(stage_metrics.window, 3600.0)
+    results = []
+    for strategy in strategies:
+        detector = DutyDetector(
+            parallel_mode=parallel_mode, strategy=strategy, backend=backend
+        )
+        try:
+            for imgsz in resolutions:
+                result = run_case(detector, frames, imgsz, warmup)
+                result.update(
+                    strategy=strategy,
+                    imgsz=imgsz,
+                    parallel_mode=detector.parallel_mode,
+                )
+                results.append(result)
+                print(
+                    f"{strategy:<12}{imgsz or '默认':>8}{result['fps']:>10.2f}"
+                    f"{result['stages'].get('detect', {}).get('p95_ms', 0.0):>14.1f}"
+                    f"{result['peak_rss_mb']:>15.0f}{result['rss_growth_mb']:>12.1f}"
+                )
+        finally:
+            detector.close()
+    return results
+
+
+def _lookup(result, path):
+    value = result
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线逐项对比，超出容差的指标视为回归
+
+    Returns:
+        list: 回归描述字符串
+    """
+    previous = {(r["strategy"], r["imgsz"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get((result["strategy"], result["imgsz"]))
+        if old is None:
+            continue
+        for path, higher_is_better in REGRESSION_METRICS:
+            current, reference = _lookup(result, path), _lookup(old, path)
+            if not current or not reference:
+                continue
+            change = (current - reference) / reference
+            if (higher_is_better and change < -tolerance) or (
+                not higher_is_better and change > tolerance
+            ):
+                regressions.append(
+                    f"{result['strategy']}/{result['imgsz']} {'.'.join(path)}: "
+                    f"{reference:.2f} → {current:.2f} ({change:+.1%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检测流水线基准")
+    parser.add_argument(
+        "--video",
+        default=None,
+        help=f"回放的视频文件（默认 config.TEST_VIDEO_PATH={config.TEST_VIDEO_PATH}）",
+    )
+    parser.add_argument(
+        "--synthetic", action="store_true", help="使用合成帧，不读取视频"
+    )
+    parser.add_argument("--frames", type=int, default=200, help="每个用例回放的帧数")
+    parser.add_argument("--warmup", type=int, default=5, help="每个用例的预热帧数")
+    parser.add_argument("--width", type=int, default=config.CAMERA_WIDTH)
+    parser.add_argument("--height", type=int, default=config.CAMERA_HEIGHT)
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        default=list(DETECTION_STRATEGIES),
+        choices=DETECTION_STRATEGIES,
+    )
+    parser.add_argument(
+        "--imgsz",
+        nargs="+",
+        type=int,
+        default=list(config.ADAPTIVE_IMGSZ_LADDER),
+        help="推理输入分辨率（0 表示模型默认）",
+    )
+    parser.add_argument(
+        "--parallel-mode", default=None, help="检测器并行模式（默认取配置）"
+    )
+    parser.add_argument(
+        "--backend",
+        default=None,
+        choices=BACKEND_NAMES,
+        help="推理后端（默认取配置；scripted 可单独测量模型以外的流水线开销）",
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON 结果输出路径")
+    parser.add_argument("--compare", default=None, help="与之对比的基线 JSON")
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="结果同时写为基线（--compare 指定的文件，默认 "
+        f"{DEFAULT_BASELINE}）；对比发现回归时不更新",
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.1, help="回归容差（相对变化，默认10%%）"
+    )
+    args = parser.parse_args()
+    baseline_path = args.compare or DEFAULT_BASELINE
+    if os.path.abspath(args.output) == os.path.abspath(baseline_path):
+        parser.error("--output 不能指向基线文件，更新基线请使用 --update-baseline")
+
+    video = None if args.synthetic else (args.video or config.TEST_VIDEO_PATH)
+    if video and not os.path.exists(video):
+        if args.video:
+            parser.error(f"视频文件不存在: {video}")
+        print(f"⚠️ 未找到 {video}，改用合成帧")
+        video = None
+    if video:
+        frames = load_video_frames(video, args.frames, args.width, args.height)
+    else:
+        frames = synthetic_frames(args.frames, args.width, args.height)
+
+    baseline = None
+    if args.compare and not os.path.exists(args.compare):
+        if not args.update_baseline:
+            parser.error(f"基线文件不存在: {args.compare}")
+        print(f"⚠️ 基线 {args.compare} 不存在，本次结果将作为新基线")
+    elif args.compare:
+        with open(args.compare, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f"帧来源: {video or '合成帧'}  帧数: {len(frames)}")
+    print("策略        分辨率       FPS   检测p95(ms)  进程峰值RSS(MB)  RSS增长(MB)")
+    results = run(
+        frames,
+        args.strategies,
+        [size or None for size in args.imgsz],
+        warmup=args.warmup,
+        parallel_mode=args.parallel_mode,
+        backend=args.backend,
+    )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": video or "synthetic",
+        "frame_size": [args.width, args.height],
+        "model_path": config.MODEL_PATH,
+        "pose_model_path": config.POSE_MODEL_PATH,
+        "device": config.DEVICE,
+        "backend": args.backend or config.INFERENCE_BACKEND,
+        "environment": environment_info(),
+        "results": results,
+    }
+    write_report(report, args.output)
+    print(f"✓ 结果已写入 {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("✗ 发现性能回归:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("✓ 与基线相比无回归")
+    if args.update_baseline:
+        write_report(report, baseline_path)
+        print(f"✓ 基线已更新 {baseline_path}")
+
+
+def write_report(report, path):
+    """把结果 JSON 写到 path，必要时创建目录"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(report, output, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+进程模式摄像头工作器 - 每路摄像头独立进程采集与检测，
+通过 multiprocessing.shared_memory 环形缓冲区把标注帧与状态交回Web进程
+作者：创新创业项目组
+日期：2025年10月20日
+"""
+
+import json
+import multiprocessing as mp
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import config
+from utils import resize_frame, to_jsonable
+
+
+class SharedFrameRing:
+    """
+    单写多读的共享内存帧环形缓冲区
+
+    布局: [全局头: 最新序号] + N个槽位 [槽头 | 帧数据 | 状态JSON]
+    槽头中的起止序号构成顺序锁，读端复制完成后校验序号未变化，
+    保证不会读到写了一半的帧
+    """
+
+    GLOBAL_HEADER = struct.Struct("<q")
+    # seq_begin, seq_end, height, width, status_len, timestamp
+    SLOT_HEADER = struct.Struct("<qqiiid")
+
+    def __init__(
+        self,
+        name=None,
+        max_width=None,
+        max_height=None,
+        slots=None,
+        status_capacity=16384,
+        create=False,
+    ):
+        self.max_width = int(max_width or config.MAX_FRAME_WIDTH)
+        self.max_height = int(max_height or config.MAX_FRAME_HEIGHT)
+        self.slots = int(slots or config.SHARED_FRAME_SLOTS)
+        self.status_capacity = int(status_capacity)
+        self.frame_capacity = self.max_width * self.max_height * 3
+        self.slot_size = (
+            self.SLOT_HEADER.size + self.frame_capacity + self.status_capacity
+        )
+        total_size = self.GLOBAL_HEADER.size + self.slot_size * self.slots
+
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=total_size
+            )
+            self.GLOBAL_HEADER.pack_into(self.shm.buf, 0, 0)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self._write_seq = 0
+
+    def spec(self):
+        """传给子进程用于重新挂载的参数"""
+        return {
+            "name": self.name,
+            "max_width": self.max_width,
+            "max_height": self.max_height,
+            "slots": self.slots,
+            "status_capacity": self.status_capacity,
+        }
+
+    def _slot_offset(self, seq):
+        return self.GLOBAL_HEADER.size + (seq % self.slots) * self.slot_size
+
+    def latest_seq(self):
+        return self.GLOBAL_HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def write(self, frame, status):
+        """写入一帧与状态字典（仅由单个写进程调用）"""
+        if frame.shape[1] > self.max_width or frame.shape[0] > self.max_height:
+            frame = resize_frame(frame, self.max_width, self.max_height)
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        height, width = frame.shape[:2]
+
+        status_bytes = json.dumps(to_jsonable(status), ensure_ascii=False).encode(
+            "utf-8"
+        )
+        if len(status_bytes) > self.status_capacity:
+            status_bytes = json.dumps(
+                {"status": status.get("status"), "truncated": True},
+                ensure_ascii=False,
+            ).encode("utf-8")
+
+        self._write_seq += 1
+        seq = self._write_seq
+        offset = self._slot_offset(seq)
+        buf = self.shm.buf
+        frame_offset = offset + self.SLOT_HEADER.size
+        status_offset = frame_offset + self.frame_capacity
+
+        # 先写起始序号，数据写完后再写结束序号
+        self.SLOT_HEADER.pack_into(buf, offset, seq, -1, height, width, 0, 0.0)
+        target = np.ndarray(
+            (height, width, 3), dtype=np.uint8, buffer=buf, offset=frame_offset
+        )
+        np.copyto(target, frame)
+        buf[status_offset : status_offset + len(status_bytes)] = status_bytes
+        self.SLOT_HEADER.pack_into(
+            buf, offset, seq, seq, height, width, len(status_bytes), time.time()
+        )
+        self.GLOBAL_HEADER.pack_into(buf, 0, seq)
+        return seq
+
+    def read(self, after_seq=0, alloc=None):
+        """
+        读取最新一帧
+
+        Args:
+            after_seq (int): 上次读取到的序号，没有更新的帧时返回 None
+            alloc: 可选的 alloc(shape) 回调，返回用于接收帧的预分配数组
+
+        Returns:
+            tuple | None: (序号, 帧副本, 状态字典, 写入时间戳)
+        """
+        seq = self.latest_seq()
+        if seq <= after_seq:
+            return None
+        offset = self._slot_offset(seq)
+        buf = self.shm.buf
+        _, seq_end, height, width, status_len, timestamp = self.SLOT_HEADER.unpack_from(
+            buf, offset
+        )
+        if seq_end != seq:
+            return None
+        frame_offset = offset + self.SLOT_HEADER.size
+        status_offset = frame_offset + self.frame_capacity
+        source = np.ndarray(
+            (height, width, 3), dtype=np.uint8, buffer=buf, offset=frame_offset
+        )
+        if alloc is None:
+            frame = source.copy()
+        else:
+            frame = alloc(source.shape)
+            np.copyto(frame, source)
+        status_bytes = bytes(buf[status_offset : status_offset + status_len])
+        seq_begin = self.SLOT_HEADER.unpack_from(buf, offset)[0]
+        if seq_begin != seq:
+            # 复制期间被写端覆盖，放弃本次读取
+            return None
+        return seq, frame, json.loads(status_bytes.decode("utf-8")), timestamp
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def camera_worker_main(cam_id, source, ring_spec, stop_event, pause_event):
+    """子进程入口：独立完成采集、检测与绘制，结果写入共享内存"""
+    # 子进程内再导入，避免Web进程在进程模式下加载模型
+    from detector import DutyDetector
+    from pipeline import (
+        AdaptiveRateController,
+        AnnotationBuffer,
+        FrameGrabber,
+        MotionGate,
+        configure_camera,
+        open_camera,
+    )
+    from metrics import stage_metrics
+    from utils import draw_status_text
+
+    ring = SharedFrameRing(**ring_spec)
+    camera = open_camera(source)
+    if camera is None:
+        print(f"⚠️ 摄像头 {cam_id} 不可用: {source}")
+        ring.close()
+        return
+    configure_camera(camera)
+
+    parallel_mode = None  # 默认取配置
+    if config.DETECTOR_PARALLEL_MODE == "process":
+        # 工作进程是守护进程，不能再创建姿态模型子进程；多路摄像头的并行
+        # 已由各自的工作进程提供，进程内改用线程并行
+        parallel_mode = "thread"
+        print(f"⚠️ 摄像头 {cam_id} 工作进程内不支持进程并行，检测器改用 thread 模式")
+    try:
+        detector = DutyDetector(parallel_mode=parallel_mode)
+    except Exception as exc:
+        print(f"⚠️ 摄像头 {cam_id} 检测器初始化失败: {exc}")
+        camera.release()
+        ring.close()
+        return
+
+    grabber = FrameGrabber(camera, name=f"frame-grabber-{cam_id}", cam_id=cam_id)
+    motion_gate = MotionGate()
+    rate_controller = AdaptiveRateController()
+    output_buffer = AnnotationBuffer()  # 结果写入共享内存时会被复制，单缓冲即可复用
+    last_result = None
+    last_metrics_time = 0.0
+    grabber.start()
+    print(f"✓ 摄像头工作进程已启动: {cam_id}")
+
+    try:
+        while not stop_event.is_set():
+            if pause_event.is_set():
+                time.sleep(0.2)
+                continue
+            wait = rate_controller.wait_time()
+            if wait > 0:
+                time.sleep(min(wait, 0.05))
+                continue
+            item = grabber.read_latest(timeout=0.5)
+            if item is None:
+                continue
+            _, frame, frame_time = item
+            try:
+                if motion_gate.should_skip(frame, last_result is not None):
+                    # 画面几乎没有变化，复用上次检测结果
+                    detection_result, status, status_detail = last_result
+                else:
+                    detector.set_input_size(rate_controller.imgsz)
+                    detect_start = time.perf_counter()
+                    detection_result, status, status_detail = detector.detect(
+                        frame, stream_id=cam_id
+                    )
+                    rate_controller.record(time.perf_counter() - detect_start)
+                    if status_detail is not None:
+                        last_result = (detection_result, status, status_detail)
+                overlay = None
+                draw_start = time.perf_counter()
+                if config.STREAM_OVERLAY_MODE == "client":
+                    # 浏览器端叠加：回传原始画面与检测数据
+                    overlay = detector.export_overlay(
+                        detection_result, status, frame.shape
+                    )
+                    annotated = frame
+                else:
+                    annotated = output_buffer.acquire(frame.shape, frame.dtype)
+                    if detection_result is not None:
+                        detector.draw_detections(
+                            frame, detection_result, status_text=status, out=annotated
+                        )
+                    else:
+                        np.copyto(annotated, frame)
+                        draw_status_text(
+                            annotated, status, position="top-left", inplace=True
+                        )
+                stage_metrics.record(cam_id, "draw", time.perf_counter() - draw_start)
+                frame_on_duty = (
+                    status_detail.get("frame_on_duty") if status_detail else None
+                )
+            except Exception as exc:
+                print(f"帧处理错误: {exc}")
+                annotated = frame
+                status = f"处理错误: {exc}"
+                frame_on_duty = None
+                overlay = None
+            grabber.mark_processed(frame_time)
+            status_dict = {
+                "status": status,
+                "frame_on_duty": frame_on_duty,
+                "overlay": overlay,
+                "pipeline": dict(grabber.get_stats(), **motion_gate.get_stats()),
+                "rate_controller": rate_controller.get_state(),
+            }
+            now = time.time()
+            if now - last_metrics_time >= 1.0:
+                # 阶段耗时摘要计算相对较重，每秒随状态回传一次
+                status_dict["stages"] = stage_metrics.summary(cam_id).get(cam_id, {})
+                status_dict["stage_histograms"] = stage_metrics.export(cam_id).get(
+                    cam_id, {}
+                )
+                last_metrics_time = now
+            ring.write(annotated, status_dict)
+    finally:
+        grabber.stop()
+        camera.release()
+        detector.close()
+        ring.close()
+
+
+class CameraWorkerHandle:
+    """Web进程侧的工作进程句柄：负责创建共享内存、启动子进程并回读结果"""
+
+    def __init__(self, context, on_result=None, poll_interval=0.005):
+        """
+        Args:
+            context: 对应的 CameraContext
+            on_result: 每读到一帧时的回调 on_result(context, status_dict)
+            poll_interval (float): 无新帧时的轮询间隔（秒）
+        """
+        self.context = context
+        self.on_result = on_result
+        self.poll_interval = poll_interval
+        self._mp = mp.get_context(config.WORKER_START_METHOD or None)
+        self.stop_event = self._mp.Event()
+        self.pause_event = self._mp.Event()
+        self.ring = None
+        self.process = None
+        self._reader = None
+        self._running = False
+        self._last_seq = 0
+        self._remote_stats = {}
+        self._remote_stages = {}
+        self._remote_histograms = {}
+        self.received_frames = 0
+
+    def start(self):
+        if self._running:
+            return
+        self.ring = SharedFrameRing(create=True)
+        self.process = self._mp.Process(
+            target=camera_worker_main,
+            args=(
+                self.context.cam_id,
+                self.context.source,
+                self.ring.spec(),
+                self.stop_event,
+                self.pause_event,
+            ),
+            name=f"camera-worker-{self.context.cam_id}",
+            daemon=True,
+        )
+        self.process.start()
+        self._running = True
+        self._reader = threading.Thread(
+            target=self._read_loop,
+            name=f"camera-reader-{self.context.cam_id}",
+            daemon=True,
+        )
+        self._reader.start()
+
+    def _read_loop(self):
+        while self._running:
+            item = self.ring.read(
+                self._last_seq, alloc=self.context.output_buffer.acquire
+            )
+            if item is None:
+                time.sleep(self.poll_interval)
+                continue
+            seq, frame, status, _ = item
+            self._last_seq = seq
+            self.received_frames += 1
+            self._remote_stats = status.get("pipeline") or {}
+            if "stages" in status:
+                self._remote_stages = status["stages"]
+                self._remote_histograms = status.get("stage_histograms") or {}
+            self.context.publish(
+                frame, status.get("status", ""), status, overlay=status.get("overlay")
+            )
+            if self.on_result is not None:
+                self.on_result(self.context, status)
+
+    def set_paused(self, paused):
+        if paused:
+            self.pause_event.set()
+        else:
+            self.pause_event.clear()
+
+    def get_stage_summary(self):
+        """工作进程最近一次回传的分阶段耗时摘要"""
+        return dict(self._remote_stages)
+
+    def get_stage_histograms(self):
+        """工作进程最近一次回传的分阶段累计分桶计数"""
+        return dict(self._remote_histograms)
+
+    def get_pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def is_alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def get_stats(self):
+        stats = dict(self._remote_stats)
+        stats["mode"] = "process"
+        stats["worker_alive"] = self.is_alive()
+        stats["received"] = self.received_frames
+        return stats
+
+    def stop(self, timeout=3.0):
+        self._running = False
+        self.stop_event.set()
+        if self._reader is not None:
+            self._reader.join(timeout)
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
@@ -19,6 +19,18 @@ import os
 # "test_video.mp4" = 视频文件
 CAMERA_SOURCE = 1
 
+# 多摄像头配置（为空时仅使用 CAMERA_SOURCE）
+# 每一项可以是摄像头源，也可以是 {"id": "desk-a", "source": 0} 形式的字典
+# 例如: CAMERA_SOURCES = [0, {"id": "door", "source": "rtsp://192.168.1.20/stream"}]
+CAMERA_SOURCES = []
+
+# 多摄像头运行模式
+# "thread"  = 单进程：各路抓帧线程 + 一个批量推理线程（共享模型）
+# "process" = 每路摄像头独立进程采集与检测，经共享内存回传标注帧（多核扩展）
+CAMERA_WORKER_MODE = "thread"
+SHARED_FRAME_SLOTS = 3  # 共享内存环形缓冲槽位数
+WORKER_START_METHOD = ""  # 子进程启动方式，留空使用系统默认 ("spawn"/"fork")
+
 # 摄像头参数
 CAMERA_WIDTH = 640  # 视频宽度
 CAMERA_HEIGHT = 480  # 视频高度
@@ -39,6 +51,42 @@ CONFIDENCE_THRESHOLD = 0.5  # 目标检测置信度
 POSE_CONFIDENCE_THRESHOLD = 0.4  # 姿态估计置信度
 DEVICE = "cuda"  # 推理设备 ("cpu" 或 "cuda")
 
+# 推理后端
+# "ultralytics" = 加载 YOLO 权重推理
+# "onnx"        = ONNX Runtime 推理导出的 ONNX 模型（纯CPU设备推荐）
+# "openvino"    = OpenVINO 推理导出的 IR 模型（Intel CPU 推荐）
+# "scripted"    = 按脚本回放预设检测框与关键点，无需 ultralytics 与模型文件（测试/压测用）
+INFERENCE_BACKEND = "ultralytics"
+SCRIPTED_BACKEND_SCRIPT = ""  # 脚本化后端的 JSON 脚本路径，留空使用内置脚本（在岗/离开循环）
+SCRIPTED_BACKEND_LATENCY_MS = 5.0  # 脚本化后端每次推理的模拟耗时（毫秒）
+# onnx/openvino 后端：MODEL_PATH/POSE_MODEL_PATH 为 .pt 时首次运行自动导出并缓存，
+# 权重更新后重新导出；也可直接指向 .onnx 文件或 *_openvino_model 目录
+EXPORT_CACHE_DIR = "models/exported"  # 导出模型缓存目录
+EXPORT_IMGSZ = 640  # 导出及默认推理的输入分辨率（导出为动态尺寸，可被自适应分辨率覆盖）
+INFERENCE_INTRA_OP_THREADS = 0  # onnx/openvino 单次推理的算子内线程数，0 = 运行时默认
+
+# 目标检测与姿态估计的执行方式
+# "serial"  = 依次运行两个模型
+# "thread"  = 线程池并行（GPU或PyTorch释放GIL时有效）
+# "process" = 姿态模型放入独立进程（纯CPU设备推荐）；
+#             CAMERA_WORKER_MODE="process" 时工作进程内自动降级为 "thread"
+DETECTOR_PARALLEL_MODE = "serial"
+
+# 检测策略
+# "full"       = 每帧运行目标检测 + 姿态估计
+# "pose_first" = 人员框与关键点来自姿态模型，目标检测模型仅每隔K帧或场景变化时运行，
+#                其间沿用缓存的椅子/桌面/显示器（CPU设备可获得数倍帧率）
+DETECTION_STRATEGY = "full"
+OBJECT_MODEL_INTERVAL = 15  # pose_first 策略下目标检测的运行间隔（帧）
+SCENE_CHANGE_THRESHOLD = 0.08  # 场景变化阈值（缩略图平均灰度差，0-1）
+SCENE_CHANGE_PERSIST_FRAMES = 3  # 变化需连续持续的帧数，过滤光照闪烁等瞬时变化
+
+# 静态家具地图（椅子/桌面/显示器按时序投票确认，画面布局变化时失效重建）
+ENABLE_FURNITURE_MAP = True
+FURNITURE_MIN_VOTES = 3  # 确认家具所需的检测次数
+FURNITURE_MAX_MISSES = 10  # 连续漏检多少次后移除
+FURNITURE_MATCH_IOU = 0.5  # 检测与地图条目匹配的IoU阈值
+
 # 按类别细化的置信度阈值
 CLASS_CONFIDENCE = {
     "person": 0.5,
@@ -64,6 +112,7 @@ HEAD_ABOVE_MARGIN = 15  # 头部相对椅子顶部偏移
 HEAD_POSE_PITCH_RANGE = (-25.0, 25.0)
 HEAD_POSE_YAW_RANGE = (-30.0, 30.0)
 POSE_ASSOCIATION_IOU = 0.3
+POSE_ASSIGNMENT_METHOD = "hungarian"  # 人员-姿态一对一匹配: "hungarian"(需scipy) 或 "greedy"
 
 # =============================================================================
 # Web服务配置
@@ -74,6 +123,15 @@ HOST = "0.0.0.0"  # 服务器主机地址
 PORT = 5000  # 服务器端口
 DEBUG = False  # 调试模式
 
+# 服务模式: "development" 使用Flask内置开发服务器；"production" 使用 waitress 多线程WSGI服务器
+SERVER_MODE = "development"
+SERVER_THREADS = 8  # 生产模式下处理普通请求的线程数（长连接另按 MAX_STREAM_CLIENTS 预留）
+MAX_STREAM_CLIENTS = 64  # 同时在线的视频流/推送长连接上限，超出返回503（0为不限制）
+STREAM_SEND_BUFFER = 1048576  # 生产模式下每个连接的发送缓冲上限（字节），慢客户端超出后阻塞其推流
+STREAM_KEEPALIVE = 5.0  # 画面长时间不变时重发最新帧的间隔（秒），用于发现已断开的客户端
+STREAM_MIN_FPS = 2  # 慢客户端自适应降帧的下限
+STREAM_STALL_TIMEOUT = 10.0  # 新帧积压或写入阻塞超过该时长（秒）视为客户端卡死并断开
+
 # 线程配置
 THREAD_TIMEOUT = 30  # 线程超时时间（秒）
 
@@ -84,6 +142,21 @@ THREAD_TIMEOUT = 30  # 线程超时时间（秒）
 # MJPEG流配置
 JPEG_QUALITY = 80  # JPEG压缩质量 (1-100)
 STREAM_FPS = 40  # 流输出帧率
+# 视频流质量档位：max_width 为输出最大宽度（0为原始分辨率），quality 为JPEG质量（0为使用 JPEG_QUALITY）
+# 每个档位每帧只编码一次，由请求该档位的所有客户端共享
+STREAM_PROFILES = {
+    "thumb": {"max_width": 320, "quality": 50},
+    "standard": {"max_width": 640, "quality": 70},
+    "full": {"max_width": 0, "quality": 0},
+}
+DEFAULT_STREAM_PROFILE = "full"  # /video_feed 未指定档位时使用
+# 检测结果叠加方式: "server" 服务端绘制到画面中；"client" 推送原始画面 + JSON 检测数据，由浏览器绘制
+STREAM_OVERLAY_MODE = "server"
+
+# 运动门控：画面几乎不变时跳过检测，复用上次结果（CPU占用随画面活动变化）
+ENABLE_MOTION_GATE = False
+MOTION_THRESHOLD = 0.01  # 缩略图平均灰度差阈值（0-1），低于该值视为静止
+MOTION_MAX_SKIPS = 30  # 最多连续跳过的帧数，到达后强制检测一次
 
 # 视频处理配置
 FRAME_BUFFER_SIZE = 3  # 帧缓冲区大小
@@ -157,6 +230,16 @@ LSTM_FUSION_THRESHOLD = 0.5  # 融合结果阈值
 # 性能监控
 ENABLE_PERFORMANCE_MONITOR = True  # 是否启用性能监控
 FPS_WINDOW_SIZE = 30  # FPS计算窗口大小
+ENABLE_STAGE_METRICS = True  # 分阶段延迟统计（采集/检测/分析/绘制/编码），见 /api/latency
+STAGE_METRICS_WINDOW = 60.0  # 分位数统计的滚动窗口（秒）
+
+# 自适应推理速率：根据 detect() 耗时自动调整输入分辨率与推理步长
+ENABLE_ADAPTIVE_RATE = False
+TARGET_DETECT_LATENCY_MS = 150  # 单次检测目标耗时（毫秒）
+TARGET_CPU_BUDGET = 0.0  # 推理线程占用上限（0-1），0 表示不限制
+ADAPTIVE_IMGSZ_LADDER = [640, 512, 416, 320]  # 可选输入分辨率（从高到低）
+ADAPTIVE_MAX_STRIDE = 10  # 两次推理之间最多间隔的摄像头帧数
+ADAPTIVE_ADJUST_INTERVAL = 10  # 每累计多少次检测调整一次
 
 # 内存管理
 MAX_MEMORY_USAGE_MB = 2048  # 最大内存使用量(MB)
@@ -183,7 +266,8 @@ ENABLE_MOCK_CAMERA = False  # 是否启用模拟摄像头
 # 统计配置
 ENABLE_STATISTICS = True  # 是否启用统计
 STATS_UPDATE_INTERVAL = 1.0  # 统计更新间隔（秒）
-STATUS_REFRESH_INTERVAL = 1.0  # 前端状态刷新间隔（秒）
+STATUS_REFRESH_INTERVAL = 1.0  # 前端状态刷新间隔（秒），推送模式下为心跳间隔
+ENABLE_STATUS_PUSH = True  # 通过SSE推送状态（状态变化时立即推送），关闭则浏览器轮询 /status
 STATS_DB_PATH = "data/monitor_stats.db"  # 监测统计数据库路径
 STATS_PERSIST_INTERVAL = 60  # 写入数据库的时间间隔（秒）
 STATS_CSV_PATH = "data/monitor_stats.csv"  # 可读的CSV导出文件
@@ -237,21 +321,116 @@ def get_env_or_default(env_var, default_value, var_type=str):
         return default_value
 
 
+def _parse_camera_sources(raw_value):
+    """解析逗号分隔的摄像头源列表，纯数字视为设备索引"""
+    sources = []
+    for item in str(raw_value).split(","):
+        item = item.strip()
+        if not item:
+            continue
+        sources.append(int(item) if item.isdigit() else item)
+    return sources
+
+
+def get_camera_registry():
+    """
+    获取摄像头注册表
+
+    Returns:
+        list: [(摄像头ID, 摄像头源), ...]，未配置多摄像头时只包含 CAMERA_SOURCE
+    """
+    entries = CAMERA_SOURCES or [CAMERA_SOURCE]
+    registry = []
+    for index, entry in enumerate(entries):
+        if isinstance(entry, dict):
+            cam_id = str(entry.get("id", f"cam{index}"))
+            source = entry.get("source", CAMERA_SOURCE)
+        else:
+            cam_id = f"cam{index}"
+            source = entry
+        registry.append((cam_id, source))
+    return registry
+
+
 # 支持环境变量覆盖配置
 CAMERA_SOURCE = get_env_or_default("CAMERA_SOURCE", CAMERA_SOURCE, int)
+CAMERA_SOURCES = get_env_or_default(
+    "CAMERA_SOURCES", CAMERA_SOURCES, _parse_camera_sources
+)
+CAMERA_WORKER_MODE = get_env_or_default("CAMERA_WORKER_MODE", CAMERA_WORKER_MODE, str)
 CONFIDENCE_THRESHOLD = get_env_or_default(
     "CONFIDENCE_THRESHOLD", CONFIDENCE_THRESHOLD, float
 )
 POSE_MODEL_PATH = get_env_or_default("POSE_MODEL_PATH", POSE_MODEL_PATH, str)
+INFERENCE_BACKEND = get_env_or_default("INFERENCE_BACKEND", INFERENCE_BACKEND, str)
+SCRIPTED_BACKEND_SCRIPT = get_env_or_default(
+    "SCRIPTED_BACKEND_SCRIPT", SCRIPTED_BACKEND_SCRIPT, str
+)
+SCRIPTED_BACKEND_LATENCY_MS = get_env_or_default(
+    "SCRIPTED_BACKEND_LATENCY_MS", SCRIPTED_BACKEND_LATENCY_MS, float
+)
+EXPORT_CACHE_DIR = get_env_or_default("EXPORT_CACHE_DIR", EXPORT_CACHE_DIR, str)
+EXPORT_IMGSZ = get_env_or_default("EXPORT_IMGSZ", EXPORT_IMGSZ, int)
+INFERENCE_INTRA_OP_THREADS = get_env_or_default(
+    "INFERENCE_INTRA_OP_THREADS", INFERENCE_INTRA_OP_THREADS, int
+)
 POSE_CONFIDENCE_THRESHOLD = get_env_or_default(
     "POSE_CONFIDENCE_THRESHOLD", POSE_CONFIDENCE_THRESHOLD, float
 )
+DETECTOR_PARALLEL_MODE = get_env_or_default(
+    "DETECTOR_PARALLEL_MODE", DETECTOR_PARALLEL_MODE, str
+)
+POSE_ASSIGNMENT_METHOD = get_env_or_default(
+    "POSE_ASSIGNMENT_METHOD", POSE_ASSIGNMENT_METHOD, str
+)
+DETECTION_STRATEGY = get_env_or_default("DETECTION_STRATEGY", DETECTION_STRATEGY, str)
+OBJECT_MODEL_INTERVAL = get_env_or_default(
+    "OBJECT_MODEL_INTERVAL", OBJECT_MODEL_INTERVAL, int
+)
+SCENE_CHANGE_THRESHOLD = get_env_or_default(
+    "SCENE_CHANGE_THRESHOLD", SCENE_CHANGE_THRESHOLD, float
+)
+SCENE_CHANGE_PERSIST_FRAMES = get_env_or_default(
+    "SCENE_CHANGE_PERSIST_FRAMES", SCENE_CHANGE_PERSIST_FRAMES, int
+)
+DEFAULT_STREAM_PROFILE = get_env_or_default(
+    "DEFAULT_STREAM_PROFILE", DEFAULT_STREAM_PROFILE, str
+)
+STREAM_OVERLAY_MODE = get_env_or_default(
+    "STREAM_OVERLAY_MODE", STREAM_OVERLAY_MODE, str
+)
+ENABLE_MOTION_GATE = get_env_or_default("ENABLE_MOTION_GATE", ENABLE_MOTION_GATE, bool)
+MOTION_THRESHOLD = get_env_or_default("MOTION_THRESHOLD", MOTION_THRESHOLD, float)
+MOTION_MAX_SKIPS = get_env_or_default("MOTION_MAX_SKIPS", MOTION_MAX_SKIPS, int)
+ENABLE_ADAPTIVE_RATE = get_env_or_default(
+    "ENABLE_ADAPTIVE_RATE", ENABLE_ADAPTIVE_RATE, bool
+)
+TARGET_DETECT_LATENCY_MS = get_env_or_default(
+    "TARGET_DETECT_LATENCY_MS", TARGET_DETECT_LATENCY_MS, float
+)
+TARGET_CPU_BUDGET = get_env_or_default("TARGET_CPU_BUDGET", TARGET_CPU_BUDGET, float)
+ENABLE_STAGE_METRICS = get_env_or_default(
+    "ENABLE_STAGE_METRICS", ENABLE_STAGE_METRICS, bool
+)
+STAGE_METRICS_WINDOW = get_env_or_default(
+    "STAGE_METRICS_WINDOW", STAGE_METRICS_WINDOW, float
+)
 HOST = get_env_or_default("HOST", HOST, str)
 PORT = get_env_or_default("PORT", PORT, int)
 DEBUG = get_env_or_default("DEBUG", DEBUG, bool)
+SERVER_MODE = get_env_or_default("SERVER_MODE", SERVER_MODE, str)
+SERVER_THREADS = get_env_or_default("SERVER_THREADS", SERVER_THREADS, int)
+MAX_STREAM_CLIENTS = get_env_or_default(
+    "MAX_STREAM_CLIENTS", MAX_STREAM_CLIENTS, int
+)
+STREAM_MIN_FPS = get_env_or_default("STREAM_MIN_FPS", STREAM_MIN_FPS, int)
+STREAM_STALL_TIMEOUT = get_env_or_default(
+    "STREAM_STALL_TIMEOUT", STREAM_STALL_TIMEOUT, float
+)
 STATUS_REFRESH_INTERVAL = get_env_or_default(
     "STATUS_REFRESH_INTERVAL", STATUS_REFRESH_INTERVAL, float
 )
+ENABLE_STATUS_PUSH = get_env_or_default("ENABLE_STATUS_PUSH", ENABLE_STATUS_PUSH, bool)
 STATS_DB_PATH = get_env_or_default("STATS_DB_PATH", STATS_DB_PATH, str)
 STATS_PERSIST_INTERVAL = get_env_or_default(
     "STATS_PERSIST_INTERVAL", STATS_PERSIST_INTERVAL, float
@@ -281,6 +460,86 @@ def validate_config():
     if isinstance(CAMERA_SOURCE, int) and CAMERA_SOURCE < 0:
         errors.append("CAMERA_SOURCE 不能为负数")
 
+    camera_ids = [cam_id for cam_id, _ in get_camera_registry()]
+    if len(camera_ids) != len(set(camera_ids)):
+        errors.append("CAMERA_SOURCES 中的摄像头ID不能重复")
+
+    if DETECTOR_PARALLEL_MODE not in ("serial", "thread", "process"):
+        errors.append("DETECTOR_PARALLEL_MODE 必须为 'serial'、'thread' 或 'process'")
+
+    if INFERENCE_BACKEND not in ("ultralytics", "onnx", "openvino", "scripted"):
+        errors.append(
+            "INFERENCE_BACKEND 必须为 'ultralytics'、'onnx'、'openvino' 或 'scripted'"
+        )
+
+    if EXPORT_IMGSZ <= 0 or EXPORT_IMGSZ % 32:
+        errors.append("EXPORT_IMGSZ 必须为 32 的正整数倍")
+
+    if INFERENCE_INTRA_OP_THREADS < 0:
+        errors.append("INFERENCE_INTRA_OP_THREADS 不能为负数")
+
+    if SCRIPTED_BACKEND_LATENCY_MS < 0:
+        errors.append("SCRIPTED_BACKEND_LATENCY_MS 不能为负数")
+
+    if POSE_ASSIGNMENT_METHOD not in ("hungarian", "greedy"):
+        errors.append("POSE_ASSIGNMENT_METHOD 必须为 'hungarian' 或 'greedy'")
+
+    if DETECTION_STRATEGY not in ("full", "pose_first"):
+        errors.append("DETECTION_STRATEGY 必须为 'full' 或 'pose_first'")
+
+    if OBJECT_MODEL_INTERVAL < 1:
+        errors.append("OBJECT_MODEL_INTERVAL 必须大于等于 1")
+
+    if not 0 < SCENE_CHANGE_THRESHOLD <= 1:
+        errors.append("SCENE_CHANGE_THRESHOLD 必须在 (0, 1] 范围内")
+
+    if SCENE_CHANGE_PERSIST_FRAMES < 1:
+        errors.append("SCENE_CHANGE_PERSIST_FRAMES 必须大于等于 1")
+
+    if SERVER_MODE not in ("development", "production"):
+        errors.append("SERVER_MODE 必须为 'development' 或 'production'")
+
+    if SERVER_THREADS < 1:
+        errors.append("SERVER_THREADS 必须大于等于 1")
+
+    if STREAM_MIN_FPS <= 0 or STREAM_MIN_FPS > STREAM_FPS:
+        errors.append("STREAM_MIN_FPS 必须大于0且不超过 STREAM_FPS")
+
+    if STREAM_MIN_FPS > 0 and STREAM_STALL_TIMEOUT <= 1.0 / STREAM_MIN_FPS:
+        # 按最低帧率推流的客户端正常也会积压一个发送间隔
+        errors.append("STREAM_STALL_TIMEOUT 必须大于 1/STREAM_MIN_FPS 秒")
+
+    if MAX_STREAM_CLIENTS < 0:
+        errors.append("MAX_STREAM_CLIENTS 不能为负数")
+
+    if DEFAULT_STREAM_PROFILE not in STREAM_PROFILES:
+        errors.append("DEFAULT_STREAM_PROFILE 必须是 STREAM_PROFILES 中的档位")
+
+    if STREAM_OVERLAY_MODE not in ("server", "client"):
+        errors.append("STREAM_OVERLAY_MODE 必须为 'server' 或 'client'")
+
+    if not 0 <= MOTION_THRESHOLD <= 1:
+        errors.append("MOTION_THRESHOLD 必须在 0-1 之间")
+
+    if not isinstance(MOTION_MAX_SKIPS, int) or MOTION_MAX_SKIPS < 0:
+        errors.append("MOTION_MAX_SKIPS 必须为非负整数")
+
+    # 0 表示不限制，其余取值为占用比例
+    if not 0 <= TARGET_CPU_BUDGET <= 1:
+        errors.append("TARGET_CPU_BUDGET 必须为 0（不限制）或在 (0, 1] 范围内")
+
+    if not ADAPTIVE_IMGSZ_LADDER or any(
+        not isinstance(size, int) or size <= 0 or size % 32
+        for size in ADAPTIVE_IMGSZ_LADDER
+    ):
+        errors.append("ADAPTIVE_IMGSZ_LADDER 不能为空，且每项须为 32 的正整数倍")
+
+    if STAGE_METRICS_WINDOW <= 0:
+        errors.append("STAGE_METRICS_WINDOW 必须大于 0")
+
+    if CAMERA_WORKER_MODE not in ("thread", "process"):
+        errors.append("CAMERA_WORKER_MODE 必须为 'thread' 或 'process'")
+
     # 验证置信度阈值
     if not 0 <= CONFIDENCE_THRESHOLD <= 1:
         errors.append("CONFIDENCE_THRESHOLD 必须在 0-1 之间")
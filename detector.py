@@ -2,23 +2,135 @@
 """多模态在岗检测 - 目标检测 + 姿态估计 + 多条件融合"""
 
 import cv2
+import multiprocessing as mp
 import numpy as np
-from ultralytics import YOLO
 import time
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import config
+from backends import create_backend
+from metrics import stage_metrics
+from furniture_map import FURNITURE_KEYS, FurnitureLayout, FurnitureMap
 from utils import (
-    calculate_distance,
-    calculate_iou,
-    draw_chinese_text,
+    assign_unique,
+    bbox_centers,
+    bgr_to_hex,
     draw_keypoints,
     draw_status_text,
+    draw_text_overlays,
     estimate_head_pose,
+    frame_signature,
+    pairwise_distance,
+    pairwise_iou,
+    signature_difference,
+    signature_mask,
     temporal_smoothing,
 )
 
 
+DEFAULT_STREAM_ID = "default"
+PARALLEL_MODES = ("serial", "thread", "process")
+DETECTION_STRATEGIES = ("full", "pose_first")
+
+
+def _pose_process_main(conn, backend_name, model_path, device, confidence):
+    """姿态模型子进程入口：接收帧批次，返回解析后的数组与耗时"""
+    backend = create_backend(backend_name, model_path, "pose", device)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        request_id, frames, imgsz, frame_ids = message
+        start = time.perf_counter()
+        try:
+            arrays = backend.predict(
+                frames, conf=confidence, imgsz=imgsz, frame_ids=frame_ids
+            )
+            conn.send((request_id, "ok", arrays, time.perf_counter() - start))
+        except Exception as exc:
+            conn.send((request_id, "error", str(exc), time.perf_counter() - start))
+    backend.close()
+    conn.close()
+
+
+class PoseModelProcess:
+    """在独立进程中运行姿态模型，CPU推理时与目标检测模型并行而不争抢GIL"""
+
+    def __init__(self, model_path, device, confidence, backend=None):
+        context = mp.get_context(config.WORKER_START_METHOD or None)
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_pose_process_main,
+            args=(child_conn, backend, model_path, device, confidence),
+            name="pose-model",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self._next_id = 0
+        self._pending = None
+
+    def submit(self, frames, imgsz=None, frame_ids=None):
+        """提交一批帧，每次提交带递增的请求ID"""
+        self._next_id += 1
+        self._pending = self._next_id
+        self._conn.send((self._pending, frames, imgsz, frame_ids))
+
+    def result(self):
+        """
+        等待最近一次提交的结果，返回 (数组列表, 耗时秒数)
+
+        此前未取走的旧回复按请求ID丢弃，避免姿态结果与帧批次错位
+        """
+        request_id = self._pending
+        if request_id is None:
+            raise RuntimeError("姿态模型进程没有待取的结果")
+        while True:
+            reply_id, status, payload, elapsed = self._conn.recv()
+            if reply_id == request_id:
+                break
+        self._pending = None
+        if status != "ok":
+            raise RuntimeError(f"姿态模型进程推理失败: {payload}")
+        return payload, elapsed
+
+    def discard(self):
+        """取走并丢弃待取的结果（目标检测失败时调用）"""
+        if self._pending is None:
+            return
+        try:
+            self.result()
+        except (RuntimeError, EOFError, OSError):
+            pass
+
+    def close(self):
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class StreamState:
+    """单路视频流的时序状态（平滑历史、行为序列），多摄像头共享模型时互不干扰"""
+
+    def __init__(self, sequence_length, furniture_map):
+        self.on_duty_history = []
+        self.behavior_sequence = deque(maxlen=sequence_length)
+        self.last_lstm_score = None
+
+        # 稳定的家具地图与建立地图时的画面签名（场景变化以此为参照）
+        self.furniture_map = furniture_map
+        self.frames_since_object = 0
+        self.scene_signature = None
+        self.scene_change_frames = 0  # 连续超过场景变化阈值的帧数
+        self.person_boxes = []  # 上一帧的人员框，比较签名时忽略这些区域
+        self.frame_count = 0  # 已送入推理的帧数，作为本路的帧序号
+
+
 class DutyDetector:
     """融合多模态信息的在岗检测器"""
 
@@ -40,7 +152,11 @@ class DutyDetector:
         confidence_threshold=None,
         pose_confidence_threshold=None,
         device=None,
+        parallel_mode=None,
+        strategy=None,
+        backend=None,
     ):
+        self.backend_name = backend or config.INFERENCE_BACKEND
         self.model_path = model_path or config.MODEL_PATH
         self.pose_model_path = pose_model_path or config.POSE_MODEL_PATH
         self.confidence_threshold = confidence_threshold or config.CONFIDENCE_THRESHOLD
@@ -48,20 +164,55 @@ class DutyDetector:
             pose_confidence_threshold or config.POSE_CONFIDENCE_THRESHOLD
         )
         self.device = device or config.DEVICE
-
-        self.model = self._load_model(self.model_path)
-        self.pose_model = self._load_model(self.pose_model_path)
+        self.parallel_mode = parallel_mode or getattr(
+            config, "DETECTOR_PARALLEL_MODE", "serial"
+        )
+        if self.parallel_mode not in PARALLEL_MODES:
+            print(f"⚠️ 未知的并行模式 {self.parallel_mode}，改用 serial")
+            self.parallel_mode = "serial"
+
+        self.strategy = strategy or getattr(config, "DETECTION_STRATEGY", "full")
+        if self.strategy not in DETECTION_STRATEGIES:
+            print(f"⚠️ 未知的检测策略 {self.strategy}，改用 full")
+            self.strategy = "full"
+        self.object_interval = max(1, int(getattr(config, "OBJECT_MODEL_INTERVAL", 1)))
+        self.scene_change_threshold = getattr(config, "SCENE_CHANGE_THRESHOLD", 0.08)
+        self.scene_change_persist = max(
+            1, int(getattr(config, "SCENE_CHANGE_PERSIST_FRAMES", 3))
+        )
+        self.object_model_runs = 0
+        self.object_model_skips = 0
+
+        self.model = self._load_model(self.model_path, "detect")
+        self.pose_model = None
+        self.pose_process = None
+        self._pose_executor = None
+        if self.parallel_mode == "process":
+            # 姿态模型在子进程中加载，主进程只保留目标检测模型
+            self.pose_process = PoseModelProcess(
+                self.pose_model_path,
+                self.device,
+                self.pose_confidence_threshold,
+                backend=self.backend_name,
+            )
+        else:
+            self.pose_model = self._load_model(self.pose_model_path, "pose")
+            if self.parallel_mode == "thread":
+                self._pose_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="pose-model"
+                )
         self.class_names = self.model.names
+        self.input_size = None
+        self.last_timing = None
+        self.detection_count = 0
 
-        self.on_duty_history = []
         self.smoothing_window = config.SMOOTHING_WINDOW
         self.smoothing_ratio = config.SMOOTHING_RATIO
 
         self.enable_behavior_analysis = config.ENABLE_BEHAVIOR_ANALYSIS
         self.behavior_feature_size = getattr(config, "BEHAVIOR_FEATURE_SIZE", 12)
-        self.behavior_sequence = deque(maxlen=config.BEHAVIOR_SEQUENCE_LENGTH)
         self.behavior_analyzer = None
-        self.last_lstm_score = None
+        self._streams = {}
         self.lstm_threshold = getattr(config, "LSTM_ON_DUTY_THRESHOLD", 0.6)
         self.lstm_fusion_weight = getattr(config, "LSTM_FUSION_WEIGHT", 0.5)
         self.lstm_fusion_threshold = getattr(config, "LSTM_FUSION_THRESHOLD", 0.5)
@@ -71,63 +222,316 @@ class DutyDetector:
         self._debug_print_interval = 10.0  # 秒
         self._last_debug_print_time = 0.0
 
-    def _load_model(self, model_path):
+    def _load_model(self, model_path, task):
         try:
-            model = YOLO(model_path)
-            if self.device:
-                model.to(self.device)
-            print(f"✓ 模型加载成功: {model_path}")
+            model = create_backend(self.backend_name, model_path, task, self.device)
+            print(f"✓ 模型加载成功: {model_path} ({model.name})")
             return model
         except Exception as exc:
             print(f"✗ 模型加载失败 {model_path}: {exc}")
             raise
 
-    def detect(self, frame):
-        if frame is None:
-            return None, "输入帧为空"
-
-        try:
-            obj_results = self.model(frame, conf=0.25, verbose=False)
-            now = time.time()
-            if now - self._last_debug_print_time >= self._debug_print_interval:
-                print("[Debug] 目标检测原始结果:", obj_results)
-                self._last_debug_print_time = now
-            pose_results = self.pose_model(
-                frame, conf=self.pose_confidence_threshold, verbose=False
+    def _get_stream(self, stream_id):
+        state = self._streams.get(stream_id)
+        if state is None:
+            state = StreamState(
+                config.BEHAVIOR_SEQUENCE_LENGTH, self._create_furniture_map()
             )
-
-            detections = self._parse_object_detections(obj_results[0])
-            pose_persons = self._parse_pose_detections(pose_results[0])
-            self._associate_pose_to_persons(detections["persons"], pose_persons)
-
-            status_detail = self._analyze_duty_status(detections)
-            frame_on_duty = status_detail["frame_on_duty"]
-            self._update_history(frame_on_duty)
-            smoothed_on_duty = temporal_smoothing(
-                self.on_duty_history,
-                window_size=self.smoothing_window,
-                threshold=self.smoothing_ratio,
+            self._streams[stream_id] = state
+        return state
+
+    def reset_stream(self, stream_id=DEFAULT_STREAM_ID):
+        """清除指定视频流的时序状态（平滑历史、行为序列、家具地图）"""
+        self._streams.pop(stream_id, None)
+
+    def _create_furniture_map(self):
+        if getattr(config, "ENABLE_FURNITURE_MAP", True):
+            return FurnitureMap(
+                min_votes=getattr(config, "FURNITURE_MIN_VOTES", 3),
+                max_misses=getattr(config, "FURNITURE_MAX_MISSES", 10),
+                match_iou=getattr(config, "FURNITURE_MATCH_IOU", 0.5),
             )
-            lstm_result = self._maybe_run_behavior_analysis(status_detail, detections)
-            fused_on_duty = self._fuse_on_duty(smoothed_on_duty, lstm_result)
-            status_text = self._format_status(status_detail, fused_on_duty, lstm_result)
-
-            self.last_detection_time = time.time()
-            return detections, status_text, status_detail
+        # 关闭时退化为“仅使用最近一次检测结果”
+        return FurnitureMap(min_votes=1, max_misses=0, smoothing=1.0)
 
+    def detect(self, frame, stream_id=DEFAULT_STREAM_ID):
+        if frame is None:
+            return None, "输入帧为空", None
+        return self.detect_batch([frame], [stream_id])[0]
+
+    def detect_batch(self, frames, stream_ids=None):
+        """
+        对多路视频帧进行批量推理，两个模型各调用一次
+
+        Args:
+            frames (list): 各路视频帧
+            stream_ids (list): 与帧一一对应的视频流ID，用于区分时序状态
+
+        Returns:
+            list: 每帧的 (detections, status_text, status_detail)
+        """
+        if stream_ids is None:
+            stream_ids = [DEFAULT_STREAM_ID] * len(frames)
+        outputs = [(None, "输入帧为空", None)] * len(frames)
+        valid = [idx for idx, frame in enumerate(frames) if frame is not None]
+        if not valid:
+            return outputs
+
+        detect_start = time.perf_counter()
+        batch = [frames[idx] for idx in valid]
+        batch_ids = [stream_ids[idx] for idx in valid]
+        states = [self._get_stream(stream_id) for stream_id in batch_ids]
+        frame_ids = []
+        for stream_id, state in zip(batch_ids, states):
+            frame_ids.append((stream_id, state.frame_count))
+            state.frame_count += 1
+        object_mask = self._plan_object_runs(batch, states)
+        try:
+            obj_arrays, pose_arrays = self._run_models(
+                batch, object_mask, batch_ids, frame_ids
+            )
         except Exception as exc:
             print(f"检测失败: {exc}")
-            return None, f"检测失败: {exc}", None
+            return [(None, f"检测失败: {exc}", None)] * len(frames)
+
+        for pos, idx in enumerate(valid):
+            try:
+                outputs[idx] = self._analyze_results(
+                    obj_arrays[pos],
+                    pose_arrays[pos],
+                    states[pos],
+                    object_ran=object_mask[pos],
+                    stream_id=batch_ids[pos],
+                )
+            except Exception as exc:
+                print(f"检测失败: {exc}")
+                outputs[idx] = (None, f"检测失败: {exc}", None)
+
+        detect_elapsed = time.perf_counter() - detect_start
+        for stream_id in batch_ids:
+            stage_metrics.record(stream_id, "detect", detect_elapsed)
+        self.detection_count += len(valid)
+        self.last_detection_time = time.time()
+        return outputs
 
-    def _parse_object_detections(self, result):
+    def set_input_size(self, imgsz):
+        """设置推理输入尺寸（None 表示使用模型默认），供自适应速率控制器调用"""
+        self.input_size = int(imgsz) if imgsz else None
+
+    def _run_object_model(self, batch, frame_ids=None):
+        start = time.perf_counter()
+        arrays = self.model.predict(
+            batch, conf=0.25, imgsz=self.input_size, frame_ids=frame_ids
+        )
+        now = time.time()
+        if (
+            config.ENABLE_DEBUG_MODE
+            and now - self._last_debug_print_time >= self._debug_print_interval
+        ):
+            print("[Debug] 目标检测原始结果:", arrays[0])
+        return arrays, time.perf_counter() - start
+
+    def _run_pose_model(self, batch, frame_ids=None):
+        start = time.perf_counter()
+        arrays = self.pose_model.predict(
+            batch,
+            conf=self.pose_confidence_threshold,
+            imgsz=self.input_size,
+            frame_ids=frame_ids,
+        )
+        return arrays, time.perf_counter() - start
+
+    def _plan_object_runs(self, batch, states):
+        """
+        决定批次中哪些帧需要运行目标检测模型
+
+        画面签名与建立家具地图时的签名相比（忽略人员所在区域），差异连续
+        SCENE_CHANGE_PERSIST_FRAMES 帧超过阈值时，判定家具布局变化并使地图失效；
+        人员走动、单帧光照闪烁不会触发。
+        full 策略每帧都运行；pose_first 策略仅在地图未建立/已失效或距上次运行满
+        OBJECT_MODEL_INTERVAL 帧时运行，其余帧只跑姿态模型
+        """
+        mask = []
+        for frame, state in zip(batch, states):
+            signature = frame_signature(frame)
+            if state.scene_signature is not None:
+                ignore = signature_mask(frame.shape, state.person_boxes)
+                changed = (
+                    signature_difference(signature, state.scene_signature, ignore)
+                    >= self.scene_change_threshold
+                )
+                state.scene_change_frames = (
+                    state.scene_change_frames + 1 if changed else 0
+                )
+                if state.scene_change_frames >= self.scene_change_persist:
+                    state.furniture_map.invalidate()
+                    state.scene_change_frames = 0
+            run = (
+                self.strategy == "full"
+                or state.furniture_map.stale
+                or state.frames_since_object + 1 >= self.object_interval
+            )
+            if run and state.furniture_map.stale:
+                # 地图将以本帧重建，参照签名随之更新
+                state.scene_signature = signature
+            mask.append(run)
+        return mask
+
+    def _run_object_subset(self, batch, object_mask, frame_ids=None):
+        """只对需要的帧运行目标检测，返回与批次对齐的结果（未运行的为 None）"""
+        subset = [frame for frame, run in zip(batch, object_mask) if run]
+        if not subset:
+            return [None] * len(batch), 0.0
+        subset_ids = None
+        if frame_ids is not None:
+            subset_ids = [key for key, run in zip(frame_ids, object_mask) if run]
+        subset_arrays, elapsed = self._run_object_model(subset, subset_ids)
+        iterator = iter(subset_arrays)
+        return [next(iterator) if run else None for run in object_mask], elapsed
+
+    def _run_models(self, batch, object_mask=None, stream_ids=None, frame_ids=None):
+        """
+        按并行模式运行目标检测与姿态估计，两者在关联之前互不依赖
+
+        frame_ids 为每帧的 (视频流ID, 帧序号)，原样传给两个模型的后端
+        """
+        if object_mask is None:
+            object_mask = [True] * len(batch)
+        if stream_ids is None:
+            stream_ids = [DEFAULT_STREAM_ID] * len(batch)
+        wall_start = time.perf_counter()
+        if self.parallel_mode == "process":
+            self.pose_process.submit(batch, self.input_size, frame_ids)
+            try:
+                obj_arrays, obj_elapsed = self._run_object_subset(
+                    batch, object_mask, frame_ids
+                )
+            except Exception:
+                # 取走本批的姿态回复，下一批不会读到它
+                self.pose_process.discard()
+                raise
+            pose_arrays, pose_elapsed = self.pose_process.result()
+        elif self.parallel_mode == "thread":
+            pose_future = self._pose_executor.submit(
+                self._run_pose_model, batch, frame_ids
+            )
+            obj_arrays, obj_elapsed = self._run_object_subset(
+                batch, object_mask, frame_ids
+            )
+            pose_arrays, pose_elapsed = pose_future.result()
+        else:
+            obj_arrays, obj_elapsed = self._run_object_subset(
+                batch, object_mask, frame_ids
+            )
+            pose_arrays, pose_elapsed = self._run_pose_model(batch, frame_ids)
+        wall_elapsed = time.perf_counter() - wall_start
+        ran = sum(1 for run in object_mask if run)
+        self.object_model_runs += ran
+        self.object_model_skips += len(object_mask) - ran
+        self._record_timing(obj_elapsed, pose_elapsed, wall_elapsed)
+        # 批量推理的耗时由批次内每一路共同承担，按各路分别计入
+        for stream_id, run in zip(stream_ids, object_mask):
+            if run:
+                stage_metrics.record(stream_id, "object_model", obj_elapsed)
+            stage_metrics.record(stream_id, "pose_model", pose_elapsed)
+        return obj_arrays, pose_arrays
+
+    def _record_timing(self, obj_elapsed, pose_elapsed, wall_elapsed):
+        overlap = max(0.0, obj_elapsed + pose_elapsed - wall_elapsed)
+        self.last_timing = {
+            "mode": self.parallel_mode,
+            "object_ms": obj_elapsed * 1000,
+            "pose_ms": pose_elapsed * 1000,
+            "wall_ms": wall_elapsed * 1000,
+            "overlap_ms": overlap * 1000,
+        }
+        now = time.time()
+        if (
+            config.ENABLE_DEBUG_MODE
+            and now - self._last_debug_print_time >= self._debug_print_interval
+        ):
+            print(
+                f"[Timing] 模式:{self.parallel_mode} "
+                f"目标检测 {obj_elapsed * 1000:.1f}ms | "
+                f"姿态估计 {pose_elapsed * 1000:.1f}ms | "
+                f"总耗时 {wall_elapsed * 1000:.1f}ms | "
+                f"并行重叠 {overlap * 1000:.1f}ms"
+            )
+            self._last_debug_print_time = now
+
+    def close(self):
+        """释放并行推理使用的线程池/子进程与推理后端"""
+        if self._pose_executor is not None:
+            self._pose_executor.shutdown(wait=False)
+            self._pose_executor = None
+        if self.pose_process is not None:
+            self.pose_process.close()
+            self.pose_process = None
+        for backend in (self.model, self.pose_model):
+            if backend is not None:
+                backend.close()
+
+    def _analyze_results(
+        self,
+        obj_result,
+        pose_result,
+        state,
+        object_ran=True,
+        stream_id=DEFAULT_STREAM_ID,
+    ):
+        start = time.perf_counter()
+        if object_ran:
+            parsed = self._parse_object_detections(obj_result)
+            layout = state.furniture_map.update(parsed)
+            persons = parsed["persons"]
+            state.frames_since_object = 0
+        else:
+            # 家具几乎不移动，沿用家具地图；人员框与关键点全部来自姿态模型
+            layout = state.furniture_map.layout()
+            persons = []
+            state.frames_since_object += 1
+        detections = {"persons": persons}
+        detections.update(layout.as_detections())
+        pose_persons = self._parse_pose_detections(pose_result)
+        parsed_at = time.perf_counter()
+        self._associate_pose_to_persons(detections["persons"], pose_persons)
+        associated_at = time.perf_counter()
+        state.person_boxes = [
+            person["bbox"] for person in detections["persons"] + pose_persons
+        ]
+
+        status_detail = self._analyze_duty_status(detections, layout)
+        frame_on_duty = status_detail["frame_on_duty"]
+        self._update_history(state, frame_on_duty)
+        smoothed_on_duty = temporal_smoothing(
+            state.on_duty_history,
+            window_size=self.smoothing_window,
+            threshold=self.smoothing_ratio,
+        )
+        evaluated_at = time.perf_counter()
+        lstm_result = self._maybe_run_behavior_analysis(
+            state, status_detail, detections
+        )
+        fused_on_duty = self._fuse_on_duty(smoothed_on_duty, lstm_result)
+        status_detail["on_duty"] = fused_on_duty
+        status_text = self._format_status(status_detail, fused_on_duty, lstm_result)
+        finished_at = time.perf_counter()
+
+        # 解析含家具地图更新；判定含时序平滑；lstm 含融合与状态文字
+        stage_metrics.record(stream_id, "parse", parsed_at - start)
+        stage_metrics.record(stream_id, "associate", associated_at - parsed_at)
+        stage_metrics.record(stream_id, "evaluate", evaluated_at - associated_at)
+        if self.behavior_analyzer:
+            stage_metrics.record(stream_id, "lstm", finished_at - evaluated_at)
+        return detections, status_text, status_detail
+
+    def _parse_object_detections(self, arrays):
         detections = {"persons": [], "chairs": [], "monitors": [], "desks": []}
 
-        if result.boxes is None:
+        if arrays is None:
             return detections
 
-        boxes = result.boxes.xyxy.cpu().numpy()
-        scores = result.boxes.conf.cpu().numpy()
-        classes = result.boxes.cls.cpu().numpy().astype(int)
+        boxes, scores, classes = arrays
 
         for box, score, cls_id in zip(boxes, scores, classes):
             cls_name = self._get_class_name(cls_id)
@@ -163,14 +567,12 @@ class DutyDetector:
             return self.class_names[cls_id]
         return str(cls_id)
 
-    def _parse_pose_detections(self, result):
+    def _parse_pose_detections(self, arrays):
         pose_persons = []
-        if result.boxes is None or result.keypoints is None:
+        if arrays is None:
             return pose_persons
 
-        boxes = result.boxes.xyxy.cpu().numpy()
-        confidences = result.boxes.conf.cpu().numpy()
-        keypoints = result.keypoints.xy.cpu().numpy()
+        boxes, confidences, keypoints = arrays
 
         for box, score, kps in zip(boxes, confidences, keypoints):
             pose_persons.append(
@@ -217,32 +619,36 @@ class DutyDetector:
             )
             return
 
-        for person in persons:
-            best_match = None
-            best_iou = 0.0
-            for pose_person in pose_persons:
-                iou = calculate_iou(person["bbox"], pose_person["bbox"])
-                if iou > best_iou:
-                    best_iou = iou
-                    best_match = pose_person
-
-            if best_match and best_iou >= config.POSE_ASSOCIATION_IOU:
-                person["keypoints"] = best_match["keypoints"]
-
-    def _analyze_duty_status(self, detections):
+        if not pose_persons:
+            return
+
+        # (人员 × 姿态) IoU矩阵上做一对一匹配，避免两人共用同一骨架
+        iou_matrix = pairwise_iou(
+            [person["bbox"] for person in persons],
+            [pose_person["bbox"] for pose_person in pose_persons],
+        )
+        threshold = max(config.POSE_ASSOCIATION_IOU, np.finfo(np.float32).tiny)
+        for person_idx, pose_idx in assign_unique(
+            iou_matrix,
+            threshold=threshold,
+            method=getattr(config, "POSE_ASSIGNMENT_METHOD", "hungarian"),
+        ):
+            persons[person_idx]["keypoints"] = pose_persons[pose_idx]["keypoints"]
+
+    def _analyze_duty_status(self, detections, layout=None):
         persons = detections["persons"]
         if not persons:
             return {"status": "未检测到人员", "frame_on_duty": False, "details": []}
 
-        chairs = detections["chairs"]
-        desks = detections["desks"]
-        monitors = detections["monitors"]
+        if layout is None:
+            layout = FurnitureLayout.from_detections(detections)
 
+        metrics = self._compute_person_metrics(persons, layout)
         details = []
         on_duty_count = 0
 
-        for person in persons:
-            person_status = self._evaluate_person(person, chairs, desks, monitors)
+        for idx, person in enumerate(persons):
+            person_status = self._evaluate_person(person, metrics, idx)
             if person_status["on_duty"]:
                 on_duty_count += 1
             details.append(person_status)
@@ -262,37 +668,64 @@ class DutyDetector:
             "details": details,
         }
 
-    def _evaluate_person(self, person, chairs, desks, monitors):
+    def _compute_person_metrics(self, persons, layout):
+        """
+        一次性计算所有人员与家具之间的几何关系
+
+        Returns:
+            dict: chair_iou/desk_iou/monitor_distance 为每人最大IoU或最近距离，
+                  head_above_chair 为每人头部是否高于任一椅子顶部
+        """
+        person_boxes = np.array([person["bbox"] for person in persons], dtype=np.float32)
+        count = len(persons)
+
+        chair_iou = pairwise_iou(person_boxes, layout.chair_boxes)
+        desk_iou = pairwise_iou(person_boxes, layout.desk_boxes)
+        monitor_distance = pairwise_distance(
+            bbox_centers(person_boxes), layout.monitor_centers
+        )
+
+        head_y = np.full(count, np.nan, dtype=np.float32)
+        for idx, person in enumerate(persons):
+            keypoints = person.get("keypoints") or {}
+            head_point = keypoints.get("nose") or keypoints.get("neck")
+            if head_point:
+                head_y[idx] = head_point[1]
+        if len(layout.chair_tops):
+            with np.errstate(invalid="ignore"):
+                head_above_chair = np.any(
+                    head_y[:, None]
+                    < layout.chair_tops[None, :] - config.HEAD_ABOVE_MARGIN,
+                    axis=1,
+                )
+        else:
+            head_above_chair = np.zeros(count, dtype=bool)
+
+        return {
+            "chair_iou": chair_iou.max(axis=1) if chair_iou.shape[1] else np.zeros(count),
+            "desk_iou": desk_iou.max(axis=1) if desk_iou.shape[1] else np.zeros(count),
+            "monitor_distance": (
+                monitor_distance.min(axis=1) if monitor_distance.shape[1] else None
+            ),
+            "head_above_chair": head_above_chair,
+        }
+
+    def _evaluate_person(self, person, frame_metrics, idx):
         bbox = person["bbox"]
         keypoints = person.get("keypoints", {}) or {}
-        head_point = keypoints.get("nose") or keypoints.get("neck")
 
-        chair_iou = max(
-            (calculate_iou(bbox, chair["bbox"]) for chair in chairs), default=0.0
-        )
+        chair_iou = float(frame_metrics["chair_iou"][idx])
+        desk_iou = float(frame_metrics["desk_iou"][idx])
+        head_above_chair = bool(frame_metrics["head_above_chair"][idx])
 
-        desk_iou = max(
-            (calculate_iou(bbox, desk["bbox"]) for desk in desks), default=0.0
+        closest_monitor_distance = None
+        if frame_metrics["monitor_distance"] is not None:
+            closest_monitor_distance = float(frame_metrics["monitor_distance"][idx])
+        monitor_near = (
+            closest_monitor_distance is not None
+            and closest_monitor_distance < config.MONITOR_DISTANCE_THRESHOLD
         )
 
-        head_above_chair = False
-        if head_point and chairs:
-            for chair in chairs:
-                chair_top = chair["bbox"][1]
-                if head_point[1] < chair_top - config.HEAD_ABOVE_MARGIN:
-                    head_above_chair = True
-                    break
-
-        monitor_near = False
-        if monitors:
-            person_center = self._get_bbox_center(bbox)
-            for monitor in monitors:
-                monitor_center = self._get_bbox_center(monitor["bbox"])
-                dist = calculate_distance(person_center, monitor_center)
-                if dist < config.MONITOR_DISTANCE_THRESHOLD:
-                    monitor_near = True
-                    break
-
         head_pose = None
         pose_ok = False
         if keypoints:
@@ -313,18 +746,6 @@ class DutyDetector:
                     <= config.HEAD_POSE_YAW_RANGE[1]
                 )
 
-        closest_monitor_distance = None
-        if monitors:
-            person_center = self._get_bbox_center(bbox)
-            min_distance = float("inf")
-            for monitor in monitors:
-                monitor_center = self._get_bbox_center(monitor["bbox"])
-                dist = calculate_distance(person_center, monitor_center)
-                if dist < min_distance:
-                    min_distance = dist
-            if min_distance != float("inf"):
-                closest_monitor_distance = min_distance
-
         conditions = {
             "chair_iou": chair_iou >= config.CHAIR_IOU_THRESHOLD,
             "head_above_chair": head_above_chair,
@@ -356,10 +777,10 @@ class DutyDetector:
             "metrics": metrics,
         }
 
-    def _update_history(self, frame_on_duty):
-        self.on_duty_history.append(frame_on_duty)
-        if len(self.on_duty_history) > self.smoothing_window:
-            self.on_duty_history.pop(0)
+    def _update_history(self, state, frame_on_duty):
+        state.on_duty_history.append(frame_on_duty)
+        if len(state.on_duty_history) > self.smoothing_window:
+            state.on_duty_history.pop(0)
 
     def _initialize_behavior_analyzer(self):
         if not self.enable_behavior_analysis:
@@ -381,24 +802,24 @@ class DutyDetector:
             self.behavior_analyzer = None
             self.enable_behavior_analysis = False
 
-    def _maybe_run_behavior_analysis(self, status_detail, detections):
+    def _maybe_run_behavior_analysis(self, state, status_detail, detections):
         if not self.behavior_analyzer:
             return None
         features = self._extract_frame_features(status_detail, detections)
         if not features:
             return None
         normalized = self._normalize_feature_vector(features)
-        self.behavior_sequence.append(normalized)
-        ready = len(self.behavior_sequence) == self.behavior_sequence.maxlen
+        state.behavior_sequence.append(normalized)
+        ready = len(state.behavior_sequence) == state.behavior_sequence.maxlen
         if not ready:
             return {"probability": None, "ready": False, "on_duty": None}
-        sequence = list(self.behavior_sequence)
+        sequence = list(state.behavior_sequence)
         try:
             probability = self.behavior_analyzer.predict(sequence)
         except Exception as exc:
             print(f"⚠️ 行为序列分析失败: {exc}")
             return None
-        self.last_lstm_score = probability
+        state.last_lstm_score = probability
         return {
             "probability": probability,
             "ready": True,
@@ -515,28 +936,88 @@ class DutyDetector:
         x1, y1, x2, y2 = bbox
         return ((x1 + x2) / 2, (y1 + y2) / 2)
 
-    def draw_detections(self, frame, detections, status_text=None):
+    def draw_detections(self, frame, detections, status_text=None, out=None):
+        """
+        绘制检测框、关键点与状态文字
+
+        Args:
+            frame: 原始帧（不会被修改，除非 out 就是 frame 本身）
+            detections (dict): 检测结果
+            status_text (str): 状态文字
+            out: 可选的预分配输出帧，与 frame 同尺寸；提供时原地绘制、不再分配新帧
+
+        Returns:
+            numpy.ndarray: 绘制后的帧（提供 out 时即为 out）
+        """
         if detections is None or frame is None:
             return frame
 
-        annotated = frame.copy()
+        if out is None:
+            annotated = frame.copy()
+        else:
+            if out is not frame:
+                np.copyto(out, frame)
+            annotated = out
+        boxes, keypoints, texts = self._overlay_elements(detections)
+        for (x1, y1, x2, y2), color in boxes:
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
+        for points in keypoints:
+            draw_keypoints(annotated, points, inplace=True)
+        draw_text_overlays(annotated, texts)
+
+        if status_text:
+            draw_status_text(annotated, status_text, position="top-left", inplace=True)
+
+        return annotated
+
+    def export_overlay(self, detections, status_text=None, frame_shape=None):
+        """
+        导出浏览器端叠加绘制所需的紧凑数据，内容与 draw_detections 绘制的一致
+
+        Args:
+            detections (dict): 检测结果，可为 None（仅有状态文字）
+            status_text (str): 状态文字
+            frame_shape (tuple): 原始帧尺寸，用于浏览器端坐标缩放
+
+        Returns:
+            dict: {"status", "size", "boxes", "keypoints", "texts"}，颜色为 #rrggbb
+        """
+        boxes, keypoints, texts = (
+            self._overlay_elements(detections) if detections else ([], [], [])
+        )
+        payload = {
+            "status": status_text or "",
+            "boxes": [[*coords, bgr_to_hex(color)] for coords, color in boxes],
+            "keypoints": [
+                [[int(p[0]), int(p[1])] for p in points.values() if p is not None]
+                for points in keypoints
+            ],
+            "texts": [
+                [text, int(x), int(y), size, bgr_to_hex(color)]
+                for text, (x, y), size, color in texts
+            ],
+        }
+        if frame_shape is not None:
+            payload["size"] = [int(frame_shape[1]), int(frame_shape[0])]
+        return payload
+
+    def _overlay_elements(self, detections):
+        """按绘制顺序整理边框、关键点与文字（服务端绘制与浏览器叠加共用）"""
+        boxes, keypoints, texts = [], [], []
+
+        def add_box(bbox, color, label):
+            x1, y1, x2, y2 = map(int, bbox)
+            boxes.append(((x1, y1, x2, y2), color))
+            texts.append((label, (x1, max(0, y1 - 25)), 18, color))
 
         for chair in detections.get("chairs", []):
-            annotated = self._draw_box(
-                annotated, chair["bbox"], config.COLORS["chair_box"], "椅子"
-            )
+            add_box(chair["bbox"], config.COLORS["chair_box"], "椅子")
 
         for desk in detections.get("desks", []):
-            annotated = self._draw_box(
-                annotated,
-                desk["bbox"],
-                config.COLORS.get("desk_box", (0, 128, 255)),
-                "桌面",
-            )
+            add_box(desk["bbox"], config.COLORS.get("desk_box", (0, 128, 255)), "桌面")
 
         for monitor in detections.get("monitors", []):
-            annotated = self._draw_box(
-                annotated,
+            add_box(
                 monitor["bbox"],
                 config.COLORS.get("monitor_box", (255, 255, 0)),
                 "显示器",
@@ -544,28 +1025,16 @@ class DutyDetector:
 
         for idx, person in enumerate(detections.get("persons", []), start=1):
             bbox = person["bbox"]
-            annotated = self._draw_box(
-                annotated, bbox, config.COLORS["person_box"], f"人员{idx}"
-            )
+            add_box(bbox, config.COLORS["person_box"], f"人员{idx}")
             if person.get("keypoints"):
-                annotated = draw_keypoints(annotated, person["keypoints"])
+                keypoints.append(person["keypoints"])
             if person.get("head_pose"):
                 pose = person["head_pose"]
                 text = f"P:{pose['pitch']:.1f} Y:{pose['yaw']:.1f}"
                 x1, y1, _, _ = bbox
-                annotated = draw_chinese_text(
-                    annotated, text, (int(x1), int(y1) - 50), 18, (0, 255, 255)
-                )
-
-        if status_text:
-            annotated = draw_status_text(annotated, status_text, position="top-left")
-
-        return annotated
+                texts.append((text, (int(x1), int(y1) - 50), 18, (0, 255, 255)))
 
-    def _draw_box(self, frame, bbox, color, label):
-        x1, y1, x2, y2 = map(int, bbox)
-        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-        return draw_chinese_text(frame, label, (x1, max(0, y1 - 25)), 18, color)
+        return boxes, keypoints, texts
 
     # 预留扩展方法
     def detect_pose(self, frame):
@@ -581,8 +1050,18 @@ class DutyDetector:
     def get_detection_statistics(self):
         """获取检测统计信息"""
         return {
-            "total_detections": len(self.detection_history),
+            "total_detections": self.detection_count,
             "last_detection_time": self.last_detection_time,
             "model_path": self.model_path,
             "confidence_threshold": self.confidence_threshold,
+            "parallel_mode": self.parallel_mode,
+            "input_size": self.input_size,
+            "strategy": self.strategy,
+            "object_model_runs": self.object_model_runs,
+            "object_model_skips": self.object_model_skips,
+            "furniture": {
+                stream_id: state.furniture_map.get_stats()
+                for stream_id, state in self._streams.items()
+            },
+            "timing": self.last_timing,
         }
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+静态家具布局 - 对椅子/桌面/显示器检测结果做时序投票，
+维护每路摄像头稳定的家具地图，供在岗判定直接使用
+作者：创新创业项目组
+日期：2025年10月21日
+"""
+
+import numpy as np
+
+from utils import bbox_centers, pairwise_iou
+
+FURNITURE_KEYS = ("chairs", "monitors", "desks")
+
+
+class FurnitureLayout:
+    """某一时刻已确认的家具布局，附带在岗判定所需的预计算数组"""
+
+    def __init__(self, chairs=None, desks=None, monitors=None):
+        self.chairs = list(chairs or [])
+        self.desks = list(desks or [])
+        self.monitors = list(monitors or [])
+
+        self.chair_boxes = self._stack_boxes(self.chairs)
+        self.desk_boxes = self._stack_boxes(self.desks)
+        self.monitor_boxes = self._stack_boxes(self.monitors)
+        self.chair_tops = self.chair_boxes[:, 1]
+        self.monitor_centers = bbox_centers(self.monitor_boxes)
+
+    @staticmethod
+    def _stack_boxes(items):
+        if not items:
+            return np.zeros((0, 4), dtype=np.float32)
+        return np.array([item["bbox"] for item in items], dtype=np.float32)
+
+    @classmethod
+    def from_detections(cls, detections):
+        return cls(
+            chairs=detections.get("chairs"),
+            desks=detections.get("desks"),
+            monitors=detections.get("monitors"),
+        )
+
+    def as_detections(self):
+        """以检测结果字典的形式返回家具列表（用于绘制与特征提取）"""
+        return {
+            "chairs": list(self.chairs),
+            "monitors": list(self.monitors),
+            "desks": list(self.desks),
+        }
+
+
+class _FurnitureTrack:
+    def __init__(self, detection):
+        self.detection = dict(detection)
+        self.bbox = np.asarray(detection["bbox"], dtype=np.float32)
+        self.votes = 1
+        self.misses = 0
+
+
+class FurnitureMap:
+    """
+    按时序投票维护的家具地图
+
+    同一家具连续被检测到 min_votes 次才确认，连续 max_misses 次未检测到才移除；
+    画面布局发生变化（invalidate）后，下一次检测结果直接生效，
+    旧的未匹配条目加速淘汰
+    """
+
+    def __init__(self, min_votes=3, max_misses=10, match_iou=0.5, smoothing=0.3):
+        """
+        Args:
+            min_votes (int): 确认一个家具所需的检测次数
+            max_misses (int): 允许连续漏检的次数
+            match_iou (float): 新检测与已有条目匹配的IoU阈值
+            smoothing (float): 匹配时新框所占权重（指数平滑）
+        """
+        self.min_votes = max(1, int(min_votes))
+        self.max_misses = max(0, int(max_misses))
+        self.match_iou = match_iou
+        self.smoothing = smoothing
+        self.tracks = {key: [] for key in FURNITURE_KEYS}
+        self.stale = True  # 空地图等同于需要立即建立
+        self.version = 0
+        self.invalidations = 0
+        self._layout = FurnitureLayout()
+
+    @property
+    def initialized(self):
+        return self.version > 0
+
+    def invalidate(self):
+        """场景布局发生变化，下一次更新以新检测为准"""
+        if not self.stale:
+            self.invalidations += 1
+        self.stale = True
+
+    def update(self, detections):
+        """用一次目标检测结果增量更新地图，返回最新布局"""
+        for key in FURNITURE_KEYS:
+            self._update_category(self.tracks[key], detections.get(key, []))
+        self.stale = False
+        self.version += 1
+        self._layout = FurnitureLayout(
+            chairs=self._confirmed("chairs"),
+            desks=self._confirmed("desks"),
+            monitors=self._confirmed("monitors"),
+        )
+        return self._layout
+
+    def layout(self):
+        return self._layout
+
+    def _update_category(self, tracks, detections):
+        detections = sorted(detections, key=lambda d: d["confidence"], reverse=True)
+        iou_matrix = pairwise_iou(
+            [det["bbox"] for det in detections], [track.bbox for track in tracks]
+        )
+        existing = list(tracks)
+        used = np.zeros(len(existing), dtype=bool)
+        matched_tracks = set()
+        for det_idx, det in enumerate(detections):
+            best_track = None
+            if existing:
+                ious = np.where(used, -1.0, iou_matrix[det_idx])
+                track_idx = int(np.argmax(ious))
+                if ious[track_idx] >= self.match_iou:
+                    best_track = existing[track_idx]
+                    used[track_idx] = True
+
+            if best_track is None:
+                track = _FurnitureTrack(det)
+                if self.stale:
+                    track.votes = self.min_votes
+                tracks.append(track)
+                matched_tracks.add(id(track))
+                continue
+
+            best_track.bbox = (1.0 - self.smoothing) * best_track.bbox + (
+                self.smoothing * np.asarray(det["bbox"], dtype=np.float32)
+            )
+            best_track.detection = dict(det)
+            best_track.votes = min(best_track.votes + 1, self.min_votes)
+            best_track.misses = 0
+            matched_tracks.add(id(best_track))
+
+        survivors = []
+        for track in tracks:
+            if id(track) not in matched_tracks:
+                track.misses += 1
+                if self.stale:
+                    # 布局已变化，未再出现的旧家具加速淘汰
+                    track.misses = max(track.misses, self.max_misses // 2 + 1)
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        tracks[:] = survivors
+
+    def _confirmed(self, key):
+        items = []
+        for track in self.tracks[key]:
+            if track.votes < self.min_votes:
+                continue
+            det = dict(track.detection)
+            det["bbox"] = track.bbox.copy()
+            items.append(det)
+        return items
+
+    def get_stats(self):
+        return {
+            "version": self.version,
+            "invalidations": self.invalidations,
+            "confirmed": {
+                key: sum(1 for t in self.tracks[key] if t.votes >= self.min_votes)
+                for key in FURNITURE_KEYS
+            },
+            "candidates": {key: len(self.tracks[key]) for key in FURNITURE_KEYS},
+        }
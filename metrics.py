@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段延迟统计 - 采集 → 检测 → 分析 → 绘制 → 编码各阶段按摄像头记录耗时，
+以滚动时间窗口的对数分桶直方图给出 p50/p95/p99，并可按 Prometheus 文本格式导出
+作者：创新创业项目组
+日期：2025年10月23日
+"""
+
+import bisect
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import config
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时从 /proc 读取
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows 无 resource 模块
+    resource = None
+
+
+def _default_bounds(min_ms=0.01, max_ms=60000.0, ratio=1.2):
+    """对数分桶上界（毫秒），相邻桶相差 ratio 倍，分位数相对误差不超过约 ratio-1"""
+    bounds = []
+    value = min_ms
+    while value < max_ms:
+        bounds.append(value)
+        value *= ratio
+    bounds.append(max_ms)
+    return tuple(bounds)
+
+
+# Prometheus 导出桶（毫秒）；并入内部分桶边界，导出的累计计数是精确值
+EXPORT_BOUNDS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BUCKET_BOUNDS_MS = tuple(
+    sorted(set(_default_bounds()) | {float(b) for b in EXPORT_BOUNDS_MS})
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """
+    滚动窗口延迟直方图
+
+    窗口切成若干时间片，每片一组分桶计数；记录只做一次二分查找与计数加一，
+    时间片过期时整片清零，查询时合并仍在窗口内的时间片。
+    另保留一份自启动以来的累计计数，供 Prometheus 直方图导出
+    """
+
+    def __init__(self, window=60.0, slices=6, bounds=BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.slices = max(1, int(slices))
+        self.slice_seconds = max(1e-3, float(window) / self.slices)
+        size = len(bounds) + 1  # 最后一个桶收纳超出上界的值
+        self._counts = [[0] * size for _ in range(self.slices)]
+        self._slice_ids = [-1] * self.slices
+        self._sums = [0.0] * self.slices
+        self._maxes = [0.0] * self.slices
+        self._lifetime = [0] * size
+        self.total_count = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms, now):
+        slice_id = int(now / self.slice_seconds)
+        pos = slice_id % self.slices
+        if self._slice_ids[pos] != slice_id:
+            self._counts[pos] = [0] * (len(self.bounds) + 1)
+            self._slice_ids[pos] = slice_id
+            self._sums[pos] = 0.0
+            self._maxes[pos] = 0.0
+        bucket = bisect.bisect_left(self.bounds, elapsed_ms)
+        self._counts[pos][bucket] += 1
+        self._lifetime[bucket] += 1
+        self._sums[pos] += elapsed_ms
+        if elapsed_ms > self._maxes[pos]:
+            self._maxes[pos] = elapsed_ms
+        self.total_count += 1
+        self.total_ms += elapsed_ms
+
+    def cumulative(self, export_bounds=EXPORT_BOUNDS_MS):
+        """
+        自启动以来的累计分桶计数
+
+        Returns:
+            dict: buckets（与 export_bounds 对应的 <= 上界累计计数）、count、sum_ms
+        """
+        running = np.cumsum(self._lifetime)
+        buckets = [
+            int(running[bisect.bisect_left(self.bounds, bound)])
+            for bound in export_bounds
+        ]
+        return {"buckets": buckets, "count": self.total_count, "sum_ms": self.total_ms}
+
+    def summary(self, now, quantiles=QUANTILES):
+        """
+        窗口内的统计摘要
+
+        Returns:
+            dict | None: count/mean_ms/max_ms 及各分位数（如 p95_ms），窗口内无数据返回 None
+        """
+        current = int(now / self.slice_seconds)
+        valid = [
+            pos
+            for pos, slice_id in enumerate(self._slice_ids)
+            if current - self.slices < slice_id <= current
+        ]
+        if not valid:
+            return None
+        counts = np.sum([self._counts[pos] for pos in valid], axis=0)
+        count = int(counts.sum())
+        if count == 0:
+            return None
+        max_ms = max(self._maxes[pos] for pos in valid)
+        summary = {
+            "count": count,
+            "mean_ms": sum(self._sums[pos] for pos in valid) / count,
+            "max_ms": max_ms,
+        }
+        cumulative = np.cumsum(counts)
+        for quantile in quantiles:
+            target = quantile * count
+            idx = int(np.searchsorted(cumulative, target))
+            lower = self.bounds[idx - 1] if idx > 0 else 0.0
+            upper = self.bounds[idx] if idx < len(self.bounds) else max_ms
+            before = cumulative[idx - 1] if idx > 0 else 0
+            # 桶内线性插值，并以窗口最大值为上限
+            fraction = (target - before) / counts[idx] if counts[idx] else 1.0
+            value = lower + (upper - lower) * fraction
+            summary[f"p{quantile * 100:g}_ms"] = float(min(value, max_ms))
+        return summary
+
+
+class StageMetrics:
+    """按 (摄像头, 阶段) 维护延迟直方图的线程安全注册表"""
+
+    def __init__(self, window=None, slices=6, enabled=None):
+        """
+        Args:
+            window (float): 滚动窗口长度（秒），默认 config.STAGE_METRICS_WINDOW
+            slices (int): 窗口切分的时间片数
+            enabled (bool): 是否记录，默认 config.ENABLE_STAGE_METRICS
+        """
+        self.window = float(window or config.STAGE_METRICS_WINDOW)
+        self.slices = slices
+        self.enabled = config.ENABLE_STAGE_METRICS if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._histograms = {}  # cam_id -> {stage: LatencyHistogram}
+
+    def record(self, cam_id, stage, seconds):
+        """记录一次阶段耗时（秒）"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            stages = self._histograms.get(cam_id)
+            if stages is None:
+                stages = self._histograms[cam_id] = {}
+            histogram = stages.get(stage)
+            if histogram is None:
+                histogram = stages[stage] = LatencyHistogram(self.window, self.slices)
+            histogram.record(seconds * 1000.0, now)
+
+    def summary(self, cam_id=None):
+        """
+        各阶段窗口内的延迟摘要
+
+        Args:
+            cam_id (str): 只返回指定摄像头；为空时返回全部
+
+        Returns:
+            dict: cam_id -> {stage: 摘要}
+        """
+        now = time.monotonic()
+        with self._lock:
+            if cam_id is None:
+                selected = dict(self._histograms)
+            else:
+                selected = {cam_id: self._histograms.get(cam_id, {})}
+            result = {}
+            for key, stages in selected.items():
+                result[key] = {}
+                for stage, histogram in stages.items():
+                    summary = histogram.summary(now)
+                    if summary is not None:
+                        result[key][stage] = summary
+        return result
+
+    def export(self, cam_id=None):
+        """
+        各阶段的累计分桶计数（见 LatencyHistogram.cumulative），用于 Prometheus 导出
+
+        Returns:
+            dict: cam_id -> {stage: {"buckets", "count", "sum_ms"}}
+        """
+        with self._lock:
+            if cam_id is None:
+                selected = dict(self._histograms)
+            else:
+                selected = {cam_id: self._histograms.get(cam_id, {})}
+            return {
+                key: {stage: hist.cumulative() for stage, hist in stages.items()}
+                for key, stages in selected.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+def process_rss_bytes(pid=None):
+    """进程常驻内存（字节），无法读取时返回 None"""
+    pid = pid or os.getpid()
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", "r", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if pid == os.getpid() and resource is not None:
+            # macOS 的 ru_maxrss 单位是字节，Linux 为 KB；这里取峰值作为近似
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        return None
+
+
+def torch_threads():
+    """
+    torch 的算子内/算子间线程数；仅在 torch 已被加载时读取，避免采集指标时引入导入开销
+
+    Returns:
+        tuple | None: (intra_op, inter_op)
+    """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return None
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
+
+class PrometheusWriter:
+    """
+    Prometheus 文本格式（0.0.4）输出
+
+    样本按指标名归组：按摄像头逐个写入时同名指标分散在各处调用中，
+    render() 时每个指标族只输出一次 HELP/TYPE，其样本连续排列
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix="duty_"):
+        self.prefix = prefix
+        self._families = {}  # 指标名 -> 行列表（含 HELP/TYPE），按首次出现顺序
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels.items():
+            text = (
+                str(value)
+                .replace("\\", "\\\\")
+                .replace("\n", "\\n")
+                .replace('"', '\\"')
+            )
+            parts.append(f'{key}="{text}"')
+        return "{" + ",".join(parts) + "}"
+
+    def _family(self, name, metric_type, help_text):
+        """返回指标族的行列表，首次出现时写入 HELP/TYPE"""
+        lines = self._families.get(name)
+        if lines is None:
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+            self._families[name] = lines
+        return lines
+
+    def sample(self, name, value, labels=None, metric_type="gauge", help_text=""):
+        """输出一个样本；value 为 None 时跳过"""
+        if value is None:
+            return
+        name = self.prefix + name
+        lines = self._family(name, metric_type, help_text or name)
+        text = str(int(value)) if isinstance(value, (bool, int)) else repr(float(value))
+        lines.append(f"{name}{self._labels(labels)} {text}")
+
+    def gauge(self, name, value, labels=None, help_text=""):
+        self.sample(name, value, labels, "gauge", help_text)
+
+    def counter(self, name, value, labels=None, help_text=""):
+        self.sample(name, value, labels, "counter", help_text)
+
+    def histogram(self, name, exported, labels=None, help_text=""):
+        """
+        输出直方图
+
+        Args:
+            exported (dict): LatencyHistogram.cumulative() 的结果（毫秒），按秒输出
+        """
+        name = self.prefix + name
+        lines = self._family(name, "histogram", help_text or name)
+        labels = dict(labels or {})
+        for bound, count in zip(EXPORT_BOUNDS_MS, exported["buckets"]):
+            bucket_labels = dict(labels, le=f"{bound / 1000:g}")
+            lines.append(f"{name}_bucket{self._labels(bucket_labels)} {count}")
+        count = exported["count"]
+        inf_labels = dict(labels, le="+Inf")
+        lines.append(f"{name}_bucket{self._labels(inf_labels)} {count}")
+        lines.append(f"{name}_sum{self._labels(labels)} {exported['sum_ms'] / 1000!r}")
+        lines.append(f"{name}_count{self._labels(labels)} {count}")
+
+    def render(self):
+        lines = [line for family in self._families.values() for line in family]
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的统计实例；进程模式下各工作进程各有一份，摘要随状态回传
+stage_metrics = StageMetrics()
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+视频采集流水线 - 抓帧与推理解耦
+作者：创新创业项目组
+日期：2025年10月20日
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+from metrics import stage_metrics
+from streaming import EventChannel, FrameBroadcaster
+from utils import PerformanceMonitor, frame_signature, signature_difference
+
+
+def open_camera(source):
+    """打开指定摄像头源并验证能否读取帧，失败返回 None"""
+    camera = cv2.VideoCapture(source)
+    if camera.isOpened():
+        ret, frame = camera.read()
+        if ret:
+            return camera
+        camera.release()
+    return None
+
+
+def configure_camera(camera):
+    """按配置设置摄像头分辨率与帧率"""
+    camera.set(cv2.CAP_PROP_FRAME_WIDTH, config.CAMERA_WIDTH)
+    camera.set(cv2.CAP_PROP_FRAME_HEIGHT, config.CAMERA_HEIGHT)
+    camera.set(cv2.CAP_PROP_FPS, config.CAMERA_FPS)
+
+
+class FrameGrabber:
+    """独立抓帧线程，只保留最新一帧，旧帧直接丢弃"""
+
+    def __init__(self, camera, name="frame-grabber", retry_interval=0.1, cam_id=None):
+        """
+        初始化抓帧器
+
+        Args:
+            camera: 已打开的 cv2.VideoCapture 对象
+            name (str): 线程名称
+            retry_interval (float): 读取失败后的重试间隔（秒）
+            cam_id (str): 摄像头ID，用于分阶段延迟统计
+        """
+        self.camera = camera
+        self.name = name
+        self.cam_id = cam_id
+        self.retry_interval = retry_interval
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = 0.0
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = False
+        self._thread = None
+
+        self.grabbed_frames = 0
+        self.dropped_frames = 0
+        self.processed_frames = 0
+        self.read_failures = 0
+        self.last_latency = 0.0
+
+    def start(self):
+        """启动抓帧线程"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """停止抓帧线程"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while self._running:
+            if self.camera is None or not self.camera.isOpened():
+                print("摄像头未连接")
+                time.sleep(1)
+                continue
+
+            read_start = time.perf_counter()
+            ret, frame = self.camera.read()
+            if not ret:
+                self.read_failures += 1
+                print("无法读取摄像头帧")
+                time.sleep(self.retry_interval)
+                continue
+
+            with self._cond:
+                # 上一帧尚未被推理阶段取走，直接覆盖（丢弃旧帧）
+                if self._frame is not None and self._seq > self._consumed_seq:
+                    self.dropped_frames += 1
+                self._frame = frame
+                self._frame_time = time.time()
+                self._seq += 1
+                self.grabbed_frames += 1
+                self._cond.notify_all()
+            read_elapsed = time.perf_counter() - read_start
+            stage_metrics.record(self.cam_id, "capture", read_elapsed)
+
+    def read_latest(self, timeout=1.0):
+        """
+        获取最新一帧（阻塞直到有新帧或超时）
+
+        Returns:
+            tuple | None: (帧序号, 帧, 采集时间戳)，超时返回 None
+        """
+        with self._cond:
+            if self._seq <= self._consumed_seq:
+                self._cond.wait(timeout)
+            if self._seq <= self._consumed_seq or self._frame is None:
+                return None
+            self._consumed_seq = self._seq
+            return self._seq, self._frame, self._frame_time
+
+    def mark_processed(self, frame_time):
+        """推理阶段处理完一帧后调用，记录端到端延迟"""
+        with self._cond:
+            self.processed_frames += 1
+            self.last_latency = max(0.0, time.time() - frame_time)
+            latency = self.last_latency
+        stage_metrics.record(self.cam_id, "end_to_end", latency)
+
+    def get_stats(self):
+        """获取抓帧/丢帧/处理计数"""
+        with self._cond:
+            return {
+                "grabbed": self.grabbed_frames,
+                "dropped": self.dropped_frames,
+                "processed": self.processed_frames,
+                "read_failures": self.read_failures,
+                "pending": self._seq > self._consumed_seq,
+                "latency_ms": self.last_latency * 1000,
+            }
+
+
+class MotionGate:
+    """运动门控：画面相对上次检测几乎无变化时跳过推理，复用上次结果"""
+
+    def __init__(self, threshold=None, max_skips=None, enabled=None):
+        """
+        Args:
+            threshold (float): 缩略图平均灰度差阈值（0-1），低于该值视为静止
+            max_skips (int): 最多连续跳过的帧数，到达后强制检测一次
+            enabled (bool): 是否启用
+        """
+        self.enabled = config.ENABLE_MOTION_GATE if enabled is None else enabled
+        self.threshold = (
+            config.MOTION_THRESHOLD if threshold is None else float(threshold)
+        )
+        self.max_skips = (
+            config.MOTION_MAX_SKIPS if max_skips is None else int(max_skips)
+        )
+        self._reference = None
+        self._consecutive_skips = 0
+        self.evaluated_frames = 0
+        self.skipped_frames = 0
+        self.last_motion = 0.0
+
+    def should_skip(self, frame, has_previous_result=True):
+        """判断当前帧是否可以跳过检测；返回 False 时以该帧作为新的参考帧"""
+        self.evaluated_frames += 1
+        if not self.enabled:
+            return False
+        signature = frame_signature(frame)
+        self.last_motion = signature_difference(signature, self._reference)
+        if (
+            has_previous_result
+            and self.last_motion < self.threshold
+            and self._consecutive_skips < self.max_skips
+        ):
+            self._consecutive_skips += 1
+            self.skipped_frames += 1
+            return True
+        self._reference = signature
+        self._consecutive_skips = 0
+        return False
+
+    def get_stats(self):
+        evaluated = self.evaluated_frames
+        return {
+            "motion_gate": self.enabled,
+            "motion_skipped": self.skipped_frames,
+            "motion_skip_ratio": self.skipped_frames / evaluated if evaluated else 0.0,
+            "last_motion": self.last_motion,
+        }
+
+
+class AdaptiveRateController:
+    """
+    自适应推理速率控制器
+
+    根据检测耗时的滑动平均，在输入分辨率阶梯与推理步长之间调整：
+    超出延迟目标时先降分辨率、再加大步长；余量充足时按相反顺序恢复。
+    步长表示两次推理之间至少间隔的摄像头帧数，
+    同时保证推理线程占用不超过 CPU 预算
+    """
+
+    def __init__(
+        self,
+        enabled=None,
+        target_latency_ms=None,
+        cpu_budget=None,
+        imgsz_ladder=None,
+        max_stride=None,
+        adjust_interval=None,
+        camera_fps=None,
+    ):
+        self.enabled = config.ENABLE_ADAPTIVE_RATE if enabled is None else enabled
+        self.target_latency = (
+            config.TARGET_DETECT_LATENCY_MS
+            if target_latency_ms is None
+            else target_latency_ms
+        ) / 1000.0
+        self.cpu_budget = config.TARGET_CPU_BUDGET if cpu_budget is None else cpu_budget
+        self.imgsz_ladder = list(imgsz_ladder or config.ADAPTIVE_IMGSZ_LADDER)
+        self.max_stride = max(
+            1, int(max_stride if max_stride is not None else config.ADAPTIVE_MAX_STRIDE)
+        )
+        self.adjust_interval = max(
+            1,
+            int(
+                adjust_interval
+                if adjust_interval is not None
+                else config.ADAPTIVE_ADJUST_INTERVAL
+            ),
+        )
+        self.frame_interval = 1.0 / max(1, camera_fps or config.CAMERA_FPS)
+
+        self.monitor = PerformanceMonitor(window_size=config.FPS_WINDOW_SIZE)
+        self.level = 0  # 分辨率阶梯索引，0为最高分辨率
+        self.stride = 1
+        self.adjustments = 0
+        self.last_reason = "初始"
+        self._samples_since_adjust = 0
+        self._last_inference = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def imgsz(self):
+        """当前推理输入尺寸，未启用或未配置阶梯时返回 None（使用模型默认）"""
+        if not self.enabled or not self.imgsz_ladder:
+            return None
+        return self.imgsz_ladder[self.level]
+
+    def wait_time(self):
+        """距离允许下一次推理还需等待的秒数"""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            ready_at = self._last_inference + self.stride * self.frame_interval
+        return max(0.0, ready_at - time.time())
+
+    def record(self, detect_seconds):
+        """记录一次检测耗时，并按需调整分辨率与步长"""
+        with self._lock:
+            self._last_inference = time.time()
+            if not self.enabled:
+                return
+            self.monitor.record(detect_seconds)
+            self._samples_since_adjust += 1
+            if self._samples_since_adjust >= self.adjust_interval:
+                self._samples_since_adjust = 0
+                self._adjust()
+
+    def _budget_stride(self, avg_latency):
+        """满足 CPU 预算所需的最小步长"""
+        if self.cpu_budget <= 0:
+            return 1
+        return int(np.ceil(avg_latency / (self.cpu_budget * self.frame_interval)))
+
+    def _adjust(self):
+        avg_latency = self.monitor.get_avg_processing_time() / 1000.0
+        min_stride = min(self.max_stride, max(1, self._budget_stride(avg_latency)))
+        before = (self.level, self.stride)
+
+        if avg_latency > self.target_latency * 1.1:
+            if self.level < len(self.imgsz_ladder) - 1:
+                self.level += 1
+                self.last_reason = "延迟超出目标，降低输入分辨率"
+            elif self.stride < self.max_stride:
+                self.stride += 1
+                self.last_reason = "延迟超出目标，增大推理步长"
+        elif avg_latency < self.target_latency * 0.6:
+            if self.stride > min_stride:
+                self.stride -= 1
+                self.last_reason = "延迟余量充足，减小推理步长"
+            elif self.level > 0:
+                self.level -= 1
+                self.last_reason = "延迟余量充足，提高输入分辨率"
+
+        if self.stride < min_stride:
+            self.stride = min_stride
+            self.last_reason = "超出CPU预算，增大推理步长"
+
+        if (self.level, self.stride) != before:
+            self.adjustments += 1
+            # 分辨率变化后旧样本失去参考意义
+            self.monitor.frame_times.clear()
+
+    def get_state(self):
+        with self._lock:
+            avg_ms = self.monitor.get_avg_processing_time()
+            return {
+                "enabled": self.enabled,
+                "imgsz": self.imgsz,
+                "stride": self.stride,
+                "avg_detect_ms": avg_ms,
+                "target_latency_ms": self.target_latency * 1000,
+                "cpu_budget": self.cpu_budget,
+                "estimated_cpu_usage": (
+                    min(1.0, avg_ms / 1000.0 / (self.stride * self.frame_interval))
+                    if avg_ms
+                    else 0.0
+                ),
+                "adjustments": self.adjustments,
+                "last_reason": self.last_reason,
+            }
+
+
+class AnnotationBuffer:
+    """
+    双缓冲标注输出帧
+
+    绘制始终写入后台缓冲区，发布后前后台交换；
+    读端只在持锁期间访问前台帧，因此写端无需加锁，也无需每帧分配新内存
+    """
+
+    def __init__(self):
+        self._buffers = [None, None]
+        self._back = 0
+        self.allocations = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """获取后台缓冲区，尺寸变化时才重新分配"""
+        shape = tuple(shape)
+        buffer = self._buffers[self._back]
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[self._back] = buffer
+            self.allocations += 1
+        return buffer
+
+    def owns_back(self, frame):
+        return frame is not None and frame is self._buffers[self._back]
+
+    def swap(self):
+        self._back ^= 1
+
+
+class CameraContext:
+    """单路摄像头的运行状态：采集对象、抓帧线程与最新结果"""
+
+    def __init__(self, cam_id, source):
+        self.cam_id = cam_id
+        self.source = source
+        self.camera = None
+        self.grabber = None
+        self.worker = None  # 进程模式下的 CameraWorkerHandle
+        self.motion_gate = MotionGate()
+        self.last_result = None  # 最近一次检测结果 (detections, status, status_detail)
+        self.output_buffer = AnnotationBuffer()
+
+        self.frame_lock = threading.Lock()
+        self.frame_cond = threading.Condition(self.frame_lock)
+        self.frame_seq = 0  # 每次发布递增，供编码线程判断是否有新帧
+        self.latest_frame = None
+        self.latest_status = "系统初始化中..."
+        self.latest_detail = None
+        # 每个质量档位一个广播器，按需创建；同一档位的客户端共享编码结果
+        self._broadcasters = {}
+        self._broadcasters_lock = threading.Lock()
+        # 浏览器端叠加模式下推送每帧的检测数据
+        self.overlay_channel = EventChannel(f"overlay-{cam_id}")
+        self.status_channel = EventChannel(f"status-{cam_id}")
+
+    def attach(self, camera):
+        """绑定已打开的摄像头并创建抓帧线程"""
+        self.camera = camera
+        self.grabber = FrameGrabber(
+            camera, name=f"frame-grabber-{self.cam_id}", cam_id=self.cam_id
+        )
+
+    def start(self):
+        if self.grabber is not None:
+            self.grabber.start()
+        if self.worker is not None:
+            self.worker.start()
+
+    @property
+    def broadcaster(self):
+        """默认档位的广播器"""
+        return self.get_broadcaster()
+
+    def get_broadcaster(self, profile=None):
+        profile = profile or config.DEFAULT_STREAM_PROFILE
+        with self._broadcasters_lock:
+            broadcaster = self._broadcasters.get(profile)
+            if broadcaster is None:
+                broadcaster = FrameBroadcaster(self, profile=profile)
+                self._broadcasters[profile] = broadcaster
+            return broadcaster
+
+    def stop(self):
+        with self._broadcasters_lock:
+            broadcasters = list(self._broadcasters.values())
+        for broadcaster in broadcasters:
+            broadcaster.stop()
+        self.overlay_channel.close()
+        self.status_channel.close()
+        if self.grabber is not None:
+            self.grabber.stop()
+        if self.camera is not None:
+            self.camera.release()
+        if self.worker is not None:
+            self.worker.stop()
+
+    def is_online(self):
+        if self.worker is not None:
+            return self.worker.is_alive()
+        return self.camera is not None
+
+    def publish(self, frame, status, detail=None, overlay=None):
+        """
+        发布最新一帧处理结果；若帧来自输出缓冲区，则同时交换前后台
+
+        Args:
+            frame: 处理后的帧
+            status (str): 状态文字
+            detail (dict): 状态详情
+            overlay (dict): 浏览器端叠加数据，提供时推送给订阅者；浏览器看不到
+                MJPEG 各帧的序号，叠加的总是最新一条数据，不与画面逐帧对齐
+        """
+        with self.frame_cond:
+            self.latest_frame = frame
+            self.latest_status = status
+            self.latest_detail = detail
+            if self.output_buffer.owns_back(frame):
+                self.output_buffer.swap()
+            self.frame_seq += 1
+            self.frame_cond.notify_all()
+        if overlay is not None:
+            self.overlay_channel.publish(overlay)
+
+    def copy_latest_frame(self, alloc, after_seq=0, timeout=None):
+        """
+        等待比 after_seq 更新的帧，并在持锁期间复制到 alloc(shape, dtype) 提供的数组
+
+        Returns:
+            int | None: 复制的帧序号，超时返回 None
+        """
+        with self.frame_cond:
+            if self.frame_seq <= after_seq:
+                self.frame_cond.wait(timeout)
+            frame = self.latest_frame
+            if self.frame_seq <= after_seq or frame is None:
+                return None
+            np.copyto(alloc(frame.shape, frame.dtype), frame)
+            return self.frame_seq
+
+    def notify_waiters(self):
+        with self.frame_cond:
+            self.frame_cond.notify_all()
+
+    def get_status(self):
+        with self.frame_lock:
+            return self.latest_status
+
+    def get_latency(self):
+        """该路各阶段耗时摘要；进程模式下合并工作进程回传的采集与检测阶段"""
+        stages = stage_metrics.summary(self.cam_id).get(self.cam_id, {})
+        if self.worker is not None:
+            stages = dict(self.worker.get_stage_summary(), **stages)
+        return stages
+
+    def get_stage_histograms(self):
+        """该路各阶段的累计分桶计数（Prometheus 导出用），进程模式下合并工作进程回传"""
+        stages = stage_metrics.export(self.cam_id).get(self.cam_id, {})
+        if self.worker is not None:
+            stages = dict(self.worker.get_stage_histograms(), **stages)
+        return stages
+
+    def get_stats(self):
+        stats = {"cam_id": self.cam_id, "source": str(self.source)}
+        if self.grabber is not None:
+            stats.update(self.grabber.get_stats())
+            stats.update(self.motion_gate.get_stats())
+        if self.worker is not None:
+            stats.update(self.worker.get_stats())
+        with self._broadcasters_lock:
+            broadcasters = dict(self._broadcasters)
+        stats["streams"] = {
+            profile: broadcaster.get_stats()
+            for profile, broadcaster in broadcasters.items()
+        }
+        stats["overlay"] = self.overlay_channel.get_stats()
+        stats["status_push"] = self.status_channel.get_stats()
+        return stats
@@ -35,6 +35,7 @@ def show_config_options():
     print("   HOST = '0.0.0.0'          # 服务器地址")
     print("   PORT = 5000               # 服务器端口")
     print("   DEBUG = False             # 调试模式")
+    print("   SERVER_MODE = 'production' # 生产模式（waitress），或 python start.py -p")
 
 
 def quick_config_guide():
@@ -84,7 +85,7 @@ def start_system():
         # 导入并运行主程序
         import app
 
-        # 主程序会在 if __name__ == '__main__' 中自动运行
+        return app.main()
 
     except KeyboardInterrupt:
         print("\n\n⏹️ 用户中断，系统已停止")
@@ -113,6 +114,13 @@ def main():
         elif sys.argv[1] in ["-c", "--config"]:
             show_config_options()
             return
+        elif sys.argv[1] in ["-p", "--production"]:
+            # 生产模式：waitress 多线程服务器，跳过交互提示
+            import config
+
+            config.SERVER_MODE = "production"
+            start_system()
+            return
 
     # 显示配置信息
     show_config_options()
@@ -0,0 +1,674 @@
+# -*- coding: utf-8 -*-
+"""
+视频流广播 - 每路摄像头每帧只编码一次，所有客户端共享同一份JPEG数据；
+检测叠加数据等通过服务器推送事件（SSE）一次序列化、多端分发
+作者：创新创业项目组
+日期：2025年10月22日
+"""
+
+import itertools
+import json
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+from metrics import stage_metrics
+from utils import to_jsonable
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MIMETYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+SSE_MIMETYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def resolve_profile(name=None, width=None):
+    """
+    解析视频流质量档位
+
+    Args:
+        name (str): 档位名称；为空或 "auto" 时按 width 自动选择
+        width (int): 客户端显示宽度（像素），自动选择时取能覆盖该宽度的最小档位
+
+    Returns:
+        str: 档位名称
+
+    Raises:
+        ValueError: 档位不存在
+    """
+    profiles = config.STREAM_PROFILES
+    if name and name != "auto":
+        if name not in profiles:
+            raise ValueError(f"未知的视频流档位: {name}")
+        return name
+    if not width:
+        return config.DEFAULT_STREAM_PROFILE
+    # 按宽度从小到大，0/None 表示原始分辨率（视为无穷大）
+    ordered = sorted(
+        profiles, key=lambda key: profiles[key].get("max_width") or float("inf")
+    )
+    for key in ordered:
+        max_width = profiles[key].get("max_width")
+        if not max_width or max_width >= width:
+            return key
+    return ordered[-1]
+
+
+def mjpeg_part(jpeg_bytes):
+    """把JPEG数据封装为一个 multipart 分段"""
+    return (
+        b"--" + MJPEG_BOUNDARY.encode("ascii") + b"\r\n"
+        b"Content-Type: image/jpeg\r\n\r\n" + jpeg_bytes + b"\r\n"
+    )
+
+
+class FrameBroadcaster:
+    """
+    单路摄像头单个质量档位的MJPEG广播器
+
+    编码线程只在发布序号变化时取帧：持锁期间仅把前台帧复制到暂存区，
+    缩放与编码在锁外完成；编码结果是不可变的 bytes，按序号分发给该档位的
+    所有订阅者。没有订阅者时不编码，单帧快照按需编码并缓存
+    """
+
+    def __init__(
+        self,
+        context,
+        profile=None,
+        quality=None,
+        max_width=None,
+        idle_timeout=1.0,
+        keepalive=None,
+    ):
+        """
+        Args:
+            context: 对应的 CameraContext
+            profile (str): 质量档位名称（见 config.STREAM_PROFILES）
+            quality (int): JPEG压缩质量，默认取档位配置，再默认 config.JPEG_QUALITY
+            max_width (int): 输出最大宽度，默认取档位配置；0/None 表示不缩放
+            idle_timeout (float): 等待新帧的超时（秒），用于检查停止与订阅状态
+            keepalive (float): 长时间没有新帧时重发最新一帧的间隔（秒），
+                使服务器能及时发现已断开的客户端
+        """
+        self.context = context
+        self.profile = profile or config.DEFAULT_STREAM_PROFILE
+        settings = config.STREAM_PROFILES.get(self.profile, {})
+        self.quality = int(quality or settings.get("quality") or config.JPEG_QUALITY)
+        self.max_width = int(
+            max_width if max_width is not None else settings.get("max_width") or 0
+        )
+        self.idle_timeout = idle_timeout
+        self.keepalive = config.STREAM_KEEPALIVE if keepalive is None else keepalive
+        self._stage = f"encode_{self.profile}"
+
+        self._cond = threading.Condition()
+        self._packet = None  # (帧序号, multipart 分段)
+        self._jpeg = None  # (帧序号, JPEG数据)，供单帧快照复用
+        self._snapshot_lock = threading.Lock()
+        self._clients = {}  # client_id -> _StreamClient
+        self._client_ids = itertools.count(1)
+        self._staging = None
+        self._scaled = None
+        self._running = False
+        self._thread = None
+
+        self.encoded_frames = 0
+        self.snapshot_encodes = 0
+        self.last_encode_ms = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"stream-encoder-{self.context.cam_id}-{self.profile}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self.context.notify_waiters()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        last_seq = 0
+        while True:
+            with self._cond:
+                while self._running and not self._clients:
+                    self._cond.wait(self.idle_timeout)
+                if not self._running:
+                    return
+
+            # 编码线程兼作卡死检测：等待新帧的超时不超过卡死阈值的一半
+            self._drop_stalled()
+            seq = self.context.copy_latest_frame(
+                self._ensure_staging,
+                after_seq=last_seq,
+                timeout=min(self.idle_timeout, config.STREAM_STALL_TIMEOUT / 2),
+            )
+            if seq is None:
+                continue
+            last_seq = seq
+
+            start = time.perf_counter()
+            output = self._scale(self._staging, self._scaled)
+            if output is not self._staging:
+                self._scaled = output
+            jpeg = self._encode(output)
+            if jpeg is None:
+                continue
+            part = mjpeg_part(jpeg)
+            elapsed = time.perf_counter() - start
+            with self._cond:
+                self._packet = (seq, part)
+                self._jpeg = (seq, jpeg)
+                self.encoded_frames += 1
+                self.last_encode_ms = elapsed * 1000
+                now = time.time()
+                for subscriber in self._clients.values():
+                    if not subscriber.behind_since:
+                        subscriber.behind_since = now
+                self._cond.notify_all()
+            stage_metrics.record(self.context.cam_id, self._stage, elapsed)
+
+    def _drop_stalled(self):
+        """
+        断开卡死的客户端
+
+        客户端卡死时服务器线程阻塞在套接字写入里，生成器无法自行察觉，
+        因此由编码线程检查每个订阅者：有更新的帧未取走、或一次写入未返回，
+        持续超过 STREAM_STALL_TIMEOUT 即移出订阅者并通知连接中止
+        """
+        now = time.time()
+        stalled = []
+        with self._cond:
+            latest_seq = self._packet[0] if self._packet else 0
+            for client_id, subscriber in list(self._clients.items()):
+                age = subscriber.stall_age(now, latest_seq)
+                if age > config.STREAM_STALL_TIMEOUT:
+                    subscriber.stalled = True
+                    del self._clients[client_id]
+                    stalled.append(subscriber)
+        for subscriber in stalled:
+            print(
+                f"⚠️ 视频流客户端 {subscriber.client or subscriber.client_id} "
+                f"超过 {config.STREAM_STALL_TIMEOUT:.1f}s 未取走新帧，断开连接"
+            )
+            if subscriber.on_stall is not None:
+                try:
+                    subscriber.on_stall()
+                except OSError:
+                    pass  # 连接已关闭
+
+    def _ensure_staging(self, shape, dtype):
+        """暂存区只在尺寸变化时重新分配"""
+        if (
+            self._staging is None
+            or self._staging.shape != shape
+            or self._staging.dtype != dtype
+        ):
+            self._staging = np.empty(shape, dtype=dtype)
+        return self._staging
+
+    def _scale(self, frame, dst=None):
+        """按档位最大宽度等比缩小到 dst，dst 尺寸不符时重新分配"""
+        height, width = frame.shape[:2]
+        if not self.max_width or width <= self.max_width:
+            return frame
+        target_h = max(1, int(round(height * self.max_width / width)))
+        shape = (target_h, self.max_width) + frame.shape[2:]
+        if dst is None or dst.shape != shape or dst.dtype != frame.dtype:
+            dst = np.empty(shape, dtype=frame.dtype)
+        cv2.resize(
+            frame,
+            (self.max_width, target_h),
+            dst=dst,
+            interpolation=cv2.INTER_AREA,
+        )
+        return dst
+
+    def _encode(self, frame):
+        ok, encoded = cv2.imencode(
+            ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        )
+        return encoded.tobytes() if ok else None
+
+    def snapshot(self):
+        """
+        最新一帧的JPEG
+
+        有推流订阅者时直接复用编码线程的结果；否则在调用线程中按需编码一次并缓存，
+        画面未变化时重复请求不再编码
+
+        Returns:
+            tuple | None: (帧序号, JPEG数据)，尚无画面时返回 None
+        """
+        with self._cond:
+            cached = self._jpeg
+            streaming = self._running and bool(self._clients)
+        if cached is not None and (streaming or cached[0] >= self.context.frame_seq):
+            return cached
+
+        with self._snapshot_lock:
+            # 并发的快照请求只编码一次，其余等待后复用结果
+            with self._cond:
+                cached = self._jpeg
+            after_seq = cached[0] if cached is not None else 0
+            holder = []
+
+            def alloc(shape, dtype):
+                holder.append(np.empty(shape, dtype=dtype))
+                return holder[0]
+
+            seq = self.context.copy_latest_frame(alloc, after_seq=after_seq, timeout=0)
+            if seq is None:
+                return cached
+            start = time.perf_counter()
+            jpeg = self._encode(self._scale(holder[0]))
+            stage_metrics.record(
+                self.context.cam_id, self._stage, time.perf_counter() - start
+            )
+            with self._cond:
+                if jpeg is not None and (self._jpeg is None or self._jpeg[0] < seq):
+                    self._jpeg = (seq, jpeg)
+                    self.snapshot_encodes += 1
+                return self._jpeg
+
+    def wait_packet(self, after_seq=0, timeout=None):
+        """
+        等待比 after_seq 更新的编码结果
+
+        Returns:
+            tuple | None: (帧序号, multipart 分段)，超时或已停止返回 None
+        """
+        with self._cond:
+            stale = self._packet is None or self._packet[0] <= after_seq
+            if self._running and stale:
+                self._cond.wait(timeout)
+            packet = self._packet
+            if packet is None or packet[0] <= after_seq:
+                return None
+            return packet
+
+    def stream(self, client=None, on_stall=None):
+        """
+        MJPEG 生成器：每个客户端一个
+
+        总是发送最新一帧，客户端处理不过来时跳过中间帧；发送缓冲写满后
+        写入开始阻塞，发送间隔随之按写入耗时自适应（不低于 STREAM_MIN_FPS）。
+        新帧积压或写入阻塞超过 STREAM_STALL_TIMEOUT 时由编码线程判定卡死
+        （见 _drop_stalled），生成器恢复后立即结束
+
+        Args:
+            client (str): 客户端标识（如远端地址），仅用于统计
+            on_stall (callable): 判定卡死时调用，用于关闭底层连接，
+                使阻塞在写入中的服务器线程及时返回
+        """
+        self.start()
+        subscriber = _StreamClient(next(self._client_ids), client, on_stall)
+        with self._cond:
+            self._clients[subscriber.client_id] = subscriber
+            self._cond.notify_all()
+        min_interval = 1.0 / max(1, config.STREAM_FPS)
+        max_interval = 1.0 / max(0.1, config.STREAM_MIN_FPS)
+        last_part = None
+        try:
+            while self._running and not subscriber.stalled:
+                started = time.time()
+                packet = self.wait_packet(
+                    subscriber.last_seq, timeout=self.idle_timeout
+                )
+                if packet is None:
+                    if last_part is None or started - subscriber.last_sent < (
+                        self.keepalive
+                    ):
+                        continue
+                    # 画面长时间不变时重发，写入失败即可发现客户端已断开
+                    part = last_part
+                else:
+                    seq, part = packet
+                    with self._cond:
+                        if subscriber.last_seq:
+                            subscriber.skipped += max(
+                                0, seq - subscriber.last_seq - 1
+                            )
+                        subscriber.last_seq = seq
+                        subscriber.behind_since = 0.0
+                    last_part = part
+
+                write_start = time.time()
+                subscriber.write_started = write_start
+                yield part
+                write_time = time.time() - write_start
+                subscriber.write_started = 0.0
+                if subscriber.stalled:
+                    return
+                subscriber.record_send(len(part), write_time)
+
+                # 写入越慢，发送间隔越长：推流速率跟随客户端的实际接收能力
+                subscriber.interval = min(
+                    max_interval, max(min_interval, subscriber.send_ewma * 2)
+                )
+                remaining = subscriber.interval - (time.time() - started)
+                if remaining > 0:
+                    time.sleep(remaining)
+        finally:
+            with self._cond:
+                self._clients.pop(subscriber.client_id, None)
+
+    def get_stats(self):
+        with self._cond:
+            latest_seq = self._packet[0] if self._packet else 0
+            return {
+                "subscribers": len(self._clients),
+                "profile": self.profile,
+                "encoded_frames": self.encoded_frames,
+                "snapshot_encodes": self.snapshot_encodes,
+                "last_encode_ms": self.last_encode_ms,
+                "quality": self.quality,
+                "max_width": self.max_width,
+                "last_seq": latest_seq,
+                "clients": [
+                    client.get_stats(latest_seq) for client in self._clients.values()
+                ],
+            }
+
+
+class _StreamClient:
+    """单个视频流客户端的发送统计"""
+
+    def __init__(self, client_id, client=None, on_stall=None):
+        self.client_id = client_id
+        self.client = client
+        self.on_stall = on_stall
+        self.connected_at = time.time()
+        self.last_seq = 0
+        self.last_sent = 0.0
+        self.sent = 0
+        self.skipped = 0
+        self.bytes_sent = 0
+        self.send_ewma = 0.0
+        self.interval = 0.0
+        self.write_started = 0.0  # 正在进行的写入的开始时间，0 表示未在写入
+        self.behind_since = 0.0  # 出现未取走的新帧的时间，0 表示没有积压
+        self.stalled = False
+
+    def stall_age(self, now, latest_seq):
+        """
+        距上次取得进展的时长（秒）：取新帧积压时长与当前写入耗时的较大者
+
+        调用方需持有广播器的锁
+        """
+        if latest_seq > self.last_seq:
+            if not self.behind_since:
+                self.behind_since = now
+        else:
+            self.behind_since = 0.0
+        backlog = now - self.behind_since if self.behind_since else 0.0
+        writing = now - self.write_started if self.write_started else 0.0
+        return max(backlog, writing)
+
+    def record_send(self, size, write_time):
+        self.sent += 1
+        self.bytes_sent += size
+        self.last_sent = time.time()
+        self.send_ewma = (
+            write_time if self.sent == 1 else 0.7 * self.send_ewma + 0.3 * write_time
+        )
+
+    def get_stats(self, latest_seq):
+        elapsed = max(1e-6, time.time() - self.connected_at)
+        return {
+            "id": self.client_id,
+            "client": self.client,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            # 只保留最新一帧，待发送队列深度至多为1
+            "queue_depth": 1 if latest_seq > self.last_seq else 0,
+            "fps": self.sent / elapsed,
+            "send_ms": self.send_ewma * 1000,
+            "interval_ms": self.interval * 1000,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+class EventChannel:
+    """
+    服务器推送事件（SSE）频道
+
+    每个事件只序列化一次，按序号分发给所有订阅者；订阅者总是拿到最新事件，
+    处理不过来时中间事件直接跳过。长时间没有事件时发送心跳注释保持连接
+    """
+
+    def __init__(self, name, event=None, heartbeat=15.0):
+        """
+        Args:
+            name (str): 频道名称（用于统计）
+            event (str): SSE 事件类型，None 表示默认的 message 事件
+            heartbeat (float): 心跳间隔（秒）
+        """
+        self.name = name
+        self.event = event
+        self.heartbeat = heartbeat
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._message = None
+        self._subscribers = 0
+        self._closed = False
+        self.published_events = 0
+
+    def publish(self, payload):
+        """序列化并发布一个事件，返回事件序号"""
+        data = json.dumps(
+            to_jsonable(payload), ensure_ascii=False, separators=(",", ":")
+        )
+        lines = []
+        if self.event:
+            lines.append(f"event: {self.event}")
+        with self._cond:
+            self._seq += 1
+            lines.append(f"id: {self._seq}")
+            lines.append(f"data: {data}")
+            self._message = ("\n".join(lines) + "\n\n").encode("utf-8")
+            self.published_events += 1
+            self._cond.notify_all()
+            return self._seq
+
+    @property
+    def subscriber_count(self):
+        with self._cond:
+            return self._subscribers
+
+    def wait_message(self, after_seq=0, timeout=None):
+        """
+        等待比 after_seq 更新的事件
+
+        Returns:
+            tuple | None: (事件序号, 已编码的事件字节)，超时返回 None
+        """
+        with self._cond:
+            if not self._closed and self._seq <= after_seq:
+                self._cond.wait(timeout)
+            if self._seq <= after_seq or self._message is None:
+                return None
+            return self._seq, self._message
+
+    def stream(self):
+        """SSE 生成器：先发送当前最新事件，之后只在有新事件或需要心跳时输出"""
+        with self._cond:
+            self._subscribers += 1
+        last_seq = 0
+        try:
+            yield b"retry: 3000\n\n"
+            while not self._closed:
+                item = self.wait_message(last_seq, timeout=self.heartbeat)
+                if item is None:
+                    yield b": keepalive\n\n"
+                    continue
+                last_seq, message = item
+                yield message
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "subscribers": self._subscribers,
+                "published": self.published_events,
+                "last_seq": self._seq,
+            }
+
+
+class StatusPublisher:
+    """
+    状态推送器
+
+    后台线程周期性检查各路状态：关键字段变化时立即推送，否则按心跳间隔推送；
+    状态只计算一次并通过各路的 status_channel 分发，没有订阅者的摄像头不计算
+    """
+
+    def __init__(
+        self, contexts, build_payload, change_key, heartbeat=None, poll_interval=0.2
+    ):
+        """
+        Args:
+            contexts: 返回 CameraContext 列表的可调用对象
+            build_payload: build_payload(context) 生成状态字典
+            change_key: change_key(payload) 提取用于判断“状态是否变化”的字段
+            heartbeat (float): 状态未变化时的最大推送间隔（秒）
+            poll_interval (float): 检查状态变化的间隔（秒）
+        """
+        self.contexts = contexts
+        self.build_payload = build_payload
+        self.change_key = change_key
+        self.heartbeat = (
+            config.STATUS_REFRESH_INTERVAL if heartbeat is None else heartbeat
+        )
+        self.poll_interval = min(poll_interval, self.heartbeat)
+        self._last_sent = {}  # cam_id -> (change_key, 推送时间)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def tick(self, now=None):
+        """检查一次所有摄像头，返回本次推送的事件数"""
+        now = time.time() if now is None else now
+        published = 0
+        for context in self.contexts():
+            channel = context.status_channel
+            if channel.subscriber_count == 0:
+                self._last_sent.pop(context.cam_id, None)
+                continue
+            payload = self.build_payload(context)
+            key = self.change_key(payload)
+            last = self._last_sent.get(context.cam_id)
+            if last is not None and last[0] == key and now - last[1] < self.heartbeat:
+                continue
+            channel.publish(payload)
+            self._last_sent[context.cam_id] = (key, now)
+            published += 1
+        return published
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="status-publisher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                self.tick()
+            except Exception as exc:
+                print(f"状态推送错误: {exc}")
+
+
+class StreamSlots:
+    """
+    长连接（视频流、推送）名额
+
+    每个长连接在线程型服务器中独占一个工作线程，超过上限时直接拒绝，
+    避免观看人数增加时耗尽线程；名额在服务器关闭响应（客户端断开）时归还
+    """
+
+    def __init__(self, limit=None):
+        """
+        Args:
+            limit (int): 同时在线的长连接上限，0 表示不限制
+        """
+        self.limit = int(config.MAX_STREAM_CLIENTS if limit is None else limit)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self, iterable):
+        """
+        占用一个名额并包装响应体
+
+        Returns:
+            可迭代对象 | None: 名额已满时返回 None
+        """
+        with self._lock:
+            if self.limit > 0 and self.active >= self.limit:
+                self.rejected += 1
+                return None
+            self.active += 1
+        return _SlotIterable(self, iterable)
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "limit": self.limit,
+                "rejected": self.rejected,
+            }
+
+
+class _SlotIterable:
+    """WSGI 服务器在响应结束或客户端断开时调用 close()，此时归还名额"""
+
+    def __init__(self, slots, iterable):
+        self._slots = slots
+        self._iterable = iterable
+        self._released = False
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        try:
+            close = getattr(self._iterable, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._slots._release()
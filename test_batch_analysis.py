@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+离线批量分析测试脚本
+用脚本化推理后端分析生成的录像，验证时间线合并与数据库写入
+"""
+
+import os
+import sqlite3
+import tempfile
+
+import cv2
+import numpy as np
+
+from batch_analysis import (
+    analyze_video,
+    build_timeline,
+    collect_videos,
+    run_batch,
+    summarize_timeline,
+)
+from detector import DutyDetector
+
+
+def _write_video(path, frames, fps=10.0, size=(160, 120)):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for idx in range(frames):
+        frame = np.full((size[1], size[0], 3), idx % 255, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+
+
+def test_build_timeline_merges_runs():
+    """相同状态的连续帧合并为一段，最后一段延续到录像结束"""
+    samples = [(0.0, True), (1.0, True), (2.0, False), (3.0, False), (4.0, True)]
+    timeline = build_timeline(samples, end_seconds=6.0)
+    assert timeline == [(0.0, 2.0, True), (2.0, 4.0, False), (4.0, 6.0, True)]
+
+    summary = summarize_timeline(timeline)
+    assert summary["on_duty_seconds"] == 4.0
+    assert summary["off_duty_seconds"] == 2.0
+    assert summary["longest_off_duty_seconds"] == 2.0
+    assert summary["off_duty_segments"] == 1
+    assert build_timeline([], end_seconds=5.0) == []
+
+    # 检测失败（None）的区间不计入任何一段
+    samples = [(0.0, True), (1.0, None), (2.0, None), (3.0, True), (4.0, False)]
+    timeline = build_timeline(samples, end_seconds=5.0)
+    assert timeline == [(0.0, 1.0, True), (3.0, 4.0, True), (4.0, 5.0, False)]
+    assert build_timeline([(0.0, None)], end_seconds=5.0) == []
+    print("✓ 时间线合并正确")
+
+
+def test_failed_detections_are_not_off_duty():
+    """检测失败的帧计入 error_frames，不按离岗计入时间线"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "a.avi")
+        _write_video(path, frames=40)
+        detector = DutyDetector(backend="scripted", parallel_mode="serial")
+        original = detector.detect_batch
+        calls = []
+
+        def flaky(frames, stream_ids=None):
+            calls.append(len(calls))
+            if 10 <= len(calls) <= 19:
+                return [(None, "检测失败: 模拟", None)] * len(frames)
+            return original(frames, stream_ids)
+
+        detector.detect_batch = flaky
+        try:
+            result = analyze_video(path, detector=detector)
+        finally:
+            detector.close()
+    assert result["status"] == "ok"
+    assert result["analyzed_frames"] == 40
+    assert result["error_frames"] == 10
+    # 内置脚本前90帧在岗：失败区间被排除，剩余均为在岗
+    assert [state for _, _, state in result["timeline"]] == [True, True]
+    assert result["off_duty_seconds"] == 0.0
+    assert abs(result["on_duty_seconds"] - 3.0) < 1e-6
+    print("✓ 检测失败帧不计为离岗")
+
+
+def test_run_batch_writes_database():
+    """进程池分析多个文件，每个文件的汇总与时间线写入数据库"""
+    with tempfile.TemporaryDirectory() as tmp:
+        video_dir = os.path.join(tmp, "videos")
+        os.makedirs(os.path.join(video_dir, "sub"))
+        paths = [
+            os.path.join(video_dir, "a.avi"),
+            os.path.join(video_dir, "sub", "b.avi"),
+        ]
+        for path in paths:
+            _write_video(path, frames=160)
+        with open(os.path.join(video_dir, "notes.txt"), "w") as notes:
+            notes.write("not a video")
+
+        videos = collect_videos([video_dir, paths[0]])
+        assert sorted(videos) == sorted(paths)
+
+        db_path = os.path.join(tmp, "stats.db")
+        results = run_batch(videos, db_path=db_path, workers=2, backend="scripted")
+        assert len(results) == 2
+        for result in results:
+            assert result["status"] == "ok", result
+            assert result["total_frames"] == 160
+            assert result["analyzed_frames"] == 160
+            assert result["error_frames"] == 0
+            assert abs(result["duration_seconds"] - 16.0) < 1e-6
+            # 内置脚本先在岗 90 帧再离开 60 帧
+            assert result["timeline"][0][2] is True
+            assert result["off_duty_seconds"] > 4.0
+            assert 0.5 < result["on_duty_ratio"] < 0.75
+
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT id, status, on_duty_seconds + off_duty_seconds "
+                "FROM video_analysis"
+            ).fetchall()
+            assert len(rows) == 2
+            for analysis_id, status, total in rows:
+                assert status == "ok"
+                assert abs(total - 16.0) < 1e-6
+                segments = conn.execute(
+                    "SELECT start_seconds, end_seconds, on_duty FROM video_timeline "
+                    "WHERE analysis_id = ? ORDER BY start_seconds",
+                    (analysis_id,),
+                ).fetchall()
+                assert segments[0][0] == 0.0 and segments[0][2] == 1
+                assert segments[-1][1] == 16.0
+        finally:
+            conn.close()
+    print("✓ 批量分析结果写入数据库")
+
+
+if __name__ == "__main__":
+    test_build_timeline_merges_runs()
+    test_failed_detections_are_not_off_duty()
+    test_run_batch_writes_database()
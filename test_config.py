@@ -59,6 +59,46 @@ def test_config_validation():
         return False
 
 
+def _validate_with(**overrides):
+    """临时覆盖配置项后执行验证，结束后恢复原值"""
+    import config
+
+    originals = {name: getattr(config, name) for name in overrides}
+    try:
+        for name, value in overrides.items():
+            setattr(config, name, value)
+        return config.validate_config()
+    finally:
+        for name, value in originals.items():
+            setattr(config, name, value)
+
+
+def test_motion_gate_validation():
+    """运动门控阈值须在 0-1 之间，最大连续跳过帧数须为非负整数"""
+    print("\n📋 测试运动门控配置验证...")
+    assert _validate_with(MOTION_THRESHOLD=0.0, MOTION_MAX_SKIPS=0)
+    assert not _validate_with(MOTION_THRESHOLD=-0.1)
+    assert not _validate_with(MOTION_THRESHOLD=1.5)
+    assert not _validate_with(MOTION_MAX_SKIPS=-1)
+    assert not _validate_with(MOTION_MAX_SKIPS=2.5)
+    print("✅ 运动门控配置验证正确")
+    return True
+
+
+def test_adaptive_rate_validation():
+    """CPU 预算为 0（不限制）或 (0, 1]；分辨率阶梯非空且均为 32 的正整数倍"""
+    print("\n📋 测试自适应速率配置验证...")
+    assert _validate_with(TARGET_CPU_BUDGET=0.0)
+    assert _validate_with(TARGET_CPU_BUDGET=1.0, ADAPTIVE_IMGSZ_LADDER=[640, 320])
+    assert not _validate_with(TARGET_CPU_BUDGET=-0.5)
+    assert not _validate_with(TARGET_CPU_BUDGET=1.5)
+    assert not _validate_with(ADAPTIVE_IMGSZ_LADDER=[])
+    assert not _validate_with(ADAPTIVE_IMGSZ_LADDER=[640, 300])
+    assert not _validate_with(ADAPTIVE_IMGSZ_LADDER=[640, 0])
+    print("✅ 自适应速率配置验证正确")
+    return True
+
+
 def test_camera_detection():
     """测试摄像头检测"""
     print("\n📹 测试摄像头检测...")
@@ -181,6 +221,8 @@ def main():
     tests = [
         ("模块导入", test_imports),
         ("配置验证", test_config_validation),
+        ("运动门控配置验证", test_motion_gate_validation),
+        ("自适应速率配置验证", test_adaptive_rate_validation),
         ("摄像头检测", test_camera_detection),
         ("字体检测", test_font_detection),
         ("检测器初始化", test_detector_initialization),
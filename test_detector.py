@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+检测器测试脚本
+使用脚本化推理后端驱动完整的检测与在岗判定链路，无需 ultralytics 与模型权重
+"""
+
+import os
+import sys
+import tempfile
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends import (
+    ScriptedBackend,
+    _restore_coordinates,
+    create_backend,
+    decode_detect_output,
+    decode_pose_output,
+    ensure_exported,
+    letterbox,
+)
+from detector import DutyDetector
+
+
+def _make_detector():
+    detector = DutyDetector(backend="scripted", parallel_mode="serial", strategy="full")
+    for backend in (detector.model, detector.pose_model):
+        backend.latency = 0.0
+    return detector
+
+
+def test_scripted_backend_replays_script():
+    """脚本按 repeat 展开并循环回放，归一化坐标按帧尺寸缩放，低于置信度的目标被过滤"""
+    script = {
+        "normalized": True,
+        "frames": [
+            {
+                "repeat": 2,
+                "objects": [
+                    {"class": "person", "bbox": [0.1, 0.2, 0.5, 0.6], "score": 0.9},
+                    {"class": "chair", "bbox": [0.0, 0.5, 0.4, 1.0], "score": 0.2},
+                ],
+            },
+            {"repeat": 1, "objects": []},
+        ],
+    }
+    backend = ScriptedBackend("detect", script=script, latency_ms=0)
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    outputs = backend.predict([frame, frame, frame, frame], conf=0.25)
+
+    boxes, scores, classes = outputs[0]
+    assert np.allclose(boxes, [[20, 20, 100, 60]])
+    assert np.allclose(scores, [0.9])
+    assert classes.tolist() == [0]
+    assert outputs[2] is None
+    assert outputs[3] is not None  # 脚本循环回到第一段
+    assert backend.frame_index == 4
+
+    pose = create_backend("scripted", None, "pose")
+    boxes, scores, keypoints = pose.predict([frame], conf=0.25)[0]
+    assert keypoints.shape == (1, 17, 2)
+    print("✓ 脚本化后端按脚本回放")
+
+
+def test_exported_model_decoding():
+    """导出模型的预处理与解码：letterbox 居中填充，NMS 去重，坐标还原到原始帧"""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    image, ratio, pad = letterbox(frame, 320)
+    assert image.shape == (320, 320, 3)
+    assert ratio == 0.5 and pad == (0, 40)
+    assert image[0, 0, 0] == 114 and image[160, 160, 0] == 0
+
+    prediction = np.zeros((4 + 80, 3), dtype=np.float32)
+    prediction[:4, 0] = [160, 160, 50, 100]
+    prediction[4 + 0, 0] = 0.9  # person
+    prediction[:4, 1] = [161, 160, 50, 100]
+    prediction[4 + 0, 1] = 0.8  # 与第一个框重叠，被 NMS 抑制
+    prediction[:4, 2] = [161, 160, 50, 100]
+    prediction[4 + 56, 2] = 0.6  # 不同类别不互相抑制
+    boxes, scores, classes = decode_detect_output(prediction, conf=0.25)
+    assert classes.tolist() == [0, 56]
+    assert np.allclose(scores, [0.9, 0.6])
+    assert decode_detect_output(prediction, conf=0.95) is None
+
+    boxes, _, _ = _restore_coordinates(
+        (boxes, scores, classes), ratio, pad, frame.shape, "detect"
+    )
+    assert np.allclose(boxes[0], [270, 140, 370, 340])
+
+    pose = np.zeros((5 + 17 * 3, 1), dtype=np.float32)
+    pose[:5, 0] = [160, 160, 50, 100, 0.9]
+    keypoints = np.zeros((17, 3), dtype=np.float32)
+    keypoints[:, :2] = (160, 150)
+    keypoints[:, 2] = 0.9
+    keypoints[3, 2] = 0.1  # 不可见
+    pose[5:, 0] = keypoints.reshape(-1)
+    boxes, scores, points = decode_pose_output(pose, conf=0.25)
+    assert points.shape == (1, 17, 2)
+    assert np.isnan(points[0, 3]).all()
+    _, _, points = _restore_coordinates(
+        (boxes, scores, points), ratio, pad, frame.shape, "pose"
+    )
+    assert np.allclose(points[0, 0], [320, 220])
+
+    assert ensure_exported("models/custom.onnx", "onnx") == "models/custom.onnx"
+    print("✓ 导出模型预处理与解码正确")
+
+
+def test_concurrent_export_runs_once():
+    """多个调用方同时导出同一模型时只导出一次，其余等待后复用缓存"""
+    exports = []
+
+    class FakeYOLO:
+        task = "detect"
+        names = {0: "person"}
+
+        def __init__(self, model_path):
+            self.model_path = model_path
+
+        def export(self, format, imgsz, dynamic):
+            exports.append(format)
+            time.sleep(0.2)
+            path = os.path.join(os.path.dirname(self.model_path), "exported.onnx")
+            with open(path, "wb") as exported:
+                exported.write(b"onnx")
+            return path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        weights = os.path.join(tmp, "model.pt")
+        with open(weights, "wb") as weights_file:
+            weights_file.write(b"pt")
+        cache_dir = os.path.join(tmp, "cache")
+        fake = types.ModuleType("ultralytics")
+        fake.YOLO = FakeYOLO
+        original = sys.modules.get("ultralytics")
+        sys.modules["ultralytics"] = fake
+        try:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                futures = [
+                    pool.submit(ensure_exported, weights, "onnx", None, cache_dir)
+                    for _ in range(4)
+                ]
+                paths = {future.result() for future in futures}
+        finally:
+            if original is None:
+                sys.modules.pop("ultralytics", None)
+            else:
+                sys.modules["ultralytics"] = original
+        target = os.path.join(cache_dir, "model.onnx")
+        assert paths == {target}
+        assert exports == ["onnx"]
+        with open(target, "rb") as exported:
+            assert exported.read() == b"onnx"
+        assert sorted(os.listdir(cache_dir)) == ["model.onnx", "model.onnx.json"]
+    print("✓ 并发导出只执行一次")
+
+
+def test_detector_with_scripted_backend():
+    """内置脚本先在岗后离开，检测器给出对应状态，且结果可复现"""
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    runs = []
+    for _ in range(2):
+        detector = _make_detector()
+        try:
+            statuses, person_boxes = [], []
+            for _ in range(150):
+                detections, status, _ = detector.detect(frame.copy())
+                statuses.append(status)
+                persons = detections["persons"] if detections else []
+                person_boxes.append([p["bbox"].tolist() for p in persons])
+        finally:
+            detector.close()
+        runs.append((statuses, person_boxes))
+
+    statuses, person_boxes = runs[0]
+    assert statuses[60].startswith("在岗")
+    assert "1/1人" in statuses[60]
+    assert person_boxes[60] == [[224.0, 96.0, 384.0, 432.0]]
+    assert statuses[-1].startswith("离岗")
+    assert "未检测到人员" in statuses[-1]
+    assert person_boxes[-1] == []
+    assert runs[0] == runs[1]
+    print("✓ 脚本化后端驱动检测器，结果可复现")
+
+
+class _RecordingBackend(ScriptedBackend):
+    """记录每个 (视频流, 帧序号) 回放到的首个检测框"""
+
+    def __init__(self, task, script, calls):
+        super().__init__(task, script=script, latency_ms=0)
+        self.calls = calls
+
+    def predict(self, batch, conf, imgsz=None, frame_ids=None):
+        outputs = super().predict(batch, conf, imgsz, frame_ids)
+        for key, arrays in zip(frame_ids, outputs):
+            self.calls[key] = arrays[0][0].tolist()
+        return outputs
+
+
+def test_scripted_backends_share_timeline_across_streams():
+    """pose_first 下目标检测隔帧运行、多路交错推理，两个后端仍按帧序号取同一条脚本"""
+    script = {
+        "frames": [
+            {
+                "objects": [
+                    {"class": "person", "bbox": [x, 0, x + 10, 10], "score": 0.9}
+                ],
+                "poses": [
+                    {
+                        "bbox": [x, 0, x + 10, 10],
+                        "score": 0.9,
+                        "keypoints": [[x, 5]] * 17,
+                    }
+                ],
+            }
+            for x in range(0, 70, 10)
+        ]
+    }
+    detector = DutyDetector(
+        backend="scripted", parallel_mode="serial", strategy="pose_first"
+    )
+    detector.object_interval = 5
+    calls = {"detect": {}, "pose": {}}
+    detector.model = _RecordingBackend("detect", script, calls["detect"])
+    detector.pose_model = _RecordingBackend("pose", script, calls["pose"])
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    try:
+        for step in range(30):
+            frames, stream_ids = [frame], ["a"]
+            if step >= 3:
+                frames.append(frame)
+                stream_ids.append("b")
+            detector.detect_batch(frames, stream_ids)
+    finally:
+        detector.close()
+
+    assert len(calls["pose"]) == 30 + 27
+    assert 0 < len(calls["detect"]) < len(calls["pose"])
+    for (stream_id, frame_no), box in calls["pose"].items():
+        assert box[0] == (frame_no % 7) * 10
+    for key, box in calls["detect"].items():
+        assert box == calls["pose"][key]
+    print("✓ 两个脚本化后端按 (视频流, 帧序号) 对齐回放")
+
+
+def test_scene_change_ignores_people_and_flicker():
+    """人员区域的变化与单帧闪烁不会使家具地图失效，持续的布局变化才会"""
+    detector = _make_detector()
+    background = np.full((480, 640, 3), 90, dtype=np.uint8)
+    state = detector._get_stream("default")
+    try:
+        for idx in range(10):
+            frame = background.copy()
+            # 内置脚本中人员框约为 x 224-384、y 96-432，人在框内走动
+            x = 230 + idx * 10
+            frame[120:400, x : x + 60] = 250
+            detector.detect(frame)
+        assert state.furniture_map.invalidations == 0
+
+        flicker = np.clip(background.astype(int) + 80, 0, 255).astype(np.uint8)
+        detector.detect(flicker)
+        detector.detect(background.copy())
+        assert state.furniture_map.invalidations == 0
+
+        moved = background.copy()
+        moved[:, 0:200] = 10  # 人员区域以外的布局变化
+        for _ in range(3):
+            detector.detect(moved.copy())
+        assert state.furniture_map.invalidations == 1
+    finally:
+        detector.close()
+    print("✓ 场景变化判定忽略人员走动与瞬时闪烁")
+
+
+def test_pose_process_stays_aligned_after_object_failure():
+    """进程模式下目标检测失败后，姿态进程的旧回复被丢弃，后续批次结果不错位"""
+    detector = DutyDetector(
+        backend="scripted", parallel_mode="process", strategy="full"
+    )
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    try:
+        original = detector._run_object_subset
+
+        def failing(batch, object_mask, frame_ids=None):
+            raise RuntimeError("模拟目标检测失败")
+
+        detector._run_object_subset = failing
+        _, status, detail = detector.detect(frame)
+        assert detail is None
+        assert detector.pose_process._pending is None
+
+        detector._run_object_subset = original
+        results = detector.detect_batch([frame, frame, frame], ["a", "b", "c"])
+        assert all(detail is not None for _, _, detail in results)
+
+        # 未取走的旧回复按请求ID丢弃
+        detector.pose_process.submit([frame])
+        detector.pose_process.submit([frame, frame])
+        arrays, _ = detector.pose_process.result()
+        assert len(arrays) == 2
+    finally:
+        detector.close()
+    print("✓ 姿态进程结果按请求ID对齐")
+
+
+if __name__ == "__main__":
+    test_scripted_backend_replays_script()
+    test_exported_model_decoding()
+    test_concurrent_export_runs_once()
+    test_detector_with_scripted_backend()
+    test_scripted_backends_share_timeline_across_streams()
+    test_scene_change_ignores_people_and_flicker()
+    test_pose_process_stays_aligned_after_object_failure()
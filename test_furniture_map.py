@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+家具地图测试脚本
+验证时序投票确认、漏检淘汰与布局变化后的重建
+"""
+
+from furniture_map import FurnitureMap
+
+
+def _chair(x1, y1, x2, y2, confidence=0.9):
+    return {"bbox": [x1, y1, x2, y2], "confidence": confidence, "class_name": "chair"}
+
+
+def test_furniture_map_voting():
+    """首次建立时直接确认，之后新出现的家具需要多次投票"""
+    fmap = FurnitureMap(min_votes=3, max_misses=2)
+    layout = fmap.update({"chairs": [_chair(0, 0, 100, 100)]})
+    assert len(layout.chairs) == 1
+
+    # 新椅子第一次出现尚未确认
+    layout = fmap.update({"chairs": [_chair(0, 0, 100, 100), _chair(300, 0, 400, 100)]})
+    assert len(layout.chairs) == 1
+    fmap.update({"chairs": [_chair(0, 0, 100, 100), _chair(300, 0, 400, 100)]})
+    layout = fmap.update({"chairs": [_chair(0, 0, 100, 100), _chair(300, 0, 400, 100)]})
+    assert len(layout.chairs) == 2
+    assert layout.chair_tops.shape == (2,)
+    print("✓ 家具投票确认正确")
+
+
+def test_furniture_map_misses_and_invalidate():
+    """短暂漏检保留，持续漏检移除；失效后以新检测为准"""
+    fmap = FurnitureMap(min_votes=3, max_misses=2)
+    fmap.update({"chairs": [_chair(0, 0, 100, 100)]})
+    assert len(fmap.update({"chairs": []}).chairs) == 1
+    assert len(fmap.update({"chairs": []}).chairs) == 1
+    assert len(fmap.update({"chairs": []}).chairs) == 0
+
+    fmap.update({"monitors": [_chair(0, 0, 50, 50)]})
+    fmap.invalidate()
+    layout = fmap.update({"monitors": [_chair(200, 200, 260, 260)]})
+    assert len(layout.monitors) == 1
+    assert layout.monitor_centers[0].tolist() == [230.0, 230.0]
+    assert fmap.get_stats()["invalidations"] == 1
+    print("✓ 家具漏检淘汰与失效重建正确")
+
+
+if __name__ == "__main__":
+    test_furniture_map_voting()
+    test_furniture_map_misses_and_invalidate()
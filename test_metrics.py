@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段延迟统计测试脚本
+验证滚动直方图的分位数精度、窗口过期与记录开销
+"""
+
+import time
+
+import numpy as np
+
+from metrics import (
+    EXPORT_BOUNDS_MS,
+    LatencyHistogram,
+    PrometheusWriter,
+    StageMetrics,
+)
+
+
+def test_histogram_quantiles_within_bucket_error():
+    """对数分桶的分位数与精确值相差不超过一个桶宽（约20%）"""
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(mean=np.log(30), sigma=0.6, size=5000)
+    histogram = LatencyHistogram(window=60.0)
+    for value in samples:
+        histogram.record(float(value), now=10.0)
+
+    summary = histogram.summary(now=10.0)
+    assert summary["count"] == len(samples)
+    assert abs(summary["mean_ms"] - samples.mean()) < 1e-6
+    assert summary["max_ms"] == samples.max()
+    for quantile in (50, 95, 99):
+        exact = np.percentile(samples, quantile)
+        assert abs(summary[f"p{quantile}_ms"] - exact) / exact < 0.2
+    print(f"✓ 分位数摘要: {summary}")
+
+
+def test_histogram_window_expires_old_slices():
+    """超出滚动窗口的时间片不再计入统计"""
+    histogram = LatencyHistogram(window=6.0, slices=6)
+    histogram.record(100.0, now=0.5)
+    histogram.record(1.0, now=3.5)
+    assert histogram.summary(now=4.0)["count"] == 2
+    summary = histogram.summary(now=6.5)
+    assert summary["count"] == 1
+    assert summary["max_ms"] == 1.0
+    assert histogram.summary(now=20.0) is None
+    assert histogram.total_count == 2
+    print("✓ 滚动窗口过期正确")
+
+
+def test_stage_metrics_per_camera_and_overhead():
+    """按摄像头分阶段汇总；单次记录开销远小于一帧的处理时间"""
+    metrics = StageMetrics(window=60.0, enabled=True)
+    metrics.record("cam0", "detect", 0.030)
+    metrics.record("cam1", "draw", 0.002)
+    summary = metrics.summary()
+    assert set(summary) == {"cam0", "cam1"}
+    assert set(summary["cam0"]) == {"detect"}
+    assert abs(summary["cam0"]["detect"]["p50_ms"] - 30.0) / 30.0 < 0.2
+    assert metrics.summary("cam2") == {"cam2": {}}
+
+    iterations = 20000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        metrics.record("cam0", "parse", 0.001)
+    per_record = (time.perf_counter() - start) / iterations
+    # 每帧约十余次记录，15fps 下应远低于 1% 的处理预算
+    assert per_record * 15 < 0.01 * (1.0 / 15)
+
+    disabled = StageMetrics(enabled=False)
+    disabled.record("cam0", "detect", 0.01)
+    assert disabled.summary() == {}
+    print(f"✓ 单次记录耗时 {per_record * 1e6:.2f}µs")
+
+
+def test_prometheus_histogram_export():
+    """累计分桶在导出边界上精确计数，文本格式带 le 标签与 +Inf/_sum/_count"""
+    histogram = LatencyHistogram(window=6.0)
+    for value in (0.5, 1.0, 3.0, 40.0, 20000.0):
+        histogram.record(value, now=0.0)
+    histogram.record(2.0, now=100.0)  # 滚动窗口过期不影响累计计数
+
+    exported = histogram.cumulative()
+    assert exported["count"] == 6
+    assert len(exported["buckets"]) == len(EXPORT_BOUNDS_MS)
+    assert exported["buckets"][:4] == [2, 3, 4, 4]  # <=1ms, <=2.5ms, <=5ms, <=10ms
+    assert exported["buckets"][-1] == 5
+
+    writer = PrometheusWriter()
+    writer.histogram("stage_duration_seconds", exported, {"camera": 'a"b'})
+    writer.counter("frames_total", 3, {"camera": "cam0"}, "帧数")
+    writer.gauge("skipped", None)
+    text = writer.render()
+    assert "# TYPE duty_stage_duration_seconds histogram" in text
+    assert 'duty_stage_duration_seconds_bucket{camera="a\\"b",le="0.001"} 2' in text
+    assert 'duty_stage_duration_seconds_bucket{camera="a\\"b",le="+Inf"} 6' in text
+    assert 'duty_stage_duration_seconds_count{camera="a\\"b"} 6' in text
+    assert 'duty_frames_total{camera="cam0"} 3' in text
+    assert "duty_skipped" not in text
+    print("✓ Prometheus 直方图导出正确")
+
+
+def test_prometheus_families_are_contiguous():
+    """按摄像头交错写入的同名指标在输出中连续排列，HELP/TYPE 只出现一次"""
+    writer = PrometheusWriter()
+    for cam_id in ("cam0", "cam1"):
+        labels = {"camera": cam_id}
+        writer.gauge("camera_online", True, labels, "摄像头是否在线")
+        writer.counter("frames_total", 10, labels, "帧数")
+    lines = writer.render().splitlines()
+    assert lines == [
+        "# HELP duty_camera_online 摄像头是否在线",
+        "# TYPE duty_camera_online gauge",
+        'duty_camera_online{camera="cam0"} 1',
+        'duty_camera_online{camera="cam1"} 1',
+        "# HELP duty_frames_total 帧数",
+        "# TYPE duty_frames_total counter",
+        'duty_frames_total{camera="cam0"} 10',
+        'duty_frames_total{camera="cam1"} 10',
+    ]
+    print("✓ Prometheus 指标族连续输出")
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles_within_bucket_error()
+    test_histogram_window_expires_old_slices()
+    test_stage_metrics_per_camera_and_overhead()
+    test_prometheus_histogram_export()
+    test_prometheus_families_are_contiguous()
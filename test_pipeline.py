@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+采集流水线测试脚本
+使用模拟摄像头验证抓帧线程的丢帧与计数逻辑
+"""
+
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import config
+from camera_worker import CameraWorkerHandle, SharedFrameRing
+from pipeline import (
+    AdaptiveRateController,
+    CameraContext,
+    FrameGrabber,
+    MotionGate,
+)
+
+
+class FakeCamera:
+    """模拟摄像头，按固定间隔产生编号帧"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counter = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        time.sleep(self.interval)
+        self.counter += 1
+        frame = np.full((4, 4, 3), self.counter % 255, dtype=np.uint8)
+        return True, frame
+
+
+def test_frame_grabber_drops_stale_frames():
+    """推理慢于采集时只处理最新帧，旧帧计入丢帧"""
+    grabber = FrameGrabber(FakeCamera())
+    grabber.start()
+    try:
+        processed_seqs = []
+        for _ in range(3):
+            item = grabber.read_latest(timeout=1.0)
+            assert item is not None
+            seq, frame, frame_time = item
+            processed_seqs.append(seq)
+            time.sleep(0.05)  # 模拟慢推理
+            grabber.mark_processed(frame_time)
+    finally:
+        grabber.stop()
+
+    stats = grabber.get_stats()
+    assert processed_seqs == sorted(processed_seqs)
+    assert stats["processed"] == 3
+    assert stats["dropped"] > 0
+    assert stats["grabbed"] >= stats["dropped"] + stats["processed"]
+    print(f"✓ 抓帧统计: {stats}")
+
+
+def test_frame_grabber_read_timeout():
+    """没有新帧时 read_latest 超时返回 None"""
+    grabber = FrameGrabber(FakeCamera())
+    assert grabber.read_latest(timeout=0.01) is None
+    print("✓ 无新帧时超时返回")
+
+
+def test_camera_registry():
+    """多摄像头注册表：未配置时回退到 CAMERA_SOURCE，字典项保留自定义ID"""
+    original = config.CAMERA_SOURCES
+    try:
+        config.CAMERA_SOURCES = []
+        assert config.get_camera_registry() == [("cam0", config.CAMERA_SOURCE)]
+
+        config.CAMERA_SOURCES = [0, {"id": "door", "source": "rtsp://host/live"}]
+        assert config.get_camera_registry() == [
+            ("cam0", 0),
+            ("door", "rtsp://host/live"),
+        ]
+        assert config._parse_camera_sources("0, rtsp://host/live") == [
+            0,
+            "rtsp://host/live",
+        ]
+    finally:
+        config.CAMERA_SOURCES = original
+    print("✓ 摄像头注册表解析正确")
+
+
+def test_shared_frame_ring_roundtrip():
+    """共享内存环形缓冲：写入的帧与状态可被另一挂载端完整读回"""
+    writer = SharedFrameRing(max_width=64, max_height=48, slots=2, create=True)
+    reader = SharedFrameRing(**writer.spec())
+    try:
+        assert reader.read() is None
+        frame = np.random.randint(0, 255, (48, 64, 3), dtype=np.uint8)
+        seq = writer.write(frame, {"status": "在岗", "frame_on_duty": np.bool_(True)})
+
+        item = reader.read()
+        assert item is not None
+        read_seq, read_frame, status, _ = item
+        assert read_seq == seq
+        assert np.array_equal(read_frame, frame)
+        assert status == {"status": "在岗", "frame_on_duty": True}
+        assert reader.read(after_seq=read_seq) is None
+
+        # 超出容量的帧按比例缩小后写入
+        writer.write(np.zeros((96, 128, 3), dtype=np.uint8), {"status": "离岗"})
+        _, small_frame, _, _ = reader.read(after_seq=read_seq)
+        assert small_frame.shape == (48, 64, 3)
+    finally:
+        reader.close()
+        writer.close()
+        writer.unlink()
+    print("✓ 共享内存帧环形缓冲读写正确")
+
+
+def test_motion_gate_skips_static_frames():
+    """静止画面被跳过，连续跳过次数受限，画面变化时重新检测"""
+    gate = MotionGate(threshold=0.01, max_skips=2, enabled=True)
+    still = np.zeros((48, 64, 3), dtype=np.uint8)
+    assert gate.should_skip(still, has_previous_result=False) is False
+    assert gate.should_skip(still) is True
+    assert gate.should_skip(still) is True
+    assert gate.should_skip(still) is False  # 达到最大连续跳过次数
+    assert gate.should_skip(np.full_like(still, 200)) is False
+    stats = gate.get_stats()
+    assert stats["motion_skipped"] == 2
+    assert abs(stats["motion_skip_ratio"] - 0.4) < 1e-6
+    print(f"✓ 运动门控统计: {stats}")
+
+
+def test_adaptive_rate_controller():
+    """超出延迟目标时先降分辨率再加大步长，余量充足时逐级恢复"""
+    controller = AdaptiveRateController(
+        enabled=True,
+        target_latency_ms=100,
+        cpu_budget=0.0,
+        imgsz_ladder=[640, 320],
+        max_stride=3,
+        adjust_interval=1,
+        camera_fps=30,
+    )
+    assert controller.imgsz == 640
+    controller.record(0.3)
+    assert (controller.imgsz, controller.stride) == (320, 1)
+    controller.record(0.3)
+    assert (controller.imgsz, controller.stride) == (320, 2)
+    assert controller.wait_time() > 0
+
+    controller.record(0.01)
+    assert (controller.imgsz, controller.stride) == (320, 1)
+    controller.record(0.01)
+    assert (controller.imgsz, controller.stride) == (640, 1)
+    print(f"✓ 自适应速率状态: {controller.get_state()}")
+
+
+def test_adaptive_rate_cpu_budget():
+    """CPU 预算限制推理步长下限"""
+    controller = AdaptiveRateController(
+        enabled=True,
+        target_latency_ms=1000,
+        cpu_budget=0.5,
+        imgsz_ladder=[640],
+        max_stride=10,
+        adjust_interval=1,
+        camera_fps=10,
+    )
+    controller.record(0.2)  # 0.2s / (0.5 * 0.1s) => 至少间隔4帧
+    assert controller.stride == 4
+    assert controller.get_state()["estimated_cpu_usage"] <= 0.5
+    print("✓ CPU 预算约束生效")
+
+
+def test_annotation_double_buffer():
+    """发布后前后台交换，写端始终拿到非前台缓冲区，稳定后不再分配"""
+    context = CameraContext("cam0", 0)
+    shape = (48, 64, 3)
+    seen = []
+    for value in range(4):
+        target = context.output_buffer.acquire(shape)
+        target.fill(value)
+        context.publish(target, "在岗")
+        assert context.latest_frame is target
+        assert context.output_buffer.acquire(shape) is not target
+        seen.append(id(target))
+
+    assert len(set(seen)) == 2
+    assert context.output_buffer.allocations == 2
+    assert context.latest_frame[0, 0, 0] == 3
+
+    # 非缓冲区帧（如原始帧）发布时不交换
+    back = context.output_buffer.acquire(shape)
+    context.publish(np.zeros(shape, dtype=np.uint8), "检测器未初始化")
+    assert context.output_buffer.acquire(shape) is back
+    print("✓ 标注双缓冲交换正确")
+
+
+def test_camera_worker_process_with_process_parallel_mode():
+    """进程模式的摄像头工作进程在检测器配置为进程并行时降级运行并持续产出帧"""
+    names = ("INFERENCE_BACKEND", "DETECTOR_PARALLEL_MODE", "CAMERA_WORKER_MODE")
+    values = ("scripted", "process", "process")
+    originals = {name: getattr(config, name) for name in names}
+    saved_env = {name: os.environ.get(name) for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "cam.avi")
+        writer = cv2.VideoWriter(
+            source, cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (160, 120)
+        )
+        for idx in range(100):
+            writer.write(np.full((120, 160, 3), idx, dtype=np.uint8))
+        writer.release()
+
+        # spawn 启动方式下子进程重新导入 config，同时通过环境变量传入
+        for name, value in zip(names, values):
+            setattr(config, name, value)
+            os.environ[name] = value
+        context = CameraContext("cam0", source)
+        handle = CameraWorkerHandle(context)
+        try:
+            handle.start()
+            deadline = time.time() + 30.0
+            # 录像会被抓帧线程很快读完，至少收到一帧检测结果即可
+            while handle.received_frames < 1:
+                assert handle.is_alive(), "工作进程已退出"
+                assert time.time() < deadline
+                time.sleep(0.05)
+            assert context.frame_seq >= 1
+            assert handle.is_alive()
+        finally:
+            handle.stop()
+            context.stop()
+            for name, value in originals.items():
+                setattr(config, name, value)
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+    print("✓ 进程模式工作进程降级为线程并行后正常产出帧")
+
+
+if __name__ == "__main__":
+    test_frame_grabber_drops_stale_frames()
+    test_frame_grabber_read_timeout()
+    test_camera_registry()
+    test_shared_frame_ring_roundtrip()
+    test_motion_gate_skips_static_frames()
+    test_adaptive_rate_controller()
+    test_adaptive_rate_cpu_budget()
+    test_annotation_double_buffer()
+    test_camera_worker_process_with_process_parallel_mode()
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+视频流广播测试脚本
+验证每帧只编码一次、所有客户端共享同一份编码结果
+"""
+
+import json
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+import config
+from pipeline import CameraContext
+from streaming import StatusPublisher, StreamSlots, resolve_profile
+
+
+def test_broadcaster_encodes_once_for_all_subscribers():
+    """两个客户端拿到同一个 bytes 对象，编码次数只随新帧增加"""
+    original_fps = config.STREAM_FPS
+    config.STREAM_FPS = 1000
+    context = CameraContext("cam0", 0)
+    broadcaster = context.broadcaster
+    first = broadcaster.stream()
+    second = broadcaster.stream()
+    try:
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        context.publish(frame, "在岗")
+        part_a = next(first)
+        part_b = next(second)
+        assert part_a is part_b
+        header = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+        assert part_a.startswith(header + b"\xff\xd8")
+        assert broadcaster.get_stats()["subscribers"] == 2
+
+        # 没有新帧时不重复编码
+        latest = context.frame_seq
+        assert broadcaster.wait_packet(after_seq=latest, timeout=0.05) is None
+        assert broadcaster.encoded_frames == 1
+
+        context.publish(np.full_like(frame, 255), "离岗")
+        assert next(first) is next(second)
+        assert broadcaster.encoded_frames == 2
+    finally:
+        first.close()
+        second.close()
+        broadcaster.stop()
+        config.STREAM_FPS = original_fps
+    assert broadcaster.get_stats()["subscribers"] == 0
+    print(f"✓ 广播器统计: {broadcaster.get_stats()}")
+
+
+def test_overlay_channel_fans_out_latest_event():
+    """叠加数据只序列化一次；订阅者只拿到最新事件"""
+    context = CameraContext("cam0", 0)
+    channel = context.overlay_channel
+    first = channel.stream()
+    second = channel.stream()
+    try:
+        assert next(first) == next(second) == b"retry: 3000\n\n"
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        context.publish(frame, "在岗", overlay={"status": "在岗", "boxes": []})
+        context.publish(frame, "离岗", overlay={"status": "离岗", "boxes": []})
+        message = next(first)
+        assert message is next(second)
+        assert message.startswith(b"id: 2\n")
+        data = json.loads(message.decode("utf-8").split("data: ", 1)[1])
+        assert data == {"status": "离岗", "boxes": []}
+        assert channel.get_stats()["published"] == 2
+
+        # 没有新事件时输出心跳
+        channel.heartbeat = 0.01
+        assert next(first) == b": keepalive\n\n"
+    finally:
+        first.close()
+        second.close()
+        context.stop()
+    print(f"✓ 叠加推送统计: {channel.get_stats()}")
+
+
+def test_status_publisher_pushes_on_change_or_heartbeat():
+    """无订阅者时不计算；状态变化立即推送，未变化时按心跳间隔推送"""
+    context = CameraContext("cam0", 0)
+    builds = []
+
+    def build(ctx):
+        builds.append(ctx.cam_id)
+        return {"status": ctx.get_status()}
+
+    publisher = StatusPublisher(
+        lambda: [context], build, lambda p: p["status"], heartbeat=5.0
+    )
+    assert publisher.tick(now=0.0) == 0 and not builds
+
+    subscriber = context.status_channel.stream()
+    try:
+        next(subscriber)
+        assert publisher.tick(now=0.0) == 1
+        assert publisher.tick(now=1.0) == 0  # 未变化且未到心跳
+        context.publish(None, "离岗")
+        assert publisher.tick(now=1.5) == 1  # 状态变化立即推送
+        assert publisher.tick(now=7.0) == 1  # 心跳
+        assert context.status_channel.get_stats()["published"] == 3
+        message = next(subscriber)
+        assert json.loads(message.decode("utf-8").split("data: ", 1)[1]) == {
+            "status": "离岗"
+        }
+    finally:
+        subscriber.close()
+        context.stop()
+    print("✓ 状态推送按变化与心跳触发")
+
+
+def test_stream_slots_bound_and_release_on_close():
+    """超出上限的长连接被拒绝；服务器关闭响应时归还名额并关闭生成器"""
+    slots = StreamSlots(limit=1)
+    closed = []
+
+    def body():
+        try:
+            yield b"part"
+        finally:
+            closed.append(True)
+
+    first = slots.acquire(body())
+    assert first is not None
+    assert slots.acquire(body()) is None
+    assert next(iter(first)) == b"part"
+    first.close()
+    first.close()  # 重复关闭只归还一次
+    assert closed == [True]
+    assert slots.get_stats() == {"active": 0, "limit": 1, "rejected": 1}
+    assert slots.acquire(iter([b"x"])) is not None
+    print("✓ 长连接名额限制与归还正确")
+
+
+def test_slow_client_skips_frames_and_stalled_client_is_dropped():
+    """慢客户端只拿最新帧并计入跳帧；新帧积压超时的客户端在写入阻塞期间即被断开"""
+    originals = (config.STREAM_FPS, config.STREAM_STALL_TIMEOUT)
+    config.STREAM_FPS = 1000
+    config.STREAM_STALL_TIMEOUT = 0.2
+    context = CameraContext("cam0", 0)
+    broadcaster = context.broadcaster
+    closed = []
+    stream = broadcaster.stream(
+        client="127.0.0.1", on_stall=lambda: closed.append(True)
+    )
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    try:
+        context.publish(frame, "在岗")
+        next(stream)
+        for value in range(1, 6):
+            context.publish(np.full_like(frame, value * 40), "在岗")
+            deadline = time.time() + 1.0
+            while broadcaster.get_stats()["last_seq"] < context.frame_seq:
+                assert time.time() < deadline
+                time.sleep(0.005)
+        next(stream)
+        client = broadcaster.get_stats()["clients"][0]
+        assert client["client"] == "127.0.0.1"
+        assert client["sent"] == 1  # 第二帧在客户端读取完成后才计入
+        assert client["skipped"] == 4
+        assert client["queue_depth"] == 0
+
+        # 生成器停在 yield 上模拟服务器线程阻塞在写入中：不恢复生成器，
+        # 新帧积压超时后由编码线程移出订阅者并关闭连接
+        context.publish(frame, "离岗")
+        deadline = time.time() + 2.0
+        while broadcaster.get_stats()["subscribers"]:
+            assert time.time() < deadline
+            time.sleep(0.02)
+        assert closed == [True]
+        with pytest.raises(StopIteration):
+            next(stream)
+    finally:
+        stream.close()
+        context.stop()
+        config.STREAM_FPS, config.STREAM_STALL_TIMEOUT = originals
+    print("✓ 慢客户端跳帧与卡死断开正确")
+
+
+def test_quality_profiles_encoded_once_per_profile():
+    """各档位独立编码一次并按最大宽度缩放；auto 按客户端宽度选档"""
+    assert resolve_profile() == config.DEFAULT_STREAM_PROFILE
+    assert resolve_profile("auto", width=300) == "thumb"
+    assert resolve_profile("auto", width=600) == "standard"
+    assert resolve_profile("auto", width=1920) == "full"
+    with pytest.raises(ValueError):
+        resolve_profile("unknown")
+
+    context = CameraContext("cam0", 0)
+    thumb = context.get_broadcaster("thumb")
+    assert context.get_broadcaster("thumb") is thumb
+    assert context.broadcaster is context.get_broadcaster("full")
+    thumb_a, thumb_b = thumb.stream(), thumb.stream()
+    full = context.broadcaster.stream()
+    try:
+        context.publish(np.zeros((480, 640, 3), dtype=np.uint8), "在岗")
+        part = next(thumb_a)
+        assert next(thumb_b) is part
+        jpeg = part.split(b"\r\n\r\n", 1)[1][:-2]
+        decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+        assert decoded.shape == (240, 320, 3)
+        assert len(next(full)) > len(part)
+        assert thumb.encoded_frames == 1
+        assert context.broadcaster.encoded_frames == 1
+        assert set(context.get_stats()["streams"]) == {"thumb", "full"}
+    finally:
+        for stream in (thumb_a, thumb_b, full):
+            stream.close()
+        context.stop()
+    print("✓ 质量档位按需编码且同档位共享")
+
+
+def test_snapshot_encodes_on_demand_and_caches():
+    """无订阅者时快照按需编码，画面未变化不重复编码，新帧到来后重新编码"""
+    context = CameraContext("cam0", 0)
+    broadcaster = context.get_broadcaster("thumb")
+    assert broadcaster.snapshot() is None
+
+    context.publish(np.zeros((480, 960, 3), dtype=np.uint8), "在岗")
+    seq, jpeg = broadcaster.snapshot()
+    assert seq == context.frame_seq
+    assert cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape == (
+        160,
+        320,
+        3,
+    )
+    assert broadcaster.snapshot() == (seq, jpeg)
+    assert broadcaster.snapshot_encodes == 1
+
+    context.publish(np.full((480, 960, 3), 255, dtype=np.uint8), "离岗")
+    assert broadcaster.snapshot()[0] == seq + 1
+    assert broadcaster.snapshot_encodes == 2
+    context.stop()
+    print("✓ 单帧快照按需编码并缓存")
+
+
+def test_status_stream_disabled_returns_404():
+    """关闭状态推送时接口返回404，且后台推送器不启动"""
+    import app
+
+    original = config.ENABLE_STATUS_PUSH
+    config.ENABLE_STATUS_PUSH = False
+    context = CameraContext("cam0", 0)
+    app.cameras["cam0"] = context
+    try:
+        client = app.app.test_client()
+        assert client.get("/status_stream").status_code == 404
+        assert client.get("/status_stream/cam0").status_code == 404
+        assert context.status_channel.subscriber_count == 0
+        assert app.status_publisher._thread is None
+    finally:
+        app.cameras.pop("cam0", None)
+        context.stop()
+        config.ENABLE_STATUS_PUSH = original
+    print("✓ 关闭状态推送时接口返回404")
+
+
+if __name__ == "__main__":
+    test_broadcaster_encodes_once_for_all_subscribers()
+    test_overlay_channel_fans_out_latest_event()
+    test_status_publisher_pushes_on_change_or_heartbeat()
+    test_stream_slots_bound_and_release_on_close()
+    test_slow_client_skips_frames_and_stalled_client_is_dropped()
+    test_quality_profiles_encoded_once_per_profile()
+    test_snapshot_encodes_on_demand_and_caches()
+    test_status_stream_disabled_returns_404()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+工具函数测试脚本
+验证批量几何计算与逐对计算结果一致
+"""
+
+import numpy as np
+
+import utils
+from utils import (
+    assign_unique,
+    draw_chinese_text,
+    draw_text_overlays,
+    get_font,
+    render_text_mask,
+    calculate_distance,
+    calculate_iou,
+    pairwise_distance,
+    pairwise_iou,
+)
+
+
+def test_pairwise_iou_matches_scalar():
+    """IoU矩阵与 calculate_iou 逐对结果一致（含不相交与退化框）"""
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(0, 600, size=(12, 2))
+    sizes = rng.uniform(0, 200, size=(12, 2))
+    boxes = np.hstack([corners, corners + sizes])
+    boxes[3] = [50, 50, 50, 120]  # 零宽度
+    persons, furniture = boxes[:5], boxes[5:]
+
+    matrix = pairwise_iou(persons, furniture)
+    assert matrix.shape == (5, 7)
+    for i, person in enumerate(persons):
+        for j, item in enumerate(furniture):
+            assert abs(matrix[i, j] - calculate_iou(person, item)) < 1e-5
+    assert pairwise_iou(persons, np.zeros((0, 4))).shape == (5, 0)
+    print("✓ IoU矩阵与逐对计算一致")
+
+
+def test_pairwise_distance_matches_scalar():
+    """距离矩阵与 calculate_distance 逐对结果一致"""
+    points_a = np.array([[0, 0], [3, 4], [10, 10]], dtype=np.float32)
+    points_b = np.array([[0, 0], [6, 8]], dtype=np.float32)
+    matrix = pairwise_distance(points_a, points_b)
+    for i, a in enumerate(points_a):
+        for j, b in enumerate(points_b):
+            assert abs(matrix[i, j] - calculate_distance(a, b)) < 1e-4
+    print("✓ 距离矩阵与逐对计算一致")
+
+
+def test_assign_unique_one_to_one():
+    """两人争抢同一骨架时保证一对一，且低于阈值的配对被丢弃"""
+    scores = np.array(
+        [
+            [0.9, 0.8, 0.0],
+            [0.85, 0.1, 0.0],
+            [0.0, 0.0, 0.2],
+        ]
+    )
+    greedy = sorted(assign_unique(scores, threshold=0.3, method="greedy"))
+    assert greedy == [(0, 0)]
+    rows = [r for r, _ in greedy]
+    cols = [c for _, c in greedy]
+    assert len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+
+    if utils.linear_sum_assignment is not None:
+        # 全局最优：0->1, 1->0 总得分 1.65 高于 0->0 的 0.9
+        assert sorted(assign_unique(scores, threshold=0.3)) == [(0, 1), (1, 0)]
+    assert assign_unique(np.zeros((0, 3))) == []
+    print("✓ 一对一匹配正确")
+
+
+def test_text_rendering_cached_and_clipped():
+    """字体与文字蒙版按参数缓存；越界文字被裁剪；draw_chinese_text 不修改原图"""
+    assert get_font(18) is get_font(18)
+    assert render_text_mask("人员1", 18) is render_text_mask("人员1", 18)
+
+    frame = np.zeros((40, 80, 3), dtype=np.uint8)
+    result = draw_chinese_text(frame, "人员1", (5, 5), 18, (0, 255, 0))
+    assert not frame.any()
+    assert result[..., 1].any() and not result[..., 0].any()
+
+    canvas = np.zeros((40, 80, 3), dtype=np.uint8)
+    white = (255, 255, 255)
+    out = draw_text_overlays(
+        canvas, [("Edge", (-10, -10), 18, white), ("X", (500, 500), 18, white)]
+    )
+    assert out is canvas
+    print("✓ 文字渲染缓存与裁剪正确")
+
+
+if __name__ == "__main__":
+    test_pairwise_iou_matches_scalar()
+    test_pairwise_distance_matches_scalar()
+    test_assign_unique_one_to_one()
+    test_text_rendering_cached_and_clipped()
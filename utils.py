@@ -6,6 +6,7 @@
 """
 
 import cv2
+import functools
 import numpy as np
 import time
 from datetime import datetime
@@ -13,6 +14,110 @@ from PIL import Image, ImageDraw, ImageFont
 import os
 import config
 
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy 为可选依赖，缺失时使用贪心唯一匹配
+    linear_sum_assignment = None
+
+
+# 按优先级尝试的系统中文字体
+FONT_PATHS = (
+    "C:/Windows/Fonts/simhei.ttf",  # 黑体
+    "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
+    "C:/Windows/Fonts/simsun.ttc",  # 宋体
+    "/System/Library/Fonts/PingFang.ttc",  # macOS
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _available_font_paths():
+    """只在首次调用时探测字体文件是否存在"""
+    return tuple(path for path in FONT_PATHS if os.path.exists(path))
+
+
+@functools.lru_cache(maxsize=32)
+def get_font(font_size):
+    """
+    获取指定字号的字体对象（按字号缓存，避免每次绘制都重新加载字体文件）
+
+    Args:
+        font_size (int): 字体大小
+
+    Returns:
+        PIL.ImageFont: 字体对象
+    """
+    for font_path in _available_font_paths():
+        try:
+            return ImageFont.truetype(font_path, font_size)
+        except OSError:
+            continue
+
+    # 如果没有找到字体，使用默认字体
+    try:
+        return ImageFont.truetype("arial.ttf", font_size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=512)
+def render_text_mask(text, font_size):
+    """
+    将文字渲染为灰度蒙版并缓存（标签、状态文字大量重复出现）
+
+    Args:
+        text (str): 文字内容
+        font_size (int): 字体大小
+
+    Returns:
+        tuple: (alpha蒙版 (H, W, 1) float32 只读数组, 相对绘制位置的偏移 (dx, dy))
+    """
+    font = get_font(font_size)
+    left, top, right, bottom = font.getbbox(text)
+    width, height = max(1, right - left), max(1, bottom - top)
+    canvas = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(canvas).text((-left, -top), text, font=font, fill=255)
+    alpha = np.asarray(canvas, dtype=np.float32)[..., None] / 255.0
+    alpha.setflags(write=False)
+    return alpha, (left, top)
+
+
+def bgr_to_hex(color):
+    """OpenCV BGR颜色转换为网页使用的 #rrggbb"""
+    b, g, r = (int(c) for c in color[:3])
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def draw_text_overlays(img, items):
+    """
+    在图像上原地绘制多段文字，只对文字所在的小区域做混合
+
+    Args:
+        img: OpenCV图像 (BGR格式)，将被直接修改
+        items: 可迭代的 (文字, (x, y), 字体大小, (B, G, R)) 元组
+
+    Returns:
+        numpy.ndarray: 传入的图像本身
+    """
+    img_h, img_w = img.shape[:2]
+    for text, position, font_size, color in items:
+        if not text:
+            continue
+        alpha, (dx, dy) = render_text_mask(text, int(font_size))
+        x, y = int(position[0]) + dx, int(position[1]) + dy
+        mask_h, mask_w = alpha.shape[:2]
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(img_w, x + mask_w), min(img_h, y + mask_h)
+        if x1 >= x2 or y1 >= y2:
+            continue
+        patch_alpha = alpha[y1 - y : y2 - y, x1 - x : x2 - x]
+        roi = img[y1:y2, x1:x2]
+        blended = roi * (1.0 - patch_alpha) + np.asarray(color, dtype=np.float32) * (
+            patch_alpha
+        )
+        roi[:] = (blended + 0.5).astype(np.uint8)
+    return img
+
 
 def draw_chinese_text(img, text, position, font_size=30, color=(255, 255, 255)):
     """
@@ -28,45 +133,7 @@ def draw_chinese_text(img, text, position, font_size=30, color=(255, 255, 255)):
     Returns:
         numpy.ndarray: 绘制后的图像
     """
-    # 将OpenCV图像转换为PIL图像
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    pil_img = Image.fromarray(img_rgb)
-
-    # 创建绘制对象
-    draw = ImageDraw.Draw(pil_img)
-
-    # 尝试使用系统中文字体
-    font_paths = [
-        "C:/Windows/Fonts/simhei.ttf",  # 黑体
-        "C:/Windows/Fonts/msyh.ttc",  # 微软雅黑
-        "C:/Windows/Fonts/simsun.ttc",  # 宋体
-        "/System/Library/Fonts/PingFang.ttc",  # macOS
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-    ]
-
-    font = None
-    for font_path in font_paths:
-        if os.path.exists(font_path):
-            try:
-                font = ImageFont.truetype(font_path, font_size)
-                break
-            except:
-                continue
-
-    # 如果没有找到字体，使用默认字体
-    if font is None:
-        try:
-            font = ImageFont.truetype("arial.ttf", font_size)
-        except:
-            font = ImageFont.load_default()
-
-    # 绘制文字（PIL使用RGB格式）
-    pil_color = (color[2], color[1], color[0])  # BGR转RGB
-    draw.text(position, text, font=font, fill=pil_color)
-
-    # 转换回OpenCV格式
-    result_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-    return result_img
+    return draw_text_overlays(img.copy(), [(text, position, font_size, color)])
 
 
 def point_in_rectangle(point, rectangle):
@@ -168,6 +235,111 @@ def calculate_iou(bbox1, bbox2):
     return inter_area / union_area
 
 
+def bbox_centers(boxes):
+    """
+    批量计算边界框中心点
+
+    Args:
+        boxes: (N, 4) 边界框数组 [x1, y1, x2, y2]
+
+    Returns:
+        numpy.ndarray: (N, 2) 中心点坐标
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.column_stack(
+        ((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2)
+    )
+
+
+def pairwise_iou(boxes1, boxes2):
+    """
+    批量计算两组边界框之间的IoU矩阵，结果与逐对调用 calculate_iou 一致
+
+    Args:
+        boxes1: (N, 4) 边界框数组
+        boxes2: (M, 4) 边界框数组
+
+    Returns:
+        numpy.ndarray: (N, M) IoU矩阵
+    """
+    a = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = np.clip(a[:, 2] - a[:, 0], 0, None) * np.clip(a[:, 3] - a[:, 1], 0, None)
+    area_b = np.clip(b[:, 2] - b[:, 0], 0, None) * np.clip(b[:, 3] - b[:, 1], 0, None)
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        iou = np.where((inter > 0) & (union > 0), inter / union, 0.0)
+    return iou.astype(np.float32)
+
+
+def pairwise_distance(points1, points2):
+    """
+    批量计算两组点之间的欧几里得距离矩阵
+
+    Args:
+        points1: (N, 2) 点坐标
+        points2: (M, 2) 点坐标
+
+    Returns:
+        numpy.ndarray: (N, M) 距离矩阵
+    """
+    a = np.asarray(points1, dtype=np.float32).reshape(-1, 2)
+    b = np.asarray(points2, dtype=np.float32).reshape(-1, 2)
+    diff = a[:, None, :] - b[None, :, :]
+    return np.sqrt(np.sum(diff * diff, axis=-1))
+
+
+def assign_unique(score_matrix, threshold=0.0, method="hungarian"):
+    """
+    基于得分矩阵（如IoU）求一对一匹配，保证每行、每列最多匹配一次
+
+    Args:
+        score_matrix: (N, M) 得分矩阵，越大越匹配
+        threshold (float): 低于该得分的配对不计入结果
+        method (str): "hungarian" 全局最优（需要scipy，缺失时自动回退）或 "greedy" 贪心唯一
+
+    Returns:
+        list: [(行索引, 列索引), ...]
+    """
+    scores = np.asarray(score_matrix, dtype=np.float32)
+    if scores.ndim != 2 or scores.size == 0:
+        return []
+    valid = scores >= threshold
+    if not valid.any():
+        return []
+
+    if method == "hungarian" and linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(np.where(valid, -scores, 0.0))
+        return [(int(r), int(c)) for r, c in zip(rows, cols) if valid[r, c]]
+
+    # 贪心唯一匹配：按得分从高到低依次选取未占用的行列
+    candidates = np.flatnonzero(valid)
+    order = candidates[np.argsort(-scores.ravel()[candidates], kind="stable")]
+    used_rows = np.zeros(scores.shape[0], dtype=bool)
+    used_cols = np.zeros(scores.shape[1], dtype=bool)
+    pairs = []
+    max_pairs = min(scores.shape)
+    for flat_idx in order:
+        row, col = divmod(int(flat_idx), scores.shape[1])
+        if used_rows[row] or used_cols[col]:
+            continue
+        used_rows[row] = used_cols[col] = True
+        pairs.append((row, col))
+        if len(pairs) == max_pairs:
+            break
+    return pairs
+
+
 def estimate_head_pose(nose, left_eye, right_eye, left_ear, right_ear):
     """使用PnP方法估计头部姿态 (pitch/yaw/roll 单位:度)"""
     required_points = [nose, left_eye, right_eye, left_ear, right_ear]
@@ -231,12 +403,69 @@ def temporal_smoothing(history, window_size=10, threshold=0.7):
     return positive / len(recent) >= threshold
 
 
-def draw_keypoints(frame, keypoints, color=(0, 255, 255)):
-    """在帧上绘制人体关键点"""
+def frame_signature(frame, size=(32, 24)):
+    """
+    计算帧的低分辨率灰度签名，用于廉价的场景变化判断
+
+    Args:
+        frame: 输入帧 (BGR)
+        size (tuple): 缩略图尺寸 (宽, 高)
+
+    Returns:
+        numpy.ndarray: float32 灰度缩略图
+    """
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small.astype(np.float32)
+
+
+def signature_difference(sig1, sig2, ignore=None):
+    """
+    两个帧签名的平均绝对差（0-1），任一为空时视为完全不同
+
+    Args:
+        ignore: 与签名同形状的布尔数组，为 True 的格子不参与比较；全部忽略时返回 0
+    """
+    if sig1 is None or sig2 is None or sig1.shape != sig2.shape:
+        return 1.0
+    diff = np.abs(sig1 - sig2)
+    if ignore is not None:
+        diff = diff[~ignore]
+        if diff.size == 0:
+            return 0.0
+    return float(np.mean(diff)) / 255.0
+
+
+def signature_mask(frame_shape, boxes, size=(32, 24), margin=1):
+    """
+    把检测框映射到签名网格，返回需要忽略的格子（框外扩 margin 格）
+
+    Args:
+        frame_shape (tuple): 原始帧形状 (高, 宽, ...)
+        boxes (list): [x1, y1, x2, y2] 框列表（原始帧坐标）
+        size (tuple): 签名尺寸 (宽, 高)，与 frame_signature 一致
+    """
+    height, width = frame_shape[:2]
+    mask = np.zeros((size[1], size[0]), dtype=bool)
+    if not boxes or not width or not height:
+        return mask
+    scale_x, scale_y = size[0] / width, size[1] / height
+    for x1, y1, x2, y2 in boxes:
+        left = max(0, int(np.floor(x1 * scale_x)) - margin)
+        top = max(0, int(np.floor(y1 * scale_y)) - margin)
+        right = min(size[0], int(np.ceil(x2 * scale_x)) + margin)
+        bottom = min(size[1], int(np.ceil(y2 * scale_y)) + margin)
+        mask[top:bottom, left:right] = True
+    return mask
+
+
+def draw_keypoints(frame, keypoints, color=(0, 255, 255), inplace=False):
+    """在帧上绘制人体关键点（inplace=True 时直接在传入的帧上绘制）"""
     if frame is None or not keypoints:
         return frame
 
-    annotated = frame.copy()
+    annotated = frame if inplace else frame.copy()
     for point in keypoints.values():
         if point is None:
             continue
@@ -250,6 +479,7 @@ def draw_status_text(
     position="top-left",
     background_color=None,
     text_color=None,
+    inplace=False,
 ):
     """
     在帧上绘制状态文字（支持中文）
@@ -260,6 +490,7 @@ def draw_status_text(
         position (str): 文字位置 ('top-left', 'top-right', 'bottom-left', 'bottom-right', 'center')
         background_color (tuple): 背景颜色 (B, G, R)
         text_color (tuple): 文字颜色 (B, G, R)
+        inplace (bool): 是否直接在传入的帧上绘制（不复制）
 
     Returns:
         numpy.ndarray: 绘制后的帧
@@ -273,7 +504,7 @@ def draw_status_text(
     if text_color is None:
         text_color = config.COLORS["status_text"]
 
-    annotated_frame = frame.copy()
+    annotated_frame = frame if inplace else frame.copy()
     h, w = frame.shape[:2]
 
     # 设置字体参数
@@ -310,8 +541,8 @@ def draw_status_text(
     )
 
     # 使用支持中文的绘制函数
-    annotated_frame = draw_chinese_text(
-        annotated_frame, status_text, (x, y), font_size, text_color
+    draw_text_overlays(
+        annotated_frame, [(status_text, (x, y), font_size, text_color)]
     )
 
     return annotated_frame
@@ -387,6 +618,27 @@ def resize_frame(frame, max_width=800, max_height=600):
     return frame
 
 
+def to_jsonable(value):
+    """
+    将检测结果中的 numpy 类型递归转换为可JSON序列化的Python类型
+
+    Args:
+        value: 任意检测结果（dict/list/numpy数组/标量）
+
+    Returns:
+        可直接 json.dumps 的对象
+    """
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
 class PerformanceMonitor:
     """性能监控器类"""
 
@@ -407,7 +659,16 @@ class PerformanceMonitor:
         frame_time = current_time - self.last_time
         self.last_time = current_time
 
-        self.frame_times.append(frame_time)
+        self.record(frame_time)
+
+    def record(self, elapsed):
+        """
+        直接记录一次耗时（秒），用于统计检测等阶段的处理时间
+
+        Args:
+            elapsed (float): 耗时（秒）
+        """
+        self.frame_times.append(elapsed)
 
         # 保持滑动窗口大小
         if len(self.frame_times) > self.window_size: